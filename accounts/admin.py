@@ -1,13 +1,20 @@
 # accounts/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, CreditAccount, Transaction
+from django.core.paginator import Paginator
+from django.urls import reverse
+from django.utils.functional import cached_property
+from .models import User, CreditAccount, Transaction, DailyMetrics, ArchivedCreditAccount
 from django.utils.html import format_html
+from .dashboard_cache import bump_dashboard
 
 
 @admin.action(description='Mark selected users as Verified')
 def make_verified(modeladmin, request, queryset):
+    # Read the pks first: a changelist filtered on is_verified=False is empty after the update
+    pks = list(queryset.values_list('pk', flat=True))
     queryset.update(is_verified=True)
+    bump_dashboard(*pks)
 
 
 class CustomUserAdmin(UserAdmin):
@@ -23,22 +30,35 @@ class CustomUserAdmin(UserAdmin):
     actions = [make_verified]
 
 
-class TransactionInline(admin.TabularInline):
-    model = Transaction
-    extra = 0
-    readonly_fields = ('amount', 'timestamp', 'transaction_id')
+class CappedCountPaginator(Paginator):
+    """
+    Admin paginator that stops counting at COUNT_CAP rows.
+
+    The changelist counts the filtered rows on every page load, which on a
+    table of millions means a full scan; counting a LIMITed subquery keeps it
+    bounded. Narrow the list with search or filters to reach older rows.
+    """
+    COUNT_CAP = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list[:self.COUNT_CAP].count()
 
 
 @admin.register(CreditAccount)
 class CreditAccountAdmin(admin.ModelAdmin):
-    list_display = ('user', 'phone', 'balance', 'remaining_balance',
-                    'progress_percentage', 'status', 'accepted_terms')  # Add progress_percentage
-    list_filter = ('status', 'phone', 'accepted_terms')
-    search_fields = ('user__username', 'user__email', 'user__national_id')
-    inlines = [TransactionInline]
-    # Add it here too for the detail view
-    readonly_fields = ('balance', 'remaining_balance',
-                       'progress_percentage', 'accepted_at')
+    list_display = ('user', 'phone', 'balance', 'remaining_amount', 'progress_display', 'colored_status', 'accepted_terms')
+    list_select_related = ('user', 'phone')
+    # Choice filters need no query; pick a particular phone or user by searching instead
+    list_filter = ('status', 'account_type', 'accepted_terms', 'phone__brand')
+    search_fields = ('user__username', 'user__email', 'user__national_id', 'phone__name')
+    autocomplete_fields = ('user', 'phone', 'admin_marked_by')
+    show_full_result_count = False
+    readonly_fields = ('balance', 'remaining_amount', 'progress_display', 'accepted_at', 'transactions_link')
+
+    @admin.display(ordering='progress', description='Progress')
+    def progress_display(self, obj):
+        return f"{obj.progress}%"
 
     @admin.display(ordering='status', description='Status')
     def colored_status(self, obj):
@@ -52,11 +72,53 @@ class CreditAccountAdmin(admin.ModelAdmin):
             color = 'black'
         return format_html('<b style="color: {};">{}</b>', color, obj.get_status_display())
 
-    # This makes the progress_percentage column sortable in the admin
-    def progress_percentage(self, obj):
-        return f"{obj.progress_percentage}%"
-    progress_percentage.short_description = 'Progress'
+    @admin.display(description='Transactions')
+    def transactions_link(self, obj):
+        # A link rather than an inline: long-running plans have hundreds of payments
+        url = reverse('admin:accounts_transaction_changelist') + f'?account__id__exact={obj.pk}'
+        return format_html('<a href="{}">View transactions</a>', url)
+
+
+@admin.register(Transaction)
+class TransactionAdmin(admin.ModelAdmin):
+    list_display = ('transaction_id', 'account', 'transaction_type', 'amount', 'timestamp')
+    list_select_related = ('account__user', 'account__phone')
+    list_filter = ('transaction_type',)
+    search_fields = ('transaction_id', 'stripe_payment_intent', 'account__user__username')
+    autocomplete_fields = ('account',)
+    show_full_result_count = False
+    paginator = CappedCountPaginator
 
 
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(Transaction)
+
+
+@admin.register(DailyMetrics)
+class DailyMetricsAdmin(admin.ModelAdmin):
+    """Rows are written by the nightly rollup (accounts.rollups)"""
+    list_display = ('date', 'new_users', 'new_applications', 'approved_applications', 'new_plans',
+                    'payments_received', 'outstanding_balance', 'overdue_plans')
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedCreditAccount)
+class ArchivedCreditAccountAdmin(admin.ModelAdmin):
+    """Rows are moved here by archive_plans (accounts.archive)"""
+    list_display = ('id', 'user', 'phone', 'account_type', 'status', 'closed_at', 'archived_at')
+    list_select_related = ('user', 'phone')
+    list_filter = ('status', 'account_type')
+    search_fields = ('=id', 'user__username')
+    show_full_result_count = False
+    exclude = ('data',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
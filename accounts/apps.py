@@ -7,6 +7,9 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         # This method is called when the app is ready
+        # Connect signal handlers (image derivatives)
+        from . import signals  # noqa: F401
+
         # Temporarily disabled APScheduler to avoid database locking issues
         # from . import jobs
         # from django_apscheduler.jobstores import DjangoJobStore
@@ -34,4 +37,3 @@ class AccountsConfig(AppConfig):
         #         scheduler.start()
         # except Exception as e:
         #     print(f"Error starting scheduler: {e}")
-        pass
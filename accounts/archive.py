@@ -0,0 +1,138 @@
+"""
+Archival of closed plans and their transactions into cold tables
+
+    python manage.py archive_plans                 # plans closed over ARCHIVE_RETENTION_DAYS ago
+    python manage.py archive_plans --days 730 --batch-size 200 --max-batches 10
+
+A plan is archived once it is in one of ARCHIVE_STATUSES and hasn't changed
+for the retention window. It moves to ArchivedCreditAccount, and its
+transactions move to ArchivedTransaction, both under their original ids. The
+live CreditAccount and Transaction tables then hold only plans in progress
+and recently closed ones.
+
+Plans move batch_size at a time, in id order. Each batch is one database
+transaction that copies the rows and then deletes them, so an interrupted
+run leaves every plan either fully live or fully archived. Running the
+command again simply carries on with what is left.
+
+Rows are deleted without Django's delete() cascade, which would load and
+signal every transaction one by one. References to the plans are cleared
+first: the user's current_plan and stock reservations. Dashboards are bumped
+explicitly afterwards.
+
+Read-through: get_plan() and plan_transactions() return a plan and its
+transactions from whichever table holds them. The staff account page,
+payment history and statements use them.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from .dashboard_cache import bump_dashboard
+from .models import ArchivedCreditAccount, ArchivedTransaction, CreditAccount, Transaction, User
+from phones.models import StockReservation
+
+
+ARCHIVE_BATCH_SIZE = 500
+
+# Plans in these statuses are finished and never change again
+ARCHIVE_STATUSES = [
+    CreditAccount.Status.CLOSED,
+    CreditAccount.Status.PICKED_UP,
+    CreditAccount.Status.PAID_OFF,
+    CreditAccount.Status.CANCELLED,
+    CreditAccount.Status.DECLINED,
+]
+
+TRANSACTION_FIELDS = ['id', 'account_id', 'amount', 'transaction_type', 'timestamp', 'transaction_id',
+                      'description', 'stripe_payment_intent']
+
+
+def retention_days():
+    return getattr(settings, 'ARCHIVE_RETENTION_DAYS', 365)
+
+
+def archivable_plans(before):
+    """Finished plans last changed before `before`"""
+    return CreditAccount.objects.filter(status__in=ARCHIVE_STATUSES, updated_at__lt=before)
+
+
+def _json_value(value):
+    # DjangoJSONEncoder cuts datetimes to milliseconds; keep them exact
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _archived_plan(plan):
+    data = {field.attname: _json_value(getattr(plan, field.attname))
+            for field in CreditAccount._meta.concrete_fields if not field.generated}
+    return ArchivedCreditAccount(
+        id=plan.pk, user_id=plan.user_id, phone_id=plan.phone_id, account_type=plan.account_type,
+        status=plan.status, loan_amount=plan.loan_amount, installment_amount=plan.installment_amount,
+        installment_count=plan.installment_count, created_at=plan.created_at, closed_at=plan.updated_at,
+        data=data,
+    )
+
+
+def archive_batch(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive up to batch_size plans; returns (plans, transactions) moved"""
+    using = router.db_for_write(CreditAccount)
+    with transaction.atomic(using=using):
+        plans = list(archivable_plans(before).order_by('id').select_for_update()[:batch_size])
+        if not plans:
+            return 0, 0
+        ids = [plan.pk for plan in plans]
+
+        ArchivedCreditAccount.objects.bulk_create([_archived_plan(plan) for plan in plans])
+        transactions = [ArchivedTransaction(**row) for row in
+                        Transaction.objects.filter(account_id__in=ids).order_by('id').values(*TRANSACTION_FIELDS)]
+        ArchivedTransaction.objects.bulk_create(transactions, batch_size=1000)
+
+        User.objects.filter(current_plan_id__in=ids).update(current_plan=None)
+        StockReservation.objects.filter(account_id__in=ids).update(account=None)
+        Transaction.objects.filter(account_id__in=ids)._raw_delete(using)
+        CreditAccount.objects.filter(pk__in=ids)._raw_delete(using)
+
+    bump_dashboard(*(plan.user_id for plan in plans))
+    return len(plans), len(transactions)
+
+
+def archive_closed_plans(before=None, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None, progress=None):
+    """
+    Archive every plan that qualifies, batch by batch; returns (plans, transactions) moved.
+
+    `progress`, if given, is called with the running totals after each batch.
+    """
+    before = before or timezone.now() - timedelta(days=retention_days())
+    total_plans = total_transactions = batches = 0
+    while max_batches is None or batches < max_batches:
+        plans, transactions = archive_batch(before, batch_size)
+        if not plans:
+            break
+        batches += 1
+        total_plans += plans
+        total_transactions += transactions
+        if progress:
+            progress(total_plans, total_transactions)
+    return total_plans, total_transactions
+
+
+def get_plan(account_id):
+    """The plan from the live table, or rebuilt from the archive; raises CreditAccount.DoesNotExist"""
+    try:
+        return CreditAccount.objects.select_related('user', 'phone').get(pk=account_id)
+    except CreditAccount.DoesNotExist:
+        pass
+    try:
+        archived = ArchivedCreditAccount.objects.get(pk=account_id)
+    except ArchivedCreditAccount.DoesNotExist:
+        raise CreditAccount.DoesNotExist(f"No live or archived plan {account_id}")
+    return archived.to_account()
+
+
+def plan_transactions(account):
+    """The plan's transactions, from the archive when the plan has been archived"""
+    if account.is_archived:
+        return ArchivedTransaction.objects.filter(account_id=account.pk)
+    return Transaction.objects.filter(account=account)
@@ -0,0 +1,93 @@
+"""
+Every change to CreditAccount.balance goes through post_transaction()
+
+The same payment can be reported more than once, and at the same time: the
+Stripe webhook and the customer's success redirect both carry the
+PaymentIntent, and the daily job may be retried. post_transaction() handles
+each one in a single database transaction:
+
+  1. insert the Transaction. Its transaction_id is unique, so a payment that
+     is already recorded raises IntegrityError and changes nothing,
+  2. lock the plan row (SELECT ... FOR UPDATE),
+  3. move the balance with an F() expression, so the database adds the
+     amount to the stored value rather than to one read earlier.
+
+Writing first matters on SQLite, which ignores FOR UPDATE: the insert takes
+the database write lock before anything is read, so two payments can't both
+read and then deadlock trying to upgrade to a write.
+
+Saving a plan instance afterwards must not write `balance` back: use
+save(update_fields=[...]) for whatever else changed.
+
+With SQLITE_WRITE_FUNNEL on, both functions run on the writer thread
+(accounts.write_funnel).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .dashboard_cache import bump_dashboard
+from .models import CreditAccount, Transaction
+from .write_funnel import funneled
+
+
+# How each transaction type moves the balance, i.e. the amount paid in so far.
+# Fees are charges, not payments, so they leave it alone.
+BALANCE_SIGN = {
+    Transaction.TransactionType.PAYMENT: 1,
+    Transaction.TransactionType.REFUND: -1,
+}
+
+
+@funneled
+def post_transaction(account, amount, transaction_id, transaction_type=Transaction.TransactionType.PAYMENT,
+                     description='', stripe_payment_intent=None):
+    """
+    Record a transaction on a plan and move its balance, once per transaction_id.
+
+    Returns the new Transaction, or None if transaction_id was already
+    recorded. The balance fields of `account` are reloaded either way.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                posted = Transaction.objects.create(
+                    account=account, amount=amount, transaction_type=transaction_type,
+                    transaction_id=transaction_id, description=description,
+                    stripe_payment_intent=stripe_payment_intent,
+                )
+        except IntegrityError:
+            if not Transaction.objects.filter(transaction_id=transaction_id).exists():
+                raise
+            posted = None
+        sign = BALANCE_SIGN.get(transaction_type, 0)
+        if posted and sign:
+            plan = CreditAccount.objects.select_for_update().filter(pk=account.pk)
+            plan.values_list('pk').get()
+            plan.update(balance=F('balance') + sign * amount, updated_at=timezone.now())
+            # QuerySet.update() skips the post_save signal
+            transaction.on_commit(lambda: bump_dashboard(account.user_id))
+        account.refresh_from_db(fields=['balance', 'remaining_amount', 'progress', 'updated_at'])
+    return posted
+
+
+@funneled
+def refund_balance(account, transaction_id, description=''):
+    """
+    Refund everything paid into a plan (e.g. when it is cancelled).
+
+    The amount is read under the row lock, so a payment landing at the same
+    moment is either refunded too or lands after the balance is zeroed.
+    Returns the REFUND transaction, or None if there was nothing to refund.
+    """
+    with transaction.atomic():
+        plan = CreditAccount.objects.select_for_update().filter(pk=account.pk)
+        # Write before reading, as post_transaction() does: on SQLite this takes the
+        # database write lock, which FOR UPDATE doesn't, before the balance is read
+        plan.update(updated_at=timezone.now())
+        balance = plan.values_list('balance', flat=True).get()
+        if balance <= 0:
+            account.refresh_from_db(fields=['balance', 'remaining_amount', 'progress', 'updated_at'])
+            return None
+        return post_transaction(account, balance, transaction_id, Transaction.TransactionType.REFUND,
+                                description=description)
@@ -0,0 +1,155 @@
+"""
+Business dashboard metrics
+
+compute_snapshot() gathers every figure on the business dashboard with a
+fixed handful of conditional-aggregation queries (Count/Sum with filter=Q),
+so the cost stays the same however many users and plans there are.
+The staff console's tab and card counts (CONSOLE_COUNTS) ride along in the
+same queries. Lifetime figures (plans paid off, loan value, amount paid, popular brands)
+also count plans moved to the archive (accounts.archive); the open-plan
+figures never need to, as only finished plans are archived.
+
+get_snapshot() serves it from the cache with stale-while-revalidate: a
+snapshot is fresh for DASHBOARD_SNAPSHOT_TTL seconds and may then be served
+for DASHBOARD_SNAPSHOT_STALE more while one background refresh rebuilds it.
+Only a cold cache (or a snapshot past both windows) makes a request wait.
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Avg, Count, DecimalField, Q, Sum, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
+
+from .models import ArchivedCreditAccount, CreditAccount, CreditApplication, User
+
+
+SNAPSHOT_KEY = 'business-dashboard:snapshot'
+REFRESH_LOCK_KEY = 'business-dashboard:refreshing'
+
+ZERO = Value(Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+# Plan counts on the staff console (accounts.views.customer_management_view)
+CONSOLE_COUNTS = {
+    'total': Count('id'),
+    'pending': Count('id', filter=Q(status='PENDING')),
+    'active': Count('id', filter=Q(status__in=['ACTIVE', 'REPAYING'])),
+    'completed': Count('id', filter=Q(status='COMPLETED')),
+    'available_for_pickup': Count('id', filter=Q(status='AVAILABLE_FOR_PICKUP')),
+    'picked_up': Count('id', filter=Q(status='PICKED_UP')),
+}
+
+
+def _ttl():
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 60)
+
+
+def _stale_window():
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_STALE', 300)
+
+
+def compute_snapshot(now=None):
+    """Every dashboard figure, in eight queries"""
+    now = now or timezone.now()
+    since = now - timedelta(days=30)
+    open_bnpl = Q(status__in=['REPAYING', 'OVERDUE'], loan_amount__isnull=False)
+    credit = Q(account_type='CREDIT')
+
+    accounts = CreditAccount.objects.aggregate(
+        **CONSOLE_COUNTS,
+        active_savings=Count('id', filter=Q(account_type='SAVINGS', status='ACTIVE')),
+        repaying=Count('id', filter=Q(status='REPAYING')),
+        overdue=Count('id', filter=Q(status='OVERDUE')),
+        paid_off=Count('id', filter=Q(status__in=['PAID_OFF', 'COMPLETED'])),
+        total_loan_value=Coalesce(Sum('loan_amount', filter=credit & Q(loan_amount__isnull=False)), ZERO),
+        # balance is the amount paid so far, so what's owed is loan_amount - balance
+        total_amount_paid=Coalesce(Sum('balance', filter=credit & Q(balance__isnull=False)), ZERO),
+        outstanding_balance=Coalesce(Sum(Greatest('remaining_amount', ZERO), filter=open_bnpl), ZERO),
+    )
+    console = {name: accounts.pop(name) for name in CONSOLE_COUNTS}
+    # The archive keeps balance only in its copy of the plan's columns
+    archived_balance = Cast(KeyTextTransform('balance', 'data'), DecimalField(max_digits=12, decimal_places=2))
+    archived = ArchivedCreditAccount.objects.aggregate(
+        paid_off=Count('id', filter=Q(status__in=['PAID_OFF', 'COMPLETED'])),
+        total_loan_value=Coalesce(Sum('loan_amount', filter=credit & Q(loan_amount__isnull=False)), ZERO),
+        total_amount_paid=Coalesce(Sum(archived_balance, filter=credit), ZERO),
+    )
+    for name, value in archived.items():
+        accounts[name] += value
+    users = User.objects.aggregate(
+        total=Count('id'),
+        verified=Count('id', filter=Q(is_verified=True)),
+        new_30d=Count('id', filter=Q(date_joined__gte=since)),
+        avg_credit_score=Avg('internal_credit_score', filter=Q(internal_credit_score__gt=0)),
+    )
+    console['verified_users'] = users['verified']
+    tiers = list(User.objects.order_by('credit_tier').values('credit_tier').annotate(count=Count('id')))
+    outstanding_by_tier = list(
+        CreditAccount.objects.filter(open_bnpl).order_by('user__credit_tier').values('user__credit_tier')
+        .annotate(plans=Count('id'), outstanding=Coalesce(Sum(Greatest('remaining_amount', ZERO)), ZERO))
+    )
+    brand_counts = {}
+    for model in (CreditAccount, ArchivedCreditAccount):
+        for row in model.objects.filter(phone__isnull=False).values('phone__brand').annotate(count=Count('id')):
+            brand_counts[row['phone__brand']] = brand_counts.get(row['phone__brand'], 0) + row['count']
+    popular_brands = [{'phone__brand': brand, 'count': count}
+                      for brand, count in sorted(brand_counts.items(), key=lambda item: -item[1])[:5]]
+    new_applications_30d = CreditApplication.objects.filter(created_at__gte=since).count()
+
+    return {
+        'computed_at': now,
+        'accounts': accounts,
+        'users': users,
+        'credit_tiers': tiers,
+        'outstanding_by_tier': outstanding_by_tier,
+        'popular_brands': popular_brands,
+        'new_applications_30d': new_applications_30d,
+        'console': console,
+    }
+
+
+def _store(snapshot):
+    # Kept past its TTL so it can still be served while a refresh runs
+    cache.set(SNAPSHOT_KEY, (time.time() + _ttl(), snapshot), _ttl() + _stale_window())
+    return snapshot
+
+
+def refresh_snapshot():
+    """Recompute and cache the snapshot"""
+    try:
+        return _store(compute_snapshot())
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+
+
+def _refresh_in_background():
+    def run():
+        try:
+            refresh_snapshot()
+        except Exception as e:
+            print(f"Error refreshing business dashboard snapshot: {e}")
+        finally:
+            close_old_connections()
+
+    if getattr(settings, 'DASHBOARD_SNAPSHOT_ASYNC', True):
+        threading.Thread(target=run, name='dashboard-snapshot', daemon=True).start()
+    else:
+        run()
+
+
+def get_snapshot():
+    """The cached snapshot, refreshed in the background once it goes stale"""
+    cached = cache.get(SNAPSHOT_KEY)
+    if cached is None:
+        return _store(compute_snapshot())
+    fresh_until, snapshot = cached
+    # cache.add is atomic, so only one request per stale period starts a refresh
+    if time.time() > fresh_until and cache.add(REFRESH_LOCK_KEY, True, _stale_window()):
+        _refresh_in_background()
+    return snapshot
@@ -0,0 +1,421 @@
+"""
+Declarative credit decision engine for FlexiFone BNPL applications
+
+A credit policy is a versioned set of thresholds plus an ordered list of
+rules. compile_policy() turns a policy version into an evaluator that scores a
+single application (used by credit_application_view) or a whole batch of
+applications at once with NumPy (used when a policy changes and PENDING or
+DECLINED applications have to be re-evaluated).
+
+All money math is exact: the single-application path uses Decimal and the
+batch path uses integer cents, so both paths always reach the same decision.
+Reason strings keep the wording (and number formatting) the inline view logic
+has always stored in CreditApplication.decision_reason.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .dashboard_cache import bump_dashboard
+from .models import CreditAccount, CreditApplication, User
+
+
+# Policy versions. Never edit a published version - add a new one and point
+# CREDIT_POLICY_VERSION at it, then run `manage.py reevaluate_credit_applications`.
+POLICY_VERSIONS = {
+    1: {
+        'rules': ['guarantor', 'eligibility', 'credit_limit', 'income', 'debt_to_income'],
+        'min_profile_completion': 70,
+        'min_internal_score': 50,
+        'income_to_payment_multiple': Decimal('2'),  # Payment should be max 50% of income
+        'max_debt_to_income': Decimal('70'),  # Debt-to-income ratio in percent
+    },
+}
+
+DEFAULT_POLICY_VERSION = 1
+
+# The thresholds a what-if variant may override (see compile_variant)
+TUNABLE_SETTINGS = ['min_profile_completion', 'min_internal_score', 'income_to_payment_multiple', 'max_debt_to_income']
+
+
+def get_policy_version():
+    """Return the policy version new applications are decided with"""
+    return getattr(settings, 'CREDIT_POLICY_VERSION', DEFAULT_POLICY_VERSION)
+
+
+def get_policy(version=None):
+    """Return the policy definition for a version (defaults to the current one)"""
+    if version is None:
+        version = get_policy_version()
+    try:
+        return POLICY_VERSIONS[version]
+    except KeyError:
+        raise ValueError(f"Unknown credit policy version: {version}")
+
+
+# --- Display helpers (keep the historical decision_reason wording) ---
+
+def _money(value):
+    """Legacy display of prices/limits, e.g. 1200.0"""
+    return float(value)
+
+
+def _cents_to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+# --- Rule definitions ---
+#
+# Every rule provides:
+#   'test'   - factory(policy) -> fn(facts) -> bool, using Decimal facts
+#   'vector' - factory(policy) -> fn(columns) -> bool ndarray, using integer cents
+#   'approve'/'decline' - fn(facts) -> reason string
+#
+# facts keys: guarantor_validated, guarantor_notes, is_verified, profile_completion,
+# internal_credit_score, available_credit, phone_price, installment_count,
+# monthly_income, monthly_expenses (money values as Decimal).
+
+def _guarantor_test(policy):
+    return lambda f: bool(f['guarantor_validated'])
+
+
+def _guarantor_vector(policy):
+    return lambda c: c['guarantor_validated'].astype(bool)
+
+
+def _eligibility_test(policy):
+    min_profile = policy['min_profile_completion']
+    min_score = policy['min_internal_score']
+    return lambda f: bool(f['is_verified'] and f['profile_completion'] >= min_profile
+                          and f['internal_credit_score'] >= min_score)
+
+
+def _eligibility_vector(policy):
+    min_profile = policy['min_profile_completion']
+    min_score = policy['min_internal_score']
+    return lambda c: (c['is_verified'].astype(bool)
+                      & (c['profile_completion'] >= min_profile)
+                      & (c['internal_credit_score'] >= min_score))
+
+
+def _credit_limit_test(policy):
+    return lambda f: f['available_credit'] >= f['phone_price']
+
+
+def _credit_limit_vector(policy):
+    return lambda c: c['available_cents'] >= c['price_cents']
+
+
+def _income_test(policy):
+    # income >= (price / n) * multiple, rearranged to avoid the division
+    multiple = policy['income_to_payment_multiple']
+    return lambda f: f['monthly_income'] * f['installment_count'] >= f['phone_price'] * multiple
+
+
+def _income_vector(policy):
+    # Scale the multiple to hundredths so the comparison stays in integers
+    multiple_x100 = int(policy['income_to_payment_multiple'] * 100)
+    return lambda c: (c['income_cents'] * c['installment_count'] * 100
+                      >= c['price_cents'] * multiple_x100)
+
+
+def _debt_to_income_test(policy):
+    max_dti = policy['max_debt_to_income']
+
+    def test(f):
+        if f['monthly_income'] > 0:
+            return f['monthly_expenses'] * 100 <= max_dti * f['monthly_income']
+        return 100 <= max_dti
+
+    return test
+
+
+def _debt_to_income_vector(policy):
+    max_dti_x100 = int(policy['max_debt_to_income'] * 100)
+
+    def vector(c):
+        income = c['income_cents']
+        within = c['expenses_cents'] * 10000 <= income * max_dti_x100
+        return np.where(income > 0, within, 10000 <= max_dti_x100)
+
+    return vector
+
+
+def _monthly_payment(f):
+    return float(f['phone_price']) / f['installment_count']
+
+
+def _debt_to_income(f):
+    if f['monthly_income'] > 0:
+        return (float(f['monthly_expenses']) / float(f['monthly_income'])) * 100
+    return 100
+
+
+RULES = {
+    'guarantor': {
+        'test': _guarantor_test,
+        'vector': _guarantor_vector,
+        'approve': lambda f: "Valid guarantor provided and verified",
+        'decline': lambda f: f"Guarantor validation failed: {f['guarantor_notes']}",
+    },
+    'eligibility': {
+        'test': _eligibility_test,
+        'vector': _eligibility_vector,
+        'approve': lambda f: "Account verified and profile complete",
+        'decline': lambda f: "Complete your profile and verify your account first",
+    },
+    'credit_limit': {
+        'test': _credit_limit_test,
+        'vector': _credit_limit_vector,
+        'approve': lambda f: (f"Phone price (₵{_money(f['phone_price'])}) within your credit limit "
+                              f"(₵{_money(f['available_credit'])} available)"),
+        'decline': lambda f: (f"Phone price (₵{_money(f['phone_price'])}) exceeds your available "
+                              f"credit limit (₵{_money(f['available_credit'])})"),
+    },
+    'income': {
+        'test': _income_test,
+        'vector': _income_vector,
+        'approve': lambda f: "Sufficient income for monthly payments",
+        'decline': lambda f: (f"Monthly payment (₵{_monthly_payment(f):.2f}) too high for "
+                              f"income (₵{f['monthly_income']})"),
+    },
+    'debt_to_income': {
+        'test': _debt_to_income_test,
+        'vector': _debt_to_income_vector,
+        'approve': lambda f: "Acceptable debt-to-income ratio",
+        'decline': lambda f: f"Debt-to-income ratio too high ({_debt_to_income(f):.1f}%)",
+    },
+}
+
+
+class CompiledPolicy:
+    """A policy version with its rules resolved and thresholds bound"""
+
+    def __init__(self, version, policy=None):
+        self.version = version
+        self.policy = policy if policy is not None else get_policy(version)
+        self.rules = tuple(
+            (RULES[name]['test'](self.policy), RULES[name]['approve'], RULES[name]['decline'])
+            for name in self.policy['rules']
+        )
+        self.vectors = tuple(
+            (name, RULES[name]['vector'](self.policy)) for name in self.policy['rules']
+        )
+
+    def evaluate(self, facts):
+        """Decide one application. Returns (status, decision_reason)."""
+        approval_reasons = []
+        decline_reasons = []
+        for test, approve, decline in self.rules:
+            if test(facts):
+                approval_reasons.append(approve(facts))
+            else:
+                decline_reasons.append(decline(facts))
+
+        if not decline_reasons:
+            return CreditApplication.Status.APPROVED, "Approved: " + "; ".join(approval_reasons)
+        return CreditApplication.Status.DECLINED, "Declined: " + "; ".join(decline_reasons)
+
+    def approvals(self, columns):
+        """Vectorized decisions only (no reason text). Returns the approved mask."""
+        return np.logical_and.reduce([vector(columns) for _, vector in self.vectors])
+
+    def evaluate_batch(self, columns):
+        """
+        Decide many applications at once.
+
+        `columns` is a dict of equally sized arrays (see extract_columns()).
+        Returns (approved mask, list of decision_reason strings).
+        """
+        masks = [(name, vector(columns)) for name, vector in self.vectors]
+        approved = np.logical_and.reduce([mask for _, mask in masks])
+        reasons = [self._batch_reason(columns, masks, i, approved[i])
+                   for i in range(len(approved))]
+        return approved, reasons
+
+    def _batch_reason(self, columns, masks, i, approved):
+        facts = row_facts(columns, i)
+        if approved:
+            return "Approved: " + "; ".join(RULES[name]['approve'](facts) for name, _ in masks)
+        return "Declined: " + "; ".join(
+            RULES[name]['decline'](facts) for name, mask in masks if not mask[i])
+
+
+_compiled = {}
+
+
+def compile_policy(version=None):
+    """Return the (cached) compiled evaluator for a policy version"""
+    if version is None:
+        version = get_policy_version()
+    if version not in _compiled:
+        _compiled[version] = CompiledPolicy(version)
+    return _compiled[version]
+
+
+def compile_variant(overrides, base_version=None):
+    """Compile an unpublished variant of a policy version (used for what-if simulations)"""
+    if base_version is None:
+        base_version = get_policy_version()
+    policy = dict(get_policy(base_version))
+    for key, value in overrides.items():
+        if key not in TUNABLE_SETTINGS or key not in policy:
+            raise ValueError(f"Not a tunable credit policy threshold: {key}")
+        policy[key] = type(policy[key])(value)
+    return CompiledPolicy(base_version, policy=policy)
+
+
+def application_facts(user, phone_price, installment_count, monthly_income, monthly_expenses,
+                      guarantor_validated, guarantor_notes):
+    """Build the facts for a new application from the applicant's current profile"""
+    return {
+        'guarantor_validated': guarantor_validated,
+        'guarantor_notes': guarantor_notes,
+        'is_verified': user.is_verified,
+        'profile_completion': user.profile_completion_percentage(),
+        'internal_credit_score': user.internal_credit_score,
+        'available_credit': Decimal(str(user.get_available_credit_limit())),
+        'phone_price': Decimal(str(phone_price)),
+        'installment_count': int(installment_count),
+        'monthly_income': monthly_income,
+        'monthly_expenses': monthly_expenses,
+    }
+
+
+# --- Batch extraction and re-evaluation ---
+
+def _cents(value):
+    if value is None:
+        return 0
+    return int((Decimal(str(value)) * 100).to_integral_value())
+
+
+def _usage_cents(account_type, loan_amount, balance, phone_price):
+    """Mirror CreditAccount.remaining_balance in cents (None when no account)"""
+    if balance is None:
+        return 0
+    if account_type == CreditAccount.AccountType.CREDIT:
+        return _cents(loan_amount) - _cents(balance)
+    return _cents(phone_price) - _cents(balance)
+
+
+EXTRACT_FIELDS = [
+    'id', 'guarantor_validated', 'guarantor_validation_notes', 'requested_loan_amount',
+    'phone__price', 'requested_installment_count', 'monthly_income', 'monthly_expenses',
+    'credit_score_at_time_of_application', 'user__is_verified', 'user__credit_limit',
+    'user__current_plan__account_type', 'user__current_plan__loan_amount',
+    'user__current_plan__balance', 'user__current_plan__phone__price',
+] + [f'user__{field}' for field in User.PROFILE_COMPLETION_FIELDS]
+
+
+def extract_columns(rows):
+    """
+    Turn CreditApplication.values_list(*EXTRACT_FIELDS) rows into columns.
+
+    Snapshot fields stored on the application (income, expenses, requested
+    amount and term, credit score) are used as submitted; verification,
+    profile completion and available credit reflect the applicant today.
+    """
+    n = len(rows)
+    ids = np.empty(n, dtype=np.int64)
+    columns = {
+        'guarantor_validated': np.empty(n, dtype=bool),
+        'is_verified': np.empty(n, dtype=bool),
+        'profile_completion': np.empty(n, dtype=np.int64),
+        'internal_credit_score': np.empty(n, dtype=np.int64),
+        'available_cents': np.empty(n, dtype=np.int64),
+        'price_cents': np.empty(n, dtype=np.int64),
+        'installment_count': np.empty(n, dtype=np.int64),
+        'income_cents': np.empty(n, dtype=np.int64),
+        'expenses_cents': np.empty(n, dtype=np.int64),
+        'guarantor_notes': [],
+    }
+    for i, row in enumerate(rows):
+        (app_id, guarantor_validated, notes, requested_amount, phone_price, installments,
+         income, expenses, score, is_verified, credit_limit, account_type, loan_amount,
+         balance, account_phone_price) = row[:15]
+        profile_values = row[15:]
+
+        ids[i] = app_id
+        columns['guarantor_validated'][i] = guarantor_validated
+        columns['guarantor_notes'].append(notes)
+        columns['is_verified'][i] = is_verified
+        columns['profile_completion'][i] = int(
+            sum(1 for value in profile_values if value) / len(profile_values) * 100)
+        columns['internal_credit_score'][i] = score
+        usage = _usage_cents(account_type, loan_amount, balance, account_phone_price)
+        columns['available_cents'][i] = max(0, _cents(credit_limit) - usage)
+        columns['price_cents'][i] = _cents(requested_amount if requested_amount is not None else phone_price)
+        columns['installment_count'][i] = installments or 12
+        columns['income_cents'][i] = _cents(income)
+        columns['expenses_cents'][i] = _cents(expenses)
+    return ids, columns
+
+
+def row_facts(columns, i):
+    """Rebuild Decimal facts for one row of a column batch (used for reason text)"""
+    return {
+        'guarantor_validated': bool(columns['guarantor_validated'][i]),
+        'guarantor_notes': columns['guarantor_notes'][i],
+        'is_verified': bool(columns['is_verified'][i]),
+        'profile_completion': int(columns['profile_completion'][i]),
+        'internal_credit_score': int(columns['internal_credit_score'][i]),
+        'available_credit': _cents_to_decimal(columns['available_cents'][i]),
+        'phone_price': _cents_to_decimal(columns['price_cents'][i]),
+        'installment_count': int(columns['installment_count'][i]),
+        'monthly_income': _cents_to_decimal(columns['income_cents'][i]),
+        'monthly_expenses': _cents_to_decimal(columns['expenses_cents'][i]),
+    }
+
+
+def reevaluate_applications(version=None, statuses=None, batch_size=2000, dry_run=False):
+    """
+    Re-decide PENDING/DECLINED applications under a policy version.
+
+    Applications are pulled in batches, decided with the vectorized evaluator
+    and written back with bulk_update. Returns a summary dict.
+    """
+    compiled = compile_policy(version)
+    if statuses is None:
+        statuses = [CreditApplication.Status.PENDING, CreditApplication.Status.DECLINED]
+
+    queryset = CreditApplication.objects.filter(status__in=statuses).order_by('id')
+    summary = {'version': compiled.version, 'evaluated': 0, 'approved': 0, 'declined': 0, 'changed': 0}
+
+    def flush(rows, previous, applicants):
+        if not rows:
+            return
+        ids, columns = extract_columns(rows)
+        approved, reasons = compiled.evaluate_batch(columns)
+        now = timezone.now()
+        updates = []
+        for app_id, is_approved, reason in zip(ids.tolist(), approved.tolist(), reasons):
+            status = CreditApplication.Status.APPROVED if is_approved else CreditApplication.Status.DECLINED
+            if status != previous[app_id]:
+                summary['changed'] += 1
+            updates.append(CreditApplication(
+                id=app_id, status=status, decision_reason=reason,
+                policy_version=compiled.version, updated_at=now))
+        summary['evaluated'] += len(ids)
+        summary['approved'] += int(approved.sum())
+        summary['declined'] += int(len(ids) - approved.sum())
+        if not dry_run:
+            CreditApplication.objects.bulk_update(
+                updates, ['status', 'decision_reason', 'policy_version', 'updated_at'],
+                batch_size=batch_size)
+            # bulk_update skips post_save, so the applicants' dashboards are refreshed here
+            bump_dashboard(*applicants)
+
+    rows, previous, applicants = [], {}, []
+    for row in queryset.values_list('status', 'user_id', *EXTRACT_FIELDS).iterator(chunk_size=batch_size):
+        previous[row[2]] = row[0]
+        applicants.append(row[1])
+        rows.append(row[2:])
+        if len(rows) >= batch_size:
+            flush(rows, previous, applicants)
+            rows, previous, applicants = [], {}, []
+    flush(rows, previous, applicants)
+
+    return summary
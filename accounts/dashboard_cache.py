@@ -0,0 +1,51 @@
+"""
+Per-user version numbers for the customer dashboard's cached fragments
+
+dashboard.html wraps its panels in {% cache %} blocks that vary on the
+user's dashboard version. Anything that changes what a user's dashboard
+shows - a payment, a plan status change, an application decision, a
+verification - bumps that user's version, which orphans their cached
+fragments at once; untouched dashboards keep being served from the cache.
+
+Versions are bumped from the post_save/post_delete signals in
+accounts/signals.py. Code that changes these rows with QuerySet.update() or
+bulk_update() must call bump_dashboard() itself.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+VERSION_KEY = 'dashboard:version:{user_id}'
+
+# Payments listed on the dashboard; the rest are on the payment history page
+DASHBOARD_TRANSACTIONS = 5
+
+
+def fragment_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 600)
+
+
+def get_dashboard_version(user_id):
+    """Return the user's dashboard version, starting a new one if it was evicted"""
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # Time-based start so an evicted counter never reuses an old version
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_dashboard(*user_ids):
+    """Drop the cached dashboard fragments of these users"""
+    for user_id in set(user_ids):
+        if user_id is None:
+            continue
+        try:
+            cache.incr(VERSION_KEY.format(user_id=user_id))
+        except ValueError:
+            # Counter missing (never set or evicted) - a fresh version is enough
+            get_dashboard_version(user_id)
@@ -2,6 +2,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import User, CreditApplication
+from phones.quotes import QUOTE_TERMS
 
 class CustomUserCreationForm(UserCreationForm):
     national_id = forms.CharField(
@@ -69,12 +70,7 @@ class CreditApplicationForm(forms.ModelForm):
     )
     
     installment_count = forms.ChoiceField(
-        choices=[
-            (6, '6 months'),
-            (12, '12 months'),
-            (18, '18 months'),
-            (24, '24 months'),
-        ],
+        choices=[(term, f'{term} months') for term in QUOTE_TERMS],
         initial=12,
         widget=forms.Select(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-indigo-500'})
     )
@@ -116,10 +112,9 @@ class CreditApplicationForm(forms.ModelForm):
             if monthly_expenses >= monthly_income:
                 raise forms.ValidationError("Monthly expenses cannot be greater than or equal to monthly income.")
 
-            # Calculate debt-to-income ratio
-            # Convert Decimal to float for calculation
-            debt_to_income = (float(monthly_expenses) / float(monthly_income)) * 100
-            if debt_to_income > 70:  # Updated to match new progressive system
+            # Calculate debt-to-income ratio against the current credit policy
+            from .credit_policy import get_policy
+            if monthly_expenses * 100 > get_policy()['max_debt_to_income'] * monthly_income:
                 raise forms.ValidationError("Your debt-to-income ratio is too high for credit approval.")
 
         # Validate guarantor information
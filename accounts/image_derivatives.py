@@ -0,0 +1,180 @@
+"""
+Resized JPEG and WebP derivatives for uploaded images
+
+Models list their image fields and target widths in IMAGE_DERIVATIVE_WIDTHS
+and keep a `<field>_variants` JSON field next to each image. When a new image
+is saved, a background worker renders every width in both formats, stores the
+files under content-hashed names (derivatives/<dir>/<sha>-<width>w.<ext>, so
+they can be cached forever) and records them in the variants field:
+
+    {'source': 'phones/a15.jpg', 'hash': '3f2a...', 'width': 2000, 'height': 2000,
+     'variants': [{'width': 320, 'jpeg': 'derivatives/phones/3f2a...-320w.jpg',
+                   'webp': 'derivatives/phones/3f2a...-320w.webp'}, ...]}
+
+Templates render them with the {% responsive_image %} tag (image_tags), which
+falls back to the original file until the derivatives exist.
+"""
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+
+JPEG_QUALITY = 80
+WEBP_QUALITY = 75
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+            thread_name_prefix='image-derivatives',
+        )
+    return _executor
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def current_variants(instance, field_name):
+    """The recorded derivatives for an image field, or None if they don't match the current image"""
+    image = getattr(instance, field_name)
+    variants = getattr(instance, variants_field(field_name), None) or {}
+    if image and variants.get('source') == image.name and variants.get('variants'):
+        return variants
+    return None
+
+
+def _flatten(image):
+    """RGB copy of an image, with transparency composited onto white"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def render_derivatives(data, widths):
+    """Render (width, format, bytes) for every target width no wider than the source"""
+    with Image.open(io.BytesIO(data)) as source:
+        image = _flatten(source)
+    targets = sorted({min(width, image.width) for width in widths})
+    for width in targets:
+        resized = image.copy()
+        resized.thumbnail((width, image.height * width // image.width or 1), Image.Resampling.LANCZOS)
+        for fmt in ('jpeg', 'webp'):
+            yield width, fmt, _encode(resized, fmt)
+
+
+def generate_derivatives(instance, field_name):
+    """Render and store derivatives for an instance's image field, returning the variants dict"""
+    image = getattr(instance, field_name)
+    widths = type(instance).IMAGE_DERIVATIVE_WIDTHS[field_name]
+    storage = image.storage
+
+    with image.open('rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    directory = os.path.join('derivatives', os.path.dirname(image.name))
+
+    with Image.open(io.BytesIO(data)) as probe:
+        probe = ImageOps.exif_transpose(probe)
+        size = probe.size
+
+    by_width = {}
+    for width, fmt, content in render_derivatives(data, widths):
+        name = os.path.join(directory, f"{digest}-{width}w.{'jpg' if fmt == 'jpeg' else 'webp'}")
+        # Same content, same name: an identical re-upload reuses the existing files
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(content))
+        by_width.setdefault(width, {'width': width})[fmt] = name
+
+    return {
+        'source': image.name,
+        'hash': digest,
+        'width': size[0],
+        'height': size[1],
+        'variants': [by_width[width] for width in sorted(by_width)],
+    }
+
+
+def refresh_derivatives(model_label, pk, field_name):
+    """Worker entry point: (re)build derivatives for one image unless they are already current"""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field_name) or current_variants(instance, field_name):
+        return None
+
+    variants = generate_derivatives(instance, field_name)
+    # Skip the write if a newer upload replaced the image while we were rendering
+    if model.objects.filter(pk=pk, **{field_name: variants['source']}).exists():
+        save_variants(instance, field_name, variants)
+    return variants
+
+
+def save_variants(instance, field_name, variants):
+    """Store rendered derivatives on the instance and save them"""
+    setattr(instance, variants_field(field_name), variants)
+    # A real save (not update()) so post_save listeners, e.g. the catalog cache, see the change.
+    # updated_at moves too, so the catalog API's ETag/Last-Modified change with the new images.
+    update_fields = [variants_field(field_name)]
+    if any(field.name == 'updated_at' for field in instance._meta.concrete_fields):
+        update_fields.append('updated_at')
+    instance.save(update_fields=update_fields)
+
+
+def _run(model_label, pk, field_name):
+    try:
+        refresh_derivatives(model_label, pk, field_name)
+    except Exception as e:
+        print(f"Error generating {field_name} derivatives for {model_label} {pk}: {e}")
+    finally:
+        close_old_connections()
+
+
+def submit(model_label, pk, field_name):
+    if getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        _get_executor().submit(_run, model_label, pk, field_name)
+    else:
+        _run(model_label, pk, field_name)
+
+
+def schedule_derivatives(instance):
+    """
+    post_save hook: queue derivative generation for every image field that changed.
+
+    Work is queued after the transaction commits so the worker sees the new
+    file name. Saving the variants themselves doesn't re-queue anything,
+    because the recorded source then matches the image.
+    """
+    for field_name in type(instance).IMAGE_DERIVATIVE_WIDTHS:
+        image = getattr(instance, field_name)
+        variants = getattr(instance, variants_field(field_name)) or {}
+        if not image:
+            if variants:
+                type(instance).objects.filter(pk=instance.pk).update(**{variants_field(field_name): {}})
+            continue
+        if variants.get('source') != image.name:
+            transaction.on_commit(
+                lambda label=instance._meta.label, pk=instance.pk, name=field_name: submit(label, pk, name))
@@ -1,9 +1,11 @@
 # accounts/jobs.py
 import stripe
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
-from .models import CreditAccount, Transaction
+from .balances import post_transaction
+from .models import CreditAccount
 from django.core.mail import send_mail
 from .currency_utils import ghs_to_usd_cents
 from django.template.loader import render_to_string
@@ -28,9 +30,28 @@ def process_daily_installments():
     for account in due_accounts:
         print(f"Processing payment for account {account.id} for user {account.user.username}")
         
+        if not account.installment_amount or account.loan_amount is None:
+            print(f"Skipping account {account.id}: it has no installment or loan amount")
+            continue
+        remaining = account.loan_amount - account.balance
+        if remaining <= 0:
+            # Paid in full some other way - settle it rather than charge nothing every day
+            account.status = CreditAccount.Status.PAID_OFF
+            account.next_payment_due_date = None
+            account.save(update_fields=['status', 'next_payment_due_date', 'updated_at'])
+            print(f"Account {account.id} was already paid in full; marked as paid off.")
+            continue
+
         try:
+            # The last installment is whatever is left (it absorbs the quote's rounding)
+            installment = min(account.installment_amount, remaining)
+
+            # One key per plan and due date: a retried run gets the same PaymentIntent back
+            # from Stripe instead of charging again, and posts the same transaction_id
+            installment_key = f"installment-{account.pk}-{account.next_payment_due_date}"
+
             # Create a PaymentIntent to charge the customer off-session
-            amount_usd_cents = ghs_to_usd_cents(account.installment_amount)
+            amount_usd_cents = ghs_to_usd_cents(installment)
             payment_intent = stripe.PaymentIntent.create(
                 amount=amount_usd_cents, # Amount in USD cents
                 currency=settings.STRIPE_CURRENCY,
@@ -39,33 +60,34 @@ def process_daily_installments():
                 payment_method=stripe.Customer.retrieve(account.user.stripe_customer_id)['invoice_settings']['default_payment_method'],
                 off_session=True, # Indicates the customer is not present
                 confirm=True, # Attempts to charge immediately
+                idempotency_key=installment_key,
             )
 
-            # If we reach here, the payment succeeded
-            account.balance += account.installment_amount
-            Transaction.objects.create(
-                account=account,
-                amount=account.installment_amount,
-                transaction_id=payment_intent.id
-            )
+            # If we reach here, the payment succeeded. The credit and the next due date
+            # commit together, so a crash can't leave a paid installment still due.
+            with transaction.atomic():
+                if post_transaction(account, installment, installment_key,
+                                    stripe_payment_intent=payment_intent.id) is None:
+                    print(f"Installment {installment_key} was already recorded")
+                    continue
 
-            # Check if the loan is fully paid off
-            if account.balance >= account.loan_amount:
-                account.status = CreditAccount.Status.PAID_OFF
-                account.next_payment_due_date = None
-                print(f"Account {account.id} is now fully paid off.")
-            else:
-                # Schedule the next payment
-                account.next_payment_due_date = today + relativedelta(months=1)
-                print(f"Account {account.id} payment successful. Next payment due {account.next_payment_due_date}")
+                # Check if the loan is fully paid off
+                if account.balance >= account.loan_amount:
+                    account.status = CreditAccount.Status.PAID_OFF
+                    account.next_payment_due_date = None
+                    print(f"Account {account.id} is now fully paid off.")
+                else:
+                    # Schedule the next payment
+                    account.next_payment_due_date = today + relativedelta(months=1)
+                    print(f"Account {account.id} payment successful. Next payment due {account.next_payment_due_date}")
 
-            account.save()
+                account.save(update_fields=['status', 'next_payment_due_date', 'updated_at'])
 
         except stripe.error.CardError as e:
             # The card has been declined
             print(f"ERROR: Card declined for account {account.id}. Error: {e.error.message}")
             account.status = CreditAccount.Status.OVERDUE
-            account.save()
+            account.save(update_fields=['status', 'updated_at'])
             
             subject = f"Action Required: Your FlexiFone Payment Failed"
             message = render_to_string('emails/payment_failed.txt', {
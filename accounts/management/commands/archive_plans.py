@@ -0,0 +1,35 @@
+"""
+Management command to move long-closed plans and their transactions to the archive tables (run nightly)
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts.archive import ARCHIVE_BATCH_SIZE, archive_closed_plans, retention_days
+
+
+class Command(BaseCommand):
+    help = 'Archive finished plans that have not changed for the retention window, in resumable batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Archive plans unchanged for this many days (default: ARCHIVE_RETENTION_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Plans moved per transaction')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else retention_days()
+        if days < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must be 0 or more and --batch-size at least 1')
+
+        def progress(plans, transactions):
+            self.stdout.write(f'  {plans} plans, {transactions} transactions archived so far')
+
+        plans, transactions = archive_closed_plans(
+            before=timezone.now() - timedelta(days=days), batch_size=options['batch_size'],
+            max_batches=options['max_batches'], progress=progress if options['verbosity'] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(f'Archived {plans} plans and {transactions} transactions'))
@@ -0,0 +1,78 @@
+"""
+Management command to benchmark the business dashboard metrics as the data grows
+
+Synthetic users and plans are created inside a transaction that is rolled
+back at the end, so nothing is left behind in the project database.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from accounts.business_metrics import compute_snapshot
+from accounts.models import CreditAccount, User
+from phones.models import Phone
+
+
+STATUSES = ['PENDING', 'ACTIVE', 'REPAYING', 'OVERDUE', 'PAID_OFF', 'COMPLETED']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Show that the business dashboard runs a constant number of queries as users and plans grow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000',
+                            help='Comma-separated numbers of synthetic customers with a plan')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per size')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        try:
+            with transaction.atomic():
+                self.run(sizes, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, sizes, repeat):
+        rng = random.Random(42)
+        phones = [Phone.objects.create(name=f'Benchmark {brand}', brand=brand, price=Decimal('1500.00'),
+                                       description='Benchmark phone', stock=0)
+                  for brand, _ in Phone.BRAND_CHOICES]
+        created = 0
+        for size in sizes:
+            users = User.objects.bulk_create([
+                User(username=f'dashboard-bench-{i}', national_id=f'BENCH-{i}',
+                     internal_credit_score=rng.randint(0, 1000))
+                for i in range(created, size)
+            ], batch_size=1000)
+            accounts = [
+                CreditAccount(
+                    user=user, phone=rng.choice(phones), status=rng.choice(STATUSES),
+                    account_type=rng.choice(['SAVINGS', 'CREDIT']),
+                    loan_amount=Decimal('1650.00'), balance=Decimal(rng.randint(0, 1650)),
+                )
+                for user in users
+            ]
+            # bulk_create skips save(), which is what normally fills plan_total
+            for account in accounts:
+                account.plan_total = account.compute_plan_total()
+            CreditAccount.objects.bulk_create(accounts, batch_size=1000)
+            created = size
+
+            with CaptureQueriesContext(connection) as queries:
+                compute_snapshot()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                compute_snapshot()
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(f"{size:>8} plans: {len(queries)} queries, best {min(timings):7.2f} ms")
+
+        self.stdout.write(self.style.SUCCESS('Query count does not depend on the number of plans'))
@@ -0,0 +1,69 @@
+"""
+Management command to benchmark the compiled credit policy evaluator
+"""
+import time
+import timeit
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from accounts.credit_policy import compile_policy
+
+
+class Command(BaseCommand):
+    help = 'Benchmark single-application and vectorized batch credit decisions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000,
+                            help='Number of synthetic applications in the batch benchmark')
+        parser.add_argument('--policy-version', type=int, default=None)
+
+    def handle(self, *args, **options):
+        policy = compile_policy(options['policy_version'])
+        rows = options['rows']
+
+        facts = {
+            'guarantor_validated': True,
+            'guarantor_notes': 'Guarantor Test User is valid',
+            'is_verified': True,
+            'profile_completion': 80,
+            'internal_credit_score': 320,
+            'available_credit': Decimal('1500.00'),
+            'phone_price': Decimal('1200.00'),
+            'installment_count': 12,
+            'monthly_income': Decimal('3000.00'),
+            'monthly_expenses': Decimal('1200.00'),
+        }
+        number = 20000
+        seconds = min(timeit.repeat(lambda: policy.evaluate(facts), number=number, repeat=5))
+        self.stdout.write(f"Single application: {seconds / number * 1e6:.2f} µs per decision")
+
+        rng = np.random.default_rng(42)
+        columns = {
+            'guarantor_validated': rng.random(rows) < 0.9,
+            'guarantor_notes': ['Guarantor validation notes'] * rows,
+            'is_verified': np.ones(rows, dtype=bool),
+            'profile_completion': rng.choice([50, 60, 70, 80, 90, 100], rows),
+            'internal_credit_score': rng.integers(0, 1000, rows),
+            'available_cents': rng.integers(0, 1_500_000, rows),
+            'price_cents': rng.integers(50_000, 1_500_000, rows),
+            'installment_count': rng.choice([6, 12, 18, 24], rows),
+            'income_cents': rng.integers(50_000, 2_000_000, rows),
+            'expenses_cents': rng.integers(0, 1_500_000, rows),
+        }
+
+        start = time.perf_counter()
+        masks = [vector(columns) for _, vector in policy.vectors]
+        approved = np.logical_and.reduce(masks)
+        decide_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        approved, reasons = policy.evaluate_batch(columns)
+        total_seconds = time.perf_counter() - start
+
+        self.stdout.write(
+            f"Batch of {rows} applications: decisions in {decide_seconds * 1000:.1f} ms "
+            f"({decide_seconds / rows * 1e9:.0f} ns per application), "
+            f"with reason text in {total_seconds * 1000:.1f} ms"
+        )
+        self.stdout.write(f"Approval rate: {approved.mean() * 100:.1f}%")
@@ -0,0 +1,130 @@
+"""
+Management command to benchmark sustained SQLite write throughput under concurrency
+
+Each request thread repeatedly runs a payment-shaped write transaction (read
+the account, insert a ledger row with a unique reference, add to the balance
+with an UPDATE) against a scratch database file in a temporary directory, so the
+project database is never touched. Three setups are compared:
+
+    default     Django's stock SQLite connection (rollback journal, DEFERRED
+                transactions, the driver's 5 s lock timeout)
+    profile     the production profile (accounts.sqlite_profile)
+    funnel      the profile plus the single-writer funnel (accounts.write_funnel)
+"""
+import os
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.test.utils import override_settings
+from accounts.write_funnel import WriteFunnel
+
+
+ACCOUNTS = 100
+
+SETUPS = ['default', 'profile', 'funnel']
+
+
+def _write(using, account_id, reference):
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT balance FROM account WHERE id = %s', [account_id])
+        cursor.execute('INSERT INTO ledger (account_id, reference, amount) VALUES (%s, %s, %s)',
+                       [account_id, reference, 125])
+        cursor.execute('UPDATE account SET balance = balance + %s WHERE id = %s', [125, account_id])
+
+
+class Command(BaseCommand):
+    help = 'Compare SQLite write throughput with N request threads: stock settings, production profile, write funnel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent request threads')
+        parser.add_argument('--seconds', type=float, default=5, help='How long each setup runs')
+        parser.add_argument('--setups', default=','.join(SETUPS),
+                            help=f"Comma-separated setups to run ({', '.join(SETUPS)})")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            for setup in options['setups'].split(','):
+                result = self.run(setup, os.path.join(directory, f'{setup}.sqlite3'),
+                                  options['threads'], options['seconds'])
+                self.stdout.write(
+                    f"{setup:<8} {options['threads']} threads: {result['writes'] / result['seconds']:8.0f} writes/s, "
+                    f"{result['errors']} 'database is locked' errors, "
+                    f"latency p50 {result['p50'] * 1000:.1f} ms, p99 {result['p99'] * 1000:.1f} ms"
+                )
+        self.stdout.write(self.style.SUCCESS('Done'))
+
+    def run(self, setup, path, threads, seconds):
+        alias = f'write_benchmark_{setup}'
+        # Persistent connections, so the funnel's writer isn't reconnecting between writes
+        connections.settings[alias] = {**connections[DEFAULT_DB_ALIAS].settings_dict, 'NAME': path, 'OPTIONS': {},
+                                       'CONN_MAX_AGE': None}
+        try:
+            with override_settings(SQLITE_PRAGMAS={}) if setup == 'default' else nullcontext():
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('CREATE TABLE account (id INTEGER PRIMARY KEY, balance INTEGER NOT NULL)')
+                    cursor.execute('CREATE TABLE ledger (id INTEGER PRIMARY KEY, account_id INTEGER NOT NULL, '
+                                   'reference TEXT NOT NULL UNIQUE, amount INTEGER NOT NULL)')
+                    cursor.executemany('INSERT INTO account (id, balance) VALUES (%s, 0)',
+                                       [(i,) for i in range(ACCOUNTS)])
+                connections[alias].close()
+                return self.hammer(alias, setup == 'funnel', threads, seconds)
+        finally:
+            connections[alias].close()
+            del connections.settings[alias]
+
+    def hammer(self, alias, use_funnel, threads, seconds):
+        funnel = WriteFunnel(alias) if use_funnel else None
+        start = threading.Barrier(threads + 1)
+        latencies = [[] for _ in range(threads)]
+        errors = [0] * threads
+
+        def request_thread(number):
+            start.wait()
+            deadline = time.perf_counter() + seconds
+            count = 0
+            try:
+                while time.perf_counter() < deadline:
+                    count += 1
+                    args = (alias, (number * 7919 + count) % ACCOUNTS, f'{number}-{count}')
+                    began = time.perf_counter()
+                    try:
+                        if funnel:
+                            funnel.run(_write, *args)
+                        else:
+                            with transaction.atomic(using=alias):
+                                _write(*args)
+                    except OperationalError:
+                        errors[number] += 1
+                        continue
+                    latencies[number].append(time.perf_counter() - began)
+            finally:
+                connections[alias].close()
+
+        workers = [threading.Thread(target=request_thread, args=(number,)) for number in range(threads)]
+        for worker in workers:
+            worker.start()
+        start.wait()
+        began = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - began
+
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*), (SELECT SUM(balance) FROM account) FROM ledger')
+            rows, total = cursor.fetchone()
+        writes = sum(len(thread_latencies) for thread_latencies in latencies)
+        assert rows == writes and total == writes * 125, 'lost or duplicated writes'
+
+        all_latencies = sorted(latency for thread_latencies in latencies for latency in thread_latencies)
+        return {
+            'writes': writes,
+            'seconds': elapsed,
+            'errors': sum(errors),
+            'p50': statistics.median(all_latencies) if all_latencies else 0,
+            'p99': all_latencies[int(len(all_latencies) * 0.99)] if all_latencies else 0,
+        }
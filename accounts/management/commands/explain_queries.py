@@ -0,0 +1,44 @@
+"""
+Management command to print SQLite's query plan for the app's hot query shapes
+
+Flags full table scans and sorts that no index supplies (see
+accounts.query_plans). With --fail-on-scan it exits with an error when any
+are found, so it can guard a CI run against a dropped or unusable index.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from accounts.query_plans import CANONICAL_QUERIES, check_plan
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN QUERY PLAN over the canonical querysets and flag full scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f"Queries to explain (default: all of {', '.join(CANONICAL_QUERIES)})")
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error if any plan has a problem')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('explain_queries reads SQLite query plans only')
+        names = options['names'] or list(CANONICAL_QUERIES)
+        unknown = [name for name in names if name not in CANONICAL_QUERIES]
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(unknown)}")
+
+        flagged = []
+        for name in names:
+            plan, problems = check_plan(name)
+            if problems:
+                flagged.append(name)
+                self.stdout.write(self.style.WARNING(f'{name}:'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}:'))
+            for detail in plan:
+                self.stdout.write(f'    {detail}' + ('    <-- no index' if detail in problems else ''))
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f"Unindexed plans: {', '.join(flagged)}")
+        if flagged:
+            self.stdout.write(self.style.WARNING(f"{len(flagged)} of {len(names)} queries need attention"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"All {len(names)} queries use an index"))
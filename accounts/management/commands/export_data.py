@@ -0,0 +1,50 @@
+"""
+Management command to write a CSV/JSONL extract of accounts, transactions or applications
+
+Rows are streamed to the file chunk by chunk (see accounts/exports.py), so
+memory use stays flat however large the table is.
+"""
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.exports import DATASETS, EXPORT_CHUNK_SIZE, FORMATS, export_filename, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV/JSONL extract of accounts, transactions or applications to a file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--from', dest='start', help='Only rows on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', help='Only rows on or before this date (YYYY-MM-DD)')
+        parser.add_argument('-o', '--output',
+                            help='File to write, or - for stdout (default: <dataset>-<YYYYMMDD>.<format>[.gz])')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help=f'Rows fetched from the database at a time (default: {EXPORT_CHUNK_SIZE})')
+
+    def handle(self, *args, **options):
+        bounds = []
+        for option in ('start', 'end'):
+            try:
+                bounds.append(date.fromisoformat(options[option]) if options[option] else None)
+            except ValueError:
+                raise CommandError(f"--{'from' if option == 'start' else 'to'} must be a date like 2025-01-31")
+
+        chunks = stream_export(options['dataset'], options['format'], *bounds,
+                               compress=options['gzip'], chunk_size=options['chunk_size'])
+        output = options['output'] or export_filename(options['dataset'], options['format'], options['gzip'])
+        if output == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        written = 0
+        with open(output, 'wb') as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+                written += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} bytes to {output}'))
@@ -24,7 +24,8 @@ class Command(BaseCommand):
                 CreditAccount.Status.CLOSED,
                 CreditAccount.Status.DECLINED,
                 CreditAccount.Status.COMPLETED,
-                CreditAccount.Status.AVAILABLE_FOR_PICKUP
+                CreditAccount.Status.AVAILABLE_FOR_PICKUP,
+                CreditAccount.Status.CANCELLED,
             ]
             
             should_be_active = account.status not in inactive_statuses
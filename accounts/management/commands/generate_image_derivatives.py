@@ -0,0 +1,40 @@
+"""
+Management command to render thumbnail/WebP derivatives for existing uploads
+"""
+from django.core.management.base import BaseCommand
+from accounts.image_derivatives import current_variants, generate_derivatives, save_variants
+from accounts.models import User
+from phones.models import Phone
+
+
+class Command(BaseCommand):
+    help = 'Generate resized JPEG and WebP derivatives for phone images and profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives even when they are already up to date'
+        )
+
+    def handle(self, *args, **options):
+        for model in (Phone, User):
+            for field_name in model.IMAGE_DERIVATIVE_WIDTHS:
+                generated = skipped = failed = 0
+                queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                for instance in queryset.iterator():
+                    if not options['force'] and current_variants(instance, field_name):
+                        skipped += 1
+                        continue
+                    try:
+                        variants = generate_derivatives(instance, field_name)
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"{model.__name__} {instance.pk}: {e}")
+                        continue
+                    save_variants(instance, field_name, variants)
+                    generated += 1
+
+                self.stdout.write(self.style.SUCCESS(
+                    f"{model.__name__}.{field_name}: {generated} generated, {skipped} up to date, {failed} failed"
+                ))
@@ -0,0 +1,51 @@
+"""
+Management command to re-decide PENDING/DECLINED credit applications after a policy change
+"""
+from django.core.management.base import BaseCommand, CommandError
+from accounts.credit_policy import reevaluate_applications, get_policy_version
+
+
+class Command(BaseCommand):
+    help = 'Re-evaluate PENDING and DECLINED credit applications under a credit policy version'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--policy-version',
+            type=int,
+            default=None,
+            help='Policy version to apply (defaults to CREDIT_POLICY_VERSION)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of applications decided and written per batch'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the outcome without saving any decisions'
+        )
+
+    def handle(self, *args, **options):
+        version = options['policy_version'] or get_policy_version()
+        self.stdout.write(f'Re-evaluating applications under credit policy v{version}...')
+
+        try:
+            summary = reevaluate_applications(
+                version=version,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Evaluated {summary['evaluated']} applications: "
+            f"{summary['approved']} approved, {summary['declined']} declined, "
+            f"{summary['changed']} changed status"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run - no decisions were saved'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Decisions saved'))
@@ -0,0 +1,40 @@
+"""
+Management command to roll up daily business metrics (run nightly, after midnight)
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts.rollups import ROLLUP_LOOKBACK_DAYS, rollup_daily_metrics, rollup_days
+
+
+class Command(BaseCommand):
+    help = 'Write DailyMetrics rows for every day that ended since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lookback',
+            type=int,
+            default=ROLLUP_LOOKBACK_DAYS,
+            help=f'Recent days to re-roll for late changes such as approvals (default: {ROLLUP_LOOKBACK_DAYS})'
+        )
+        parser.add_argument(
+            '--from',
+            dest='start',
+            help='Re-roll activity counts from this date (YYYY-MM-DD) up to yesterday'
+        )
+
+    def handle(self, *args, **options):
+        start = None
+        if options['start']:
+            try:
+                start = date.fromisoformat(options['start'])
+            except ValueError:
+                raise CommandError('--from must be a date like 2025-01-31')
+
+        days = rollup_daily_metrics(lookback=options['lookback'])
+        if start:
+            # Only activity counts are rewritten; past portfolio figures can't be recomputed
+            days = max(days, rollup_days(start, timezone.localdate() - timedelta(days=1), record_portfolio=False))
+
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {days} days'))
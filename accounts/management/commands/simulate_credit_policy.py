@@ -0,0 +1,81 @@
+"""
+Management command to replay historical credit applications under proposed policy thresholds
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.policy_simulator import expand_sweep, extract_history, simulate
+
+
+class Command(BaseCommand):
+    help = 'Simulate approval-rate and exposure changes for credit policy variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sweep',
+            action='append',
+            default=[],
+            metavar='SETTING=V1,V2,...',
+            help='Policy setting to sweep, e.g. --sweep max_debt_to_income=50,60,70,80 '
+                 '(repeat to sweep several settings; every combination is simulated)'
+        )
+        parser.add_argument(
+            '--policy-version',
+            type=int,
+            default=None,
+            help='Policy version the variants are based on (defaults to CREDIT_POLICY_VERSION)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of worker processes (defaults to one per CPU)'
+        )
+
+    def handle(self, *args, **options):
+        sweep = {}
+        for item in options['sweep']:
+            if '=' not in item:
+                raise CommandError(f"Invalid --sweep value '{item}', expected SETTING=V1,V2")
+            key, values = item.split('=', 1)
+            sweep[key.strip()] = [value.strip() for value in values.split(',') if value.strip()]
+        if not sweep:
+            raise CommandError('Provide at least one --sweep SETTING=V1,V2,...')
+
+        variants = expand_sweep(sweep)
+
+        start = time.perf_counter()
+        columns = extract_history()
+        extract_seconds = time.perf_counter() - start
+        self.stdout.write(f"Extracted {len(columns['price_cents'])} applications in {extract_seconds:.2f}s")
+
+        start = time.perf_counter()
+        try:
+            result = simulate(variants, columns=columns, base_version=options['policy_version'],
+                              workers=options['workers'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        simulate_seconds = time.perf_counter() - start
+
+        baseline = result['baseline']
+        historical = result['historical']
+        self.stdout.write(
+            f"Historical decisions: {historical['approval_rate']:.1f}% approved, "
+            f"₵{historical['exposure']:,.2f} exposure"
+        )
+        self.stdout.write(
+            f"Current policy replay: {baseline['approval_rate']:.1f}% approved, "
+            f"₵{baseline['exposure']:,.2f} exposure"
+        )
+        self.stdout.write('')
+        for variant in result['variants']:
+            label = ', '.join(f"{key}={value}" for key, value in variant['overrides'].items())
+            self.stdout.write(
+                f"{label}: {variant['approval_rate']:.1f}% approved "
+                f"({variant['approval_rate_delta']:+.1f} pts), "
+                f"₵{variant['exposure']:,.2f} exposure (₵{variant['exposure_delta']:+,.2f})"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Simulated {len(variants)} policy variants in {simulate_seconds:.2f}s"
+        ))
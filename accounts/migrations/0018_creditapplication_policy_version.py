@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_creditapplication_guarantor_national_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditapplication',
+            name='policy_version',
+            field=models.PositiveIntegerField(blank=True, help_text='Credit policy version that produced the current decision', null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_creditapplication_policy_version'),
+        ('phones', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditaccount',
+            index=models.Index(fields=['created_at', 'id'], name='creditaccount_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditaccount',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='creditaccount_status_idx'),
+        ),
+    ]
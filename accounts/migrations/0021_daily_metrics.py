@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:29
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('new_users', models.PositiveIntegerField(default=0)),
+                ('new_applications', models.PositiveIntegerField(default=0)),
+                ('approved_applications', models.PositiveIntegerField(default=0, help_text='Applications made that day that have been approved (or verified) so far')),
+                ('new_plans', models.PositiveIntegerField(default=0)),
+                ('payments_count', models.PositiveIntegerField(default=0)),
+                ('payments_received', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('brand_plans', models.JSONField(blank=True, default=dict, help_text='New plans that day by phone brand')),
+                ('outstanding_balance', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('repaying_plans', models.PositiveIntegerField(blank=True, null=True)),
+                ('overdue_plans', models.PositiveIntegerField(blank=True, null=True)),
+                ('tier_distribution', models.JSONField(blank=True, help_text='Users by credit tier at the end of the day', null=True)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily metrics',
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_daily_metrics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'timestamp', 'id'], name='transaction_account_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:53
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_plan_total(apps, schema_editor):
+    CreditAccount = apps.get_model('accounts', 'CreditAccount')
+    Phone = apps.get_model('phones', 'Phone')
+    zero = Value(Decimal('0.00'))
+    CreditAccount.objects.filter(account_type='CREDIT').update(plan_total=Coalesce('loan_amount', zero))
+    price = Phone.objects.filter(pk=OuterRef('phone_id')).values('price')[:1]
+    CreditAccount.objects.exclude(account_type='CREDIT').update(plan_total=Coalesce(Subquery(price), zero))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_transaction_account_timestamp_index'),
+        ('phones', '0010_installment_quotes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditaccount',
+            name='plan_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(fill_plan_total, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='creditaccount',
+            name='progress',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(plan_total__gt=0, then=django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('balance'), '*', models.Value(100)), '/', models.F('plan_total')), models.IntegerField())), default=models.Value(0)), output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='creditaccount',
+            name='remaining_amount',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('plan_total'), '-', models.F('balance')), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='creditaccount',
+            index=models.Index(fields=['status', 'progress'], name='creditaccount_progress_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditaccount',
+            index=models.Index(fields=['status', 'remaining_amount'], name='creditaccount_remaining_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_creditaccount_plan_progress'),
+        ('phones', '0010_installment_quotes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditaccount',
+            index=models.Index(fields=['account_type', 'status', 'next_payment_due_date'], name='creditaccount_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditapplication',
+            index=models.Index(fields=['user', 'status'], name='creditapp_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditapplication',
+            index=models.Index(fields=['status', 'created_at'], name='creditapp_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditapplication',
+            index=models.Index(condition=models.Q(('guarantor_username__isnull', False)), fields=['guarantor_username'], name='creditapp_guarantor_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def point_users_at_their_plan(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    CreditAccount = apps.get_model('accounts', 'CreditAccount')
+    newest = CreditAccount.objects.filter(user=OuterRef('pk')).order_by('-created_at', '-id').values('pk')[:1]
+    User.objects.update(current_plan=Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_hot_query_indexes'),
+        ('phones', '0010_installment_quotes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='current_plan',
+            field=models.ForeignKey(blank=True, help_text="The user's current plan", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.creditaccount'),
+        ),
+        migrations.AlterField(
+            model_name='creditaccount',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending Approval'), ('ACTIVE', 'Active'), ('COMPLETED', 'Plan Completed'), ('AVAILABLE_FOR_PICKUP', 'Available for Pickup'), ('PICKED_UP', 'Device Picked Up'), ('CLOSED', 'Plan Closed'), ('REPAYING', 'Repaying'), ('OVERDUE', 'Overdue'), ('PAID_OFF', 'Paid Off'), ('DECLINED', 'Declined'), ('CANCELLED', 'Cancelled')], default='PENDING', max_length=25),
+        ),
+        migrations.AlterField(
+            model_name='creditaccount',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_accounts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(point_users_at_their_plan, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='creditaccount',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active_plan', True), ('status__in', ['PENDING', 'ACTIVE', 'REPAYING', 'OVERDUE', 'PAID_OFF'])), fields=('user',), name='creditaccount_one_open_plan'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:05
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_plan_history'),
+        ('phones', '0010_installment_quotes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCreditAccount',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('account_type', models.CharField(choices=[('SAVINGS', 'Save-to-Own'), ('CREDIT', 'Buy Now, Pay Later')], max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending Approval'), ('ACTIVE', 'Active'), ('COMPLETED', 'Plan Completed'), ('AVAILABLE_FOR_PICKUP', 'Available for Pickup'), ('PICKED_UP', 'Device Picked Up'), ('CLOSED', 'Plan Closed'), ('REPAYING', 'Repaying'), ('OVERDUE', 'Overdue'), ('PAID_OFF', 'Paid Off'), ('DECLINED', 'Declined'), ('CANCELLED', 'Cancelled')], max_length=25)),
+                ('loan_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('installment_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('installment_count', models.IntegerField(default=12)),
+                ('created_at', models.DateTimeField()),
+                ('closed_at', models.DateTimeField(help_text='When the plan last changed before it was archived')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('phone', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='phones.phone')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_plans', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('transaction_type', models.CharField(choices=[('PAYMENT', 'Payment'), ('REFUND', 'Refund'), ('FEE', 'Fee'), ('LATE_FEE', 'Late Fee')], max_length=10)),
+                ('timestamp', models.DateTimeField()),
+                ('transaction_id', models.CharField(max_length=100, unique=True)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('stripe_payment_intent', models.CharField(blank=True, max_length=255, null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='accounts.archivedcreditaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'timestamp', 'id'], name='archivedtx_account_ts_idx')],
+            },
+        ),
+    ]
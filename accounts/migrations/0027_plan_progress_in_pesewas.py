@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:39
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0026_plan_archive'),
+    ]
+
+    # A generated column can't be altered in place, so it is dropped and re-added
+    operations = [
+        migrations.RemoveIndex(
+            model_name='creditaccount',
+            name='creditaccount_progress_idx',
+        ),
+        migrations.RemoveField(
+            model_name='creditaccount',
+            name='progress',
+        ),
+        migrations.AddField(
+            model_name='creditaccount',
+            name='progress',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(plan_total__gt=0, then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('balance'), '*', models.Value(100))), models.IntegerField()), '*', models.Value(100)), '/', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('plan_total'), '*', models.Value(100))), models.IntegerField()))), default=models.Value(0)), output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='creditaccount',
+            index=models.Index(fields=['status', 'progress'], name='creditaccount_progress_idx'),
+        ),
+    ]
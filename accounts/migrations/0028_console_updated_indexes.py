@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0027_plan_progress_in_pesewas'),
+        ('phones', '0011_brand_choices'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditaccount',
+            index=models.Index(fields=['status', 'updated_at', 'id'], name='creditaccount_status_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditaccount',
+            index=models.Index(fields=['updated_at', 'id'], name='creditaccount_updated_idx'),
+        ),
+    ]
@@ -2,6 +2,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.db.models import Sum
+from django.db.models.functions import Cast, Round
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -12,6 +14,9 @@ import uuid
 
 
 class User(AbstractUser):
+    # Derivative widths rendered for each image field (see accounts.image_derivatives)
+    IMAGE_DERIVATIVE_WIDTHS = {'profile_picture': (96, 192, 384)}
+
     # Basic Profile Information
     national_id = models.CharField(
         max_length=20, unique=True, help_text="National ID or Passport Number")
@@ -52,6 +57,7 @@ class User(AbstractUser):
     profile_picture = models.ImageField(
         upload_to='profile_pictures/', blank=True, null=True,
         help_text="Profile picture")
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     # Financial Information
     stripe_customer_id = models.CharField(
@@ -129,6 +135,17 @@ class User(AbstractUser):
         help_text="Admin who verified the guarantor"
     )
 
+    # The plan the dashboard shows: the newest one, until it is cancelled.
+    # Earlier plans stay in credit_accounts as history.
+    current_plan = models.ForeignKey(
+        'CreditAccount',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="The user's current plan"
+    )
+
     # Timestamps
     profile_updated_at = models.DateTimeField(auto_now=True)
 
@@ -211,6 +228,25 @@ class User(AbstractUser):
             'message': f'Guarantor {guarantor.get_full_name() or guarantor.username} is valid'
         }
 
+    @property
+    def credit_account(self):
+        """
+        The current plan, one primary-key lookup away.
+
+        Kept from when a user had a single CreditAccount: with no current plan
+        it raises NoCurrentPlan, which is both CreditAccount.DoesNotExist and
+        AttributeError, so `except CreditAccount.DoesNotExist` and
+        `hasattr(user, 'credit_account')` checks work as before.
+        """
+        plan = self.current_plan
+        if plan is None:
+            raise NoCurrentPlan(f"{self.username} has no current plan")
+        return plan
+
+    def has_open_plan(self):
+        """Whether the user is in the middle of a plan and can't start another"""
+        return self.current_plan is not None and self.current_plan.is_plan_active()
+
     def get_available_credit_limit(self):
         """Get available credit limit based on current usage"""
         try:
@@ -462,18 +498,24 @@ class User(AbstractUser):
             return today.year - self.date_of_birth.year - ((today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day))
         return None
 
+    # Fields that count towards profile completion (also used by bulk credit re-evaluation)
+    PROFILE_COMPLETION_FIELDS = [
+        'first_name', 'last_name', 'email', 'phone_number',
+        'address_line_1', 'city', 'region', 'date_of_birth',
+        'occupation', 'monthly_income'
+    ]
+
     def profile_completion_percentage(self):
         """Calculate profile completion percentage"""
-        fields_to_check = [
-            'first_name', 'last_name', 'email', 'phone_number',
-            'address_line_1', 'city', 'region', 'date_of_birth',
-            'occupation', 'monthly_income'
-        ]
+        fields_to_check = self.PROFILE_COMPLETION_FIELDS
         completed_fields = sum(1 for field in fields_to_check if getattr(self, field))
         return int((completed_fields / len(fields_to_check)) * 100)
 
 # 2. The core credit/savings account for each user's goal
 
+# Statuses in which a plan is still under way (see CreditAccount.is_plan_active)
+OPEN_PLAN_STATUSES = ['PENDING', 'ACTIVE', 'REPAYING', 'OVERDUE', 'PAID_OFF']
+
 
 class CreditAccount(models.Model):
     class AccountType(models.TextChoices):
@@ -491,9 +533,10 @@ class CreditAccount(models.Model):
         OVERDUE = 'OVERDUE', 'Overdue'
         PAID_OFF = 'PAID_OFF', 'Paid Off'
         DECLINED = 'DECLINED', 'Declined'
+        CANCELLED = 'CANCELLED', 'Cancelled'
 
-    user = models.OneToOneField(
-        User, on_delete=models.CASCADE, related_name='credit_account')
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='credit_accounts')
     phone = models.ForeignKey('phones.Phone', on_delete=models.PROTECT, null=True, blank=True)
     balance = models.DecimalField(
         max_digits=10, decimal_places=2, default=0.00)
@@ -535,10 +578,89 @@ class CreditAccount(models.Model):
     sms_sent_at = models.DateTimeField(null=True, blank=True, help_text="When SMS notification was sent")
     email_sent_at = models.DateTimeField(null=True, blank=True, help_text="When email notification was sent")
 
+    # What the plan pays off: loan_amount for BNPL, the phone's price for Save-to-Own.
+    # Kept in step by save() and, for price changes, by the Phone post_save signal.
+    plan_total = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    # SQL mirrors of remaining_balance / progress_percentage for filtering, sorting and
+    # aggregating. Computed by the database, so a balance updated with F() keeps them
+    # right; on an instance they are only current after a refresh_from_db().
+    remaining_amount = models.GeneratedField(
+        expression=models.F('plan_total') - models.F('balance'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    # Worked in whole pesewas: SQLite keeps decimals as floats, where 0.57 * 100 / 1.00
+    # comes out just under 57 and would truncate to 56
+    progress = models.GeneratedField(
+        expression=models.Case(
+            models.When(plan_total__gt=0, then=(
+                Cast(Round(models.F('balance') * 100), models.IntegerField()) * 100
+                / Cast(Round(models.F('plan_total') * 100), models.IntegerField())
+            )),
+            default=models.Value(0),
+        ),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the staff listings (see accounts.pagination)
+            models.Index(fields=['created_at', 'id'], name='creditaccount_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='creditaccount_status_idx'),
+            # The console's completed / pickup / picked-up tabs and its "recently updated" sort
+            models.Index(fields=['status', 'updated_at', 'id'], name='creditaccount_status_upd_idx'),
+            models.Index(fields=['updated_at', 'id'], name='creditaccount_updated_idx'),
+            models.Index(fields=['status', 'progress'], name='creditaccount_progress_idx'),
+            models.Index(fields=['status', 'remaining_amount'], name='creditaccount_remaining_idx'),
+            # The daily installment job (accounts.jobs): repaying BNPL plans due by a date
+            models.Index(fields=['account_type', 'status', 'next_payment_due_date'], name='creditaccount_due_idx'),
+        ]
+        constraints = [
+            # A user has any number of past plans but at most one under way
+            models.UniqueConstraint(
+                fields=['user'], name='creditaccount_one_open_plan',
+                condition=models.Q(is_active_plan=True, status__in=OPEN_PLAN_STATUSES),
+            ),
+        ]
+
     def __str__(self):
         phone_name = self.phone.name if self.phone else "Unknown Phone"
         return f"{self.user.username}'s {self.account_type} account for {phone_name}"
 
+    # True on plans rebuilt from the archive (ArchivedCreditAccount.to_account)
+    is_archived = False
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # compute_plan_total() may load the phone, so skip it on saves that can't change it
+        if update_fields is None:
+            self.plan_total = self.compute_plan_total()
+        elif {'loan_amount', 'phone', 'phone_id', 'account_type'} & set(update_fields):
+            self.plan_total = self.compute_plan_total()
+            kwargs['update_fields'] = {*update_fields, 'plan_total'}
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            # A new plan becomes the owner's current plan
+            User.objects.filter(pk=self.user_id).update(current_plan=self)
+            if self._meta.get_field('user').is_cached(self):
+                self.user.current_plan = self
+
+    def cancel(self):
+        """Close the plan early. It is kept, with its transactions, as history."""
+        self.status = self.Status.CANCELLED
+        self.is_active_plan = False
+        self.save(update_fields=['status', 'is_active_plan', 'updated_at'])
+        User.objects.filter(pk=self.user_id, current_plan=self).update(current_plan=None)
+        if self._meta.get_field('user').is_cached(self) and self.user.current_plan_id == self.pk:
+            self.user.current_plan = None
+
+    def compute_plan_total(self):
+        if self.account_type == self.AccountType.CREDIT:
+            return self.loan_amount or Decimal('0.00')
+        return self.phone.price if self.phone else Decimal('0.00')
+
     @property
     def remaining_balance(self):
         if self.account_type == self.AccountType.CREDIT:
@@ -581,7 +703,7 @@ class CreditAccount(models.Model):
         if self.is_eligible_for_completion():
             self.status = self.Status.COMPLETED
             self.completed_at = timezone.now()
-            self.save()
+            self.save(update_fields=['status', 'completed_at', 'updated_at'])
             return True
         return False
 
@@ -607,6 +729,9 @@ class CreditAccount(models.Model):
             self.pickup_confirmation_method = confirmation_method
             self.is_active_plan = False  # Plan is now closed
             self.save()
+
+            from phones.inventory import fulfill_account_stock
+            fulfill_account_stock(self)
             return True
         return False
 
@@ -619,10 +744,19 @@ class CreditAccount(models.Model):
             return True
         return False
 
-    def record_payment_success(self, amount):
-        """Record successful payment and update user's credit metrics"""
-        # Update account balance
-        self.balance += amount
+    def record_payment_success(self, amount, transaction_id, description='', stripe_payment_intent=None):
+        """
+        Record a successful payment and update user's credit metrics.
+
+        The webhook and the success redirect both report a payment; only the
+        first call for a transaction_id changes anything. Later ones return
+        {'upgraded': False, 'duplicate': True}.
+        """
+        from .balances import post_transaction
+
+        if post_transaction(self, amount, transaction_id, description=description,
+                            stripe_payment_intent=stripe_payment_intent) is None:
+            return {'upgraded': False, 'duplicate': True}
         self.last_payment_date = timezone.now().date()
 
         # Update next payment due date if still repaying
@@ -630,7 +764,8 @@ class CreditAccount(models.Model):
             from dateutil.relativedelta import relativedelta
             self.next_payment_due_date = self.next_payment_due_date + relativedelta(months=1)
 
-        self.save()
+        # Never write `balance` from here (see accounts.balances)
+        self.save(update_fields=['last_payment_date', 'next_payment_due_date', 'updated_at'])
 
         # Update user's credit metrics and check for tier upgrade
         upgrade_result = self.user.record_successful_payment(amount)
@@ -661,7 +796,8 @@ class CreditAccount(models.Model):
         inactive_statuses = [
             self.Status.PICKED_UP,
             self.Status.CLOSED,
-            self.Status.DECLINED
+            self.Status.DECLINED,
+            self.Status.CANCELLED,
         ]
 
         if self.status in inactive_statuses:
@@ -672,9 +808,14 @@ class CreditAccount(models.Model):
         if self.status in [self.Status.COMPLETED, self.Status.AVAILABLE_FOR_PICKUP]:
             return False
 
-        # Active statuses: PENDING, ACTIVE, REPAYING, OVERDUE, PAID_OFF
+        # Active statuses: OPEN_PLAN_STATUSES
         return True
 
+
+class NoCurrentPlan(CreditAccount.DoesNotExist, AttributeError):
+    """Raised by User.credit_account when the user has no current plan"""
+
+
 # 3. A log for every payment transaction
 
 
@@ -697,6 +838,12 @@ class Transaction(models.Model):
     stripe_payment_intent = models.CharField(
         max_length=255, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Payment history pages and statements: one range scan per account
+            models.Index(fields=['account', 'timestamp', 'id'], name='transaction_account_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.transaction_type} of ₵{self.amount} for {self.account.user.username}"
 
@@ -765,6 +912,19 @@ class CreditApplication(models.Model):
     verified_at = models.DateTimeField(null=True, blank=True, help_text='When the application was verified')
     verification_notes = models.TextField(blank=True, help_text='Admin notes during verification')
     payment_allowed = models.BooleanField(default=False, help_text='Whether user can proceed with payments')
+    policy_version = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Credit policy version that produced the current decision')
+
+    class Meta:
+        indexes = [
+            # An applicant's applications by decision (dashboard, checkout)
+            models.Index(fields=['user', 'status'], name='creditapp_user_status_idx'),
+            # The staff review queues, newest first
+            models.Index(fields=['status', 'created_at'], name='creditapp_status_created_idx'),
+            # Most applications name no guarantor, so only those that do are indexed
+            models.Index(fields=['guarantor_username'], name='creditapp_guarantor_idx',
+                         condition=models.Q(guarantor_username__isnull=False)),
+        ]
 
     def __str__(self):
         return f"Credit application by {self.user.username} for {self.phone.name}"
@@ -786,3 +946,98 @@ class CreditApplication(models.Model):
             self.save()
             return True
         return False
+
+
+class DailyMetrics(models.Model):
+    """
+    One day of business figures, written by the nightly rollup (see accounts.rollups).
+
+    Activity counts (new users, applications, plans, payments) are exact for
+    every day. Portfolio figures (outstanding balance, open plans, credit
+    tiers) can't be reconstructed for the past, so they are recorded by the
+    run just after the day ends and stay null for backfilled days.
+    """
+    date = models.DateField(unique=True)
+
+    new_users = models.PositiveIntegerField(default=0)
+    new_applications = models.PositiveIntegerField(default=0)
+    approved_applications = models.PositiveIntegerField(
+        default=0, help_text="Applications made that day that have been approved (or verified) so far")
+    new_plans = models.PositiveIntegerField(default=0)
+    payments_count = models.PositiveIntegerField(default=0)
+    payments_received = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    brand_plans = models.JSONField(default=dict, blank=True, help_text="New plans that day by phone brand")
+
+    outstanding_balance = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    repaying_plans = models.PositiveIntegerField(null=True, blank=True)
+    overdue_plans = models.PositiveIntegerField(null=True, blank=True)
+    tier_distribution = models.JSONField(null=True, blank=True, help_text="Users by credit tier at the end of the day")
+
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'Daily metrics'
+
+    def __str__(self):
+        return f"Metrics for {self.date}"
+
+
+# Cold storage for closed plans (see accounts.archive)
+
+
+class ArchivedCreditAccount(models.Model):
+    """
+    A closed plan moved out of CreditAccount, under its original id.
+
+    The columns staff and the vintage analysis use are kept as fields; `data`
+    holds every CreditAccount column so to_account() can rebuild the plan for
+    display.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_plans')
+    phone = models.ForeignKey('phones.Phone', on_delete=models.PROTECT, null=True, blank=True)
+    account_type = models.CharField(max_length=10, choices=CreditAccount.AccountType.choices)
+    status = models.CharField(max_length=25, choices=CreditAccount.Status.choices)
+    loan_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    installment_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    installment_count = models.IntegerField(default=12)
+    created_at = models.DateTimeField()
+    closed_at = models.DateTimeField(help_text="When the plan last changed before it was archived")
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"Archived plan #{self.id} of {self.user.username}"
+
+    def to_account(self):
+        """An unsaved CreditAccount with the archived values, marked is_archived"""
+        values = {}
+        for field in CreditAccount._meta.concrete_fields:
+            if field.generated or field.attname not in self.data:
+                continue
+            values[field.attname] = field.to_python(self.data[field.attname])
+        account = CreditAccount(**values)
+        account.is_archived = True
+        account._state.adding = False
+        return account
+
+
+class ArchivedTransaction(models.Model):
+    """A transaction of an archived plan, under its original id"""
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(ArchivedCreditAccount, on_delete=models.CASCADE, related_name='transactions')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TransactionType.choices)
+    timestamp = models.DateTimeField()
+    transaction_id = models.CharField(max_length=100, unique=True)
+    description = models.CharField(max_length=255, blank=True)
+    stripe_payment_intent = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'timestamp', 'id'], name='archivedtx_account_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} of ₵{self.amount} (archived plan #{self.account_id})"
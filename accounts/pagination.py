@@ -0,0 +1,173 @@
+"""
+Keyset (cursor) pagination
+
+Paginator pages cost a COUNT(*) plus an OFFSET scan that grows with the page
+number. Keyset pages instead continue from the sort key of the last row seen
+("created_at < X OR (created_at = X AND id < Y)"), which the database answers
+with an index seek, so page 1000 costs the same as page 1.
+
+Cursors are opaque signed tokens carrying the boundary row's sort key and the
+direction, e.g. ?cursor=<next_cursor>. The ordering must end in a unique
+field (normally id) and its fields must not be nullable; to sort on a
+nullable column, order by an annotation such as
+Coalesce('completed_at', 'updated_at') instead.
+"""
+import datetime
+import json
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+
+
+CURSOR_SALT = 'accounts.pagination.cursor'
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset (template-compatible with the bits of Page we use)"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _split(ordering):
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def encode_cursor(obj, ordering, direction):
+    values = [getattr(obj, name) for name, _ in _split(ordering)]
+    return signing.dumps({'k': values, 'd': direction}, salt=CURSOR_SALT,
+                         serializer=_CursorSerializer, compress=True)
+
+
+def _sort_field(queryset, name):
+    """The model field or annotation output field a sort key is read with"""
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+def decode_cursor(token, queryset, ordering):
+    """Return (sort key values, direction) for a cursor token, or raise InvalidCursor"""
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT, serializer=_CursorSerializer)
+        raw_values, direction = payload['k'], payload['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor(str(e))
+
+    fields = _split(ordering)
+    if direction not in ('next', 'prev') or len(raw_values) != len(fields):
+        raise InvalidCursor('Cursor does not match this listing')
+    try:
+        values = [_sort_field(queryset, name).to_python(value)
+                  for (name, _), value in zip(fields, raw_values)]
+    except Exception as e:
+        raise InvalidCursor(str(e))
+    return values, direction
+
+
+def _after(fields, values):
+    """Q matching rows strictly after the given sort key in the given ordering"""
+    condition = Q()
+    for index, (name, descending) in enumerate(fields):
+        step = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[index]})
+        for (equal_name, _), value in zip(fields[:index], values):
+            step &= Q(**{equal_name: value})
+        condition |= step
+    return condition
+
+
+def paginate_keyset(queryset, cursor=None, per_page=20, ordering=DEFAULT_ORDERING):
+    """
+    Return a KeysetPage of `queryset` in `ordering` starting at `cursor`.
+
+    A missing or invalid cursor gives the first page. Each page runs a single
+    query fetching per_page + 1 rows; the extra row only tells us whether
+    there is another page in that direction.
+    """
+    fields = _split(ordering)
+    direction = 'next'
+    values = None
+    if cursor:
+        try:
+            values, direction = decode_cursor(cursor, queryset, ordering)
+        except InvalidCursor:
+            values, direction = None, 'next'
+
+    if direction == 'prev':
+        # Walk backwards from the boundary, then flip the rows back into display order
+        reversed_fields = [(name, not descending) for name, descending in fields]
+        order_by = [f"{'-' if descending else ''}{name}" for name, descending in reversed_fields]
+        rows = list(queryset.filter(_after(reversed_fields, values)).order_by(*order_by)[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_previous, has_next = has_more, True
+    else:
+        filtered = queryset.filter(_after(fields, values)) if values is not None else queryset
+        rows = list(filtered.order_by(*ordering)[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = values is not None
+
+    if not rows:
+        return KeysetPage([])
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], ordering, 'next') if has_next else None,
+        previous_cursor=encode_cursor(rows[0], ordering, 'prev') if has_previous else None,
+    )
+
+
+def querystring_without(params, *names):
+    """Encode request GET params minus the given keys, for building pagination links"""
+    query = params.copy()
+    for name in names:
+        query.pop(name, None)
+    return query.urlencode()
+
+
+class _CursorSerializer:
+    """JSON serializer for cursors; keeps full datetime precision (DjangoJSONEncoder drops microseconds)"""
+
+    @staticmethod
+    def _default(value):
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f"Cannot use {type(value).__name__} in a cursor")
+
+    def dumps(self, obj):
+        return json.dumps(obj, default=self._default, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
@@ -0,0 +1,131 @@
+"""
+The app's hot query shapes and what SQLite's planner does with them
+
+    python manage.py explain_queries
+    python manage.py explain_queries installments_due payment_history --fail-on-scan
+
+CANONICAL_QUERIES holds one queryset per hot query shape, built the same
+way as the view or job that runs it (placeholder ids and dates stand in for
+real ones; the plan doesn't depend on them). check_plan() runs EXPLAIN QUERY
+PLAN and flags every full table scan, and every sort done in a temporary
+B-tree because no index supplies the order.
+
+Add a shape here when a new view or job filters or sorts a large table.
+"""
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import CreditAccount, CreditApplication, Transaction
+
+
+def _installments_due():
+    # accounts.jobs.process_daily_installments
+    return CreditAccount.objects.filter(
+        account_type=CreditAccount.AccountType.CREDIT,
+        status=CreditAccount.Status.REPAYING,
+        next_payment_due_date__lte=timezone.localdate(),
+    )
+
+
+def _console_pending():
+    # The Pending tab of customer_management_view
+    return CreditAccount.objects.filter(status='PENDING').order_by('-created_at', '-id')[:21]
+
+
+def _console_all_accounts():
+    # The All Accounts tab of customer_management_view, newest first
+    return CreditAccount.objects.order_by('-created_at', '-id')[:21]
+
+
+def _console_status_tab(status):
+    # The Completed / Available for pickup / Picked up tabs of customer_management_view
+    return lambda: CreditAccount.objects.filter(status=status).order_by('-updated_at', '-id')[:21]
+
+
+def _console_recently_updated():
+    # The All Accounts tab sorted by ACCOUNT_SORTS['recently_updated']
+    return CreditAccount.objects.order_by('-updated_at', '-id')[:21]
+
+
+def _near_completion():
+    return CreditAccount.objects.filter(status='ACTIVE', progress__gte=80)
+
+
+def _applications_by_status():
+    # The checkout views look for the customer's approved or verified application
+    return CreditApplication.objects.filter(
+        user_id=1, status__in=[CreditApplication.Status.APPROVED, CreditApplication.Status.VERIFIED])
+
+
+def _review_queue():
+    # credit_applications_view
+    return CreditApplication.objects.filter(status=CreditApplication.Status.APPROVED).order_by('-created_at')
+
+
+def _guaranteed_applications():
+    return CreditApplication.objects.filter(guarantor_username='guarantor')
+
+
+def _payment_history():
+    # accounts.views._transaction_history, first page
+    return Transaction.objects.filter(account_id=1).order_by('-timestamp', '-id')[:21]
+
+
+def _statement():
+    # accounts.statements.statement_transactions
+    now = timezone.now()
+    return Transaction.objects.filter(
+        account_id=1, timestamp__gte=now - timedelta(days=31), timestamp__lt=now,
+    ).order_by('timestamp', 'id')
+
+
+# Name -> function returning the queryset
+CANONICAL_QUERIES = {
+    'installments_due': _installments_due,
+    'console_pending': _console_pending,
+    'console_all_accounts': _console_all_accounts,
+    'console_completed': _console_status_tab('COMPLETED'),
+    'console_pickup': _console_status_tab('AVAILABLE_FOR_PICKUP'),
+    'console_picked_up': _console_status_tab('PICKED_UP'),
+    'console_recently_updated': _console_recently_updated,
+    'near_completion': _near_completion,
+    'applications_by_status': _applications_by_status,
+    'review_queue': _review_queue,
+    'guaranteed_applications': _guaranteed_applications,
+    'payment_history': _payment_history,
+    'statement': _statement,
+}
+
+
+def explain(queryset):
+    """The EXPLAIN QUERY PLAN detail lines, e.g. 'SEARCH accounts_transaction USING INDEX ...'"""
+    if connection.vendor != 'sqlite':
+        raise NotImplementedError('Query plans are only read for SQLite')
+    # Django prints each row as "id parent notused detail"
+    return [line.split(' ', 3)[-1] for line in queryset.explain().splitlines()]
+
+
+def plan_problems(plan, limited=False):
+    """
+    Full scans and sorts not backed by an index.
+
+    'SCAN t USING INDEX i' walks the whole table in index order; under a LIMIT
+    (limited=True) it stops after a page of rows, so it only counts then as a
+    problem when nothing bounds it.
+    """
+    problems = []
+    for detail in plan:
+        if detail.startswith('USE TEMP B-TREE'):
+            problems.append(detail)
+        elif detail.startswith('SCAN ') and not (limited and ' USING ' in detail):
+            problems.append(detail)
+    return problems
+
+
+def check_plan(name):
+    """(plan lines, problem lines) for one of CANONICAL_QUERIES"""
+    queryset = CANONICAL_QUERIES[name]()
+    plan = explain(queryset)
+    return plan, plan_problems(plan, limited=queryset.query.high_mark is not None)
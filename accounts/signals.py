@@ -0,0 +1,75 @@
+from django.db.backends.signals import connection_created
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from phones.models import Phone
+
+from .dashboard_cache import bump_dashboard
+from .image_derivatives import schedule_derivatives
+from .models import CreditAccount, CreditApplication, Transaction, User
+from .sqlite_profile import apply_pragmas
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    """New SQLite connections get the production profile (settings.SQLITE_PRAGMAS)"""
+    apply_pragmas(connection)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """A new profile picture gets thumbnail/WebP derivatives rendered in the background"""
+    if not raw:
+        schedule_derivatives(instance)
+    # Logging in only touches last_login, which the dashboard doesn't show
+    if not raw and set(update_fields or ()) != {'last_login'}:
+        bump_dashboard(instance.pk)
+
+
+@receiver(post_save, sender=CreditAccount)
+@receiver(post_delete, sender=CreditAccount)
+@receiver(post_save, sender=CreditApplication)
+@receiver(post_delete, sender=CreditApplication)
+def plan_changed(sender, instance, raw=False, **kwargs):
+    """Plan status changes and application decisions show on the owner's dashboard"""
+    if not raw:
+        bump_dashboard(instance.user_id)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def transaction_changed(sender, instance, raw=False, **kwargs):
+    """Payments show on the dashboard of the plan's owner"""
+    if raw:
+        return
+    try:
+        bump_dashboard(instance.account.user_id)
+    except CreditAccount.DoesNotExist:
+        # Deleted along with its plan, whose own signal bumps the dashboard
+        pass
+
+
+def sync_plan_totals(phone_ids):
+    """
+    Point the Save-to-Own plans on these phones at their current price
+    (CreditAccount.plan_total) and bump their owners' dashboards.
+
+    phone_saved() does this for Phone.save(); writes that skip post_save,
+    like the importer's bulk upsert, call it themselves.
+    """
+    price = Subquery(Phone.objects.filter(pk=OuterRef('phone_id')).values('price')[:1])
+    plans = (CreditAccount.objects.filter(phone_id__in=phone_ids)
+             .exclude(account_type=CreditAccount.AccountType.CREDIT)
+             .exclude(plan_total=F('phone__price')))
+    owners = list(plans.values_list('user_id', flat=True))
+    if owners:
+        plans.update(plan_total=price)
+        bump_dashboard(*owners)
+
+
+@receiver(post_save, sender=Phone)
+def phone_saved(sender, instance, raw=False, **kwargs):
+    """Save-to-Own plans pay off the phone's current price (CreditAccount.plan_total)"""
+    if not raw:
+        sync_plan_totals([instance.pk])
@@ -0,0 +1,51 @@
+"""
+The SQLite production profile
+
+settings.SQLITE_PRAGMAS is run on every new connection to a file database
+(from the connection_created signal, see accounts.signals):
+
+    journal_mode = WAL      readers no longer block the writer, or it them
+    synchronous = NORMAL    commit without an fsync; in WAL mode the database
+                            stays consistent, only the last commits before a
+                            power cut can be lost
+    busy_timeout = <ms>     a writer waits that long for the lock instead of
+                            failing with "database is locked"
+    mmap_size = <bytes>     read pages through a memory map, not read() calls
+
+The profile also makes transactions IMMEDIATE, unless the database's
+OPTIONS set a transaction_mode. A DEFERRED transaction that reads and then
+writes can't wait for the write lock (SQLite would risk a deadlock), so it
+fails at once with "database is locked" whatever busy_timeout says. An
+IMMEDIATE one takes the lock at BEGIN, where busy_timeout applies. Together
+this removes the lock errors seen with several workers plus the job runner.
+In-memory databases (the test suite) are left alone.
+
+WAL is a property of the database file, not the connection: the first
+connection converts an existing file for good, and it stays WAL with the
+profile switched off (PRAGMA journal_mode = DELETE converts it back).
+"""
+from django.conf import settings
+
+
+def apply_pragmas(connection):
+    """Run SQLITE_PRAGMAS on a freshly opened connection and make its transactions IMMEDIATE"""
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    if connection.transaction_mode is None:
+        connection.transaction_mode = 'IMMEDIATE'
+
+
+def current_pragmas(connection):
+    """The connection's values for the profile's PRAGMAs, e.g. {'journal_mode': 'wal', ...}"""
+    with connection.cursor() as cursor:
+        values = {}
+        for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
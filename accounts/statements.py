@@ -0,0 +1,173 @@
+"""
+Account statements: a plan's transactions over a date range as CSV or PDF
+
+Both formats are generated while the account's transactions in the date
+range stream out of .iterator(). The (account, timestamp, id) index - on
+Transaction, or on ArchivedTransaction for archived plans - answers that
+with a single range scan. The PDF is written by hand (one Courier text page
+per PAGE_LINES rows) so that it can be streamed too: object byte offsets are counted as pages go out and the
+cross-reference table is emitted last.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .archive import plan_transactions
+from .exports import buffered, date_range, encode_csv
+from .models import Transaction
+
+
+STATEMENT_CHUNK_SIZE = 500
+
+STATEMENT_FORMATS = {
+    'csv': 'text/csv',
+    'pdf': 'application/pdf',
+}
+
+PAYMENT = Transaction.TransactionType.PAYMENT
+REFUND = Transaction.TransactionType.REFUND
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842   # A4 in points
+PAGE_LINES = 60
+LINE_HEIGHT = 12
+FONT_SIZE = 9
+
+
+def statement_transactions(account, start=None, end=None):
+    """The account's transactions in the range, oldest first"""
+    return (
+        plan_transactions(account).filter(**date_range('timestamp', start, end))
+        .order_by('timestamp', 'id')
+        .only('timestamp', 'transaction_type', 'amount', 'transaction_id', 'description')
+    )
+
+
+def statement_filename(account, fmt, start=None, end=None):
+    period = '-'.join(day.strftime('%Y%m%d') for day in (start, end) if day) or timezone.localdate().strftime('%Y%m%d')
+    return f"statement-{account.id}-{period}.{fmt}"
+
+
+def _paid_in(transaction):
+    """How a row moves the amount the customer has paid in (fees are charges, not payments)"""
+    if transaction.transaction_type == PAYMENT:
+        return transaction.amount
+    if transaction.transaction_type == REFUND:
+        return -transaction.amount
+    return Decimal('0.00')
+
+
+def opening_balance(account, start):
+    """Net amount paid in before the statement period"""
+    if not start:
+        return Decimal('0.00')
+    totals = plan_transactions(account).filter(**date_range('timestamp', end=start - timedelta(days=1))).aggregate(
+        paid=Sum('amount', filter=Q(transaction_type=PAYMENT)), refunded=Sum('amount', filter=Q(transaction_type=REFUND)))
+    return (totals['paid'] or Decimal('0.00')) - (totals['refunded'] or Decimal('0.00'))
+
+
+def stream_csv_statement(account, start=None, end=None):
+    """Byte chunks of a CSV statement with a running total of net payments"""
+    def rows():
+        running = opening_balance(account, start)
+        for transaction in statement_transactions(account, start, end).iterator(chunk_size=STATEMENT_CHUNK_SIZE):
+            running += _paid_in(transaction)
+            yield (transaction.timestamp, transaction.get_transaction_type_display(), transaction.amount,
+                   running, transaction.transaction_id, transaction.description)
+
+    return buffered(encode_csv(['timestamp', 'type', 'amount', 'total_paid', 'transaction_id', 'description'], rows()))
+
+
+def _pdf_text(text):
+    """A PDF string literal in WinAnsi (Latin-1) encoding"""
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(' + escaped.encode('latin-1', 'replace') + b')'
+
+
+class _PdfWriter:
+    """Just enough of PDF 1.4 to stream pages of monospaced text"""
+
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.next_id = 4
+        self.page_ids = []
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _object(self, object_id, body):
+        self.offsets[object_id] = self.offset
+        return self._emit(b'%d 0 obj\n' % object_id + body + b'\nendobj\n')
+
+    def header(self):
+        return b''.join([
+            self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'),
+            self._object(self.CATALOG, b'<< /Type /Catalog /Pages 2 0 R >>'),
+            self._object(self.FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>'),
+        ])
+
+    def page(self, lines):
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self.page_ids.append(page_id)
+        top = PAGE_HEIGHT - 50
+        stream = b'BT /F1 %d Tf %d TL 40 %d Td ' % (FONT_SIZE, LINE_HEIGHT, top)
+        stream += b' T* '.join(_pdf_text(line) + b' Tj' for line in lines) + b' ET'
+        return b''.join([
+            self._object(content_id, b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream'),
+            self._object(page_id, b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                                  b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>'
+                         % (PAGE_WIDTH, PAGE_HEIGHT, content_id)),
+        ])
+
+    def trailer(self):
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self.page_ids)
+        data = self._object(self.PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_ids)))
+        xref_at = self.offset
+        entries = [b'0000000000 65535 f \n'] + [b'%010d 00000 n \n' % self.offsets[i] for i in range(1, self.next_id)]
+        return data + b'xref\n0 %d\n' % self.next_id + b''.join(entries) + (
+            b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_id, xref_at))
+
+
+def stream_pdf_statement(account, start=None, end=None):
+    """Byte chunks of a PDF statement, one page at a time"""
+    writer = _PdfWriter()
+    yield writer.header()
+
+    opening = opening_balance(account, start)
+    period = f"{start or account.created_at.date()} to {end or timezone.localdate()}"
+    heading = [
+        'FlexiFone - Account Statement',
+        '',
+        f"Customer: {account.user.get_full_name() or account.user.username}",
+        f"Plan:     #{account.id} {account.get_account_type_display()} - {account.phone.name if account.phone else 'No phone'}",
+        f"Period:   {period}",
+        f"Paid in before period: GHS {opening:,.2f}",
+        '',
+        f"{'Date':<17} {'Type':<10} {'Amount (GHS)':>13} {'Total paid':>13}  Reference",
+        '-' * 80,
+    ]
+    lines, running, count = heading, opening, 0
+    for transaction in statement_transactions(account, start, end).iterator(chunk_size=STATEMENT_CHUNK_SIZE):
+        running += _paid_in(transaction)
+        count += 1
+        lines.append(f"{timezone.localtime(transaction.timestamp):%Y-%m-%d %H:%M} "
+                     f"{transaction.get_transaction_type_display():<10} {transaction.amount:>13,.2f} "
+                     f"{running:>13,.2f}  {transaction.transaction_id[:24]}")
+        if len(lines) >= PAGE_LINES:
+            yield writer.page(lines)
+            lines = []
+    lines += ['-' * 80, f"{count} transactions. Total paid in at end of period: GHS {running:,.2f}"]
+    yield writer.page(lines)
+    yield writer.trailer()
+
+
+def stream_statement(account, fmt, start=None, end=None):
+    if fmt == 'pdf':
+        return stream_pdf_statement(account, start, end)
+    return stream_csv_statement(account, start, end)
@@ -0,0 +1,40 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from accounts.image_derivatives import current_variants
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(instance, field_name, sizes='100vw', alt='', css_class='', loading='lazy'):
+    """
+    Render an image field as a <picture> with WebP and JPEG srcsets.
+
+    Usage: {% responsive_image phone 'image' sizes='(min-width: 640px) 25vw, 100vw' alt=phone.name css_class='h-full w-full object-cover' %}
+    Falls back to the original upload until its derivatives have been generated.
+    """
+    image = getattr(instance, field_name, None)
+    if not image:
+        return ''
+
+    variants = current_variants(instance, field_name)
+    if variants is None:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+                           image.url, alt, css_class, loading)
+
+    storage = image.storage
+
+    def srcset(fmt):
+        return format_html_join(', ', '{} {}w', ((storage.url(v[fmt]), v['width']) for v in variants['variants']))
+
+    largest = variants['variants'][-1]
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="{}" decoding="async">'
+        '</picture>',
+        srcset('webp'), sizes,
+        storage.url(largest['jpeg']), srcset('jpeg'), sizes,
+        variants['width'], variants['height'], alt, css_class, loading,
+    )
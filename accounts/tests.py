@@ -1,3 +1,1332 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from phones.models import Phone
+from .admin import CappedCountPaginator, make_verified
+from .archive import archive_closed_plans, get_plan
+from .balances import post_transaction, refund_balance
+from .jobs import process_daily_installments
+from .sqlite_profile import current_pragmas
+from .write_funnel import WriteFunnel, WriteQueueFull
+from .credit_policy import compile_policy, compile_variant, extract_columns, row_facts, reevaluate_applications, EXTRACT_FIELDS
+from .policy_simulator import expand_sweep, extract_history, simulate
+from .models import User, ArchivedCreditAccount, ArchivedTransaction, CreditAccount, CreditApplication, DailyMetrics, Transaction
+from .pagination import paginate_keyset
+from . import business_metrics, query_plans
+from .exports import stream_export
+from .rollups import daily_trend, rollup_daily_metrics
+from .vintages import compute_vintages, extract_portfolio, get_vintages
+
+
+def make_plan(username, phone=None, status='REPAYING', account_type='CREDIT', **fields):
+    """A plan for a new user; without a phone, one priced at the loan amount is created for it"""
+    user = User.objects.create_user(username=username, national_id=f'GHA-{username}')
+    if phone is None:
+        phone = Phone.objects.create(name=f'{username} phone', brand='TECNO', price=fields.get('loan_amount', Decimal('600.00')),
+                                     description='Test phone', stock=0)
+    return CreditAccount.objects.create(user=user, phone=phone, status=status, account_type=account_type, **fields)
+
+
+def legacy_decision(facts):
+    """The approve/decline rules as they were written inline in credit_application_view"""
+    monthly_income = facts['monthly_income']
+    monthly_expenses = facts['monthly_expenses']
+    phone_price = float(facts['phone_price'])
+    available_credit = float(facts['available_credit'])
+    installment_count = facts['installment_count']
+
+    debt_to_income = (float(monthly_expenses) / float(monthly_income)) * 100 if monthly_income > 0 else 100
+
+    approval_reasons = []
+    decline_reasons = []
+
+    if facts['guarantor_validated']:
+        approval_reasons.append("Valid guarantor provided and verified")
+    else:
+        decline_reasons.append(f"Guarantor validation failed: {facts['guarantor_notes']}")
+
+    if facts['is_verified'] and facts['profile_completion'] >= 70 and facts['internal_credit_score'] >= 50:
+        approval_reasons.append("Account verified and profile complete")
+    else:
+        decline_reasons.append("Complete your profile and verify your account first")
+
+    if available_credit >= phone_price:
+        approval_reasons.append(f"Phone price (₵{phone_price}) within your credit limit (₵{available_credit} available)")
+    else:
+        decline_reasons.append(f"Phone price (₵{phone_price}) exceeds your available credit limit (₵{available_credit})")
+
+    monthly_payment = float(phone_price) / installment_count
+    if monthly_income >= monthly_payment * 2:
+        approval_reasons.append("Sufficient income for monthly payments")
+    else:
+        decline_reasons.append(f"Monthly payment (₵{monthly_payment:.2f}) too high for income (₵{monthly_income})")
+
+    if debt_to_income <= 70:
+        approval_reasons.append("Acceptable debt-to-income ratio")
+    else:
+        decline_reasons.append(f"Debt-to-income ratio too high ({debt_to_income:.1f}%)")
+
+    if len(decline_reasons) == 0:
+        return CreditApplication.Status.APPROVED, "Approved: " + "; ".join(approval_reasons)
+    return CreditApplication.Status.DECLINED, "Declined: " + "; ".join(decline_reasons)
+
+
+def make_facts(**overrides):
+    facts = {
+        'guarantor_validated': True,
+        'guarantor_notes': 'Guarantor Ama Mensah is valid',
+        'is_verified': True,
+        'profile_completion': 80,
+        'internal_credit_score': 320,
+        'available_credit': Decimal('1500.00'),
+        'phone_price': Decimal('1200.00'),
+        'installment_count': 12,
+        'monthly_income': Decimal('3000.00'),
+        'monthly_expenses': Decimal('1200.00'),
+    }
+    facts.update(overrides)
+    return facts
+
+
+class CreditPolicyGoldenTests(TestCase):
+    """The compiled policy must decide exactly like the original inline rules"""
+
+    def test_approved_reason_text(self):
+        status, reason = compile_policy(1).evaluate(make_facts())
+        self.assertEqual(status, CreditApplication.Status.APPROVED)
+        self.assertEqual(
+            reason,
+            "Approved: Valid guarantor provided and verified; Account verified and profile complete; "
+            "Phone price (₵1200.0) within your credit limit (₵1500.0 available); "
+            "Sufficient income for monthly payments; Acceptable debt-to-income ratio"
+        )
+
+    def test_declined_reason_text(self):
+        facts = make_facts(
+            guarantor_validated=False,
+            guarantor_notes='Guarantor must be a verified FlexiFone user',
+            available_credit=Decimal('500.00'),
+            monthly_income=Decimal('150.00'),
+            monthly_expenses=Decimal('120.00'),
+        )
+        status, reason = compile_policy(1).evaluate(facts)
+        self.assertEqual(status, CreditApplication.Status.DECLINED)
+        self.assertEqual(
+            reason,
+            "Declined: Guarantor validation failed: Guarantor must be a verified FlexiFone user; "
+            "Phone price (₵1200.0) exceeds your available credit limit (₵500.0); "
+            "Monthly payment (₵100.00) too high for income (₵150.00); "
+            "Debt-to-income ratio too high (80.0%)"
+        )
+
+    def test_matches_legacy_rules_across_grid(self):
+        policy = compile_policy(1)
+        grid = itertools.product(
+            [True, False],                                               # guarantor
+            [60, 70, 90],                                                # profile completion
+            [40, 50, 500],                                               # internal score
+            [Decimal('0'), Decimal('999.99'), Decimal('1000.00')],       # available credit
+            [Decimal('1000.00'), Decimal('1234.56')],                    # phone price
+            [6, 12, 18, 24],                                             # installments
+            [Decimal('0'), Decimal('200.00'), Decimal('411.52'), Decimal('5000')],  # income
+            [Decimal('0'), Decimal('140.00'), Decimal('3500.01')],       # expenses
+        )
+        for guarantor, profile, score, available, price, count, income, expenses in grid:
+            facts = make_facts(
+                guarantor_validated=guarantor, profile_completion=profile,
+                internal_credit_score=score, available_credit=available, phone_price=price,
+                installment_count=count, monthly_income=income, monthly_expenses=expenses,
+            )
+            self.assertEqual(policy.evaluate(facts), legacy_decision(facts), facts)
+
+    def test_batch_matches_single_evaluation(self):
+        policy = compile_policy(1)
+        cases = [
+            make_facts(),
+            make_facts(guarantor_validated=False, guarantor_notes='No such user'),
+            make_facts(profile_completion=60),
+            make_facts(available_credit=Decimal('1199.99')),
+            make_facts(monthly_income=Decimal('199.99'), monthly_expenses=Decimal('10.00')),
+            make_facts(monthly_income=Decimal('1000.00'), monthly_expenses=Decimal('700.00')),
+            make_facts(monthly_income=Decimal('1000.00'), monthly_expenses=Decimal('700.01')),
+        ]
+        columns = {
+            'guarantor_validated': [], 'guarantor_notes': [], 'is_verified': [],
+            'profile_completion': [], 'internal_credit_score': [], 'available_cents': [],
+            'price_cents': [], 'installment_count': [], 'income_cents': [], 'expenses_cents': [],
+        }
+        for facts in cases:
+            columns['guarantor_validated'].append(facts['guarantor_validated'])
+            columns['guarantor_notes'].append(facts['guarantor_notes'])
+            columns['is_verified'].append(facts['is_verified'])
+            columns['profile_completion'].append(facts['profile_completion'])
+            columns['internal_credit_score'].append(facts['internal_credit_score'])
+            columns['available_cents'].append(int(facts['available_credit'] * 100))
+            columns['price_cents'].append(int(facts['phone_price'] * 100))
+            columns['installment_count'].append(facts['installment_count'])
+            columns['income_cents'].append(int(facts['monthly_income'] * 100))
+            columns['expenses_cents'].append(int(facts['monthly_expenses'] * 100))
+        columns = {key: (value if key == 'guarantor_notes' else np.array(value))
+                   for key, value in columns.items()}
+
+        approved, reasons = policy.evaluate_batch(columns)
+        for i, facts in enumerate(cases):
+            status, reason = policy.evaluate(facts)
+            self.assertEqual(bool(approved[i]), status == CreditApplication.Status.APPROVED, facts)
+            self.assertEqual(reasons[i], reason, facts)
+
+
+class CreditApplicationFixtures:
+    def setUp(self):
+        self.phone = Phone.objects.create(
+            name='Galaxy A15', brand='SAMSUNG', price=Decimal('1200.00'),
+            description='Test phone', stock=5)
+        self.user = User.objects.create_user(
+            username='kofi', password='pass', national_id='GHA-001', email='kofi@example.com',
+            first_name='Kofi', last_name='Boateng', phone_number='0240000000',
+            address_line_1='1 Main St', city='Tamale', region='Northern', occupation='Teacher',
+            monthly_income=Decimal('3000.00'), is_verified=True, credit_limit=Decimal('1500.00'))
+
+    def make_application(self, **overrides):
+        data = {
+            'user': self.user, 'phone': self.phone, 'monthly_income': Decimal('3000.00'),
+            'monthly_expenses': Decimal('1200.00'), 'requested_loan_amount': self.phone.price,
+            'requested_installment_count': 12, 'credit_score_at_time_of_application': 320,
+            'guarantor_validated': True, 'guarantor_validation_notes': 'Guarantor is valid',
+            'status': CreditApplication.Status.DECLINED, 'decision_reason': 'Declined: old policy',
+        }
+        data.update(overrides)
+        return CreditApplication.objects.create(**data)
+
+
+class ReevaluateApplicationsTests(CreditApplicationFixtures, TestCase):
+
+    def test_extracted_columns_match_profile_facts(self):
+        application = self.make_application()
+        rows = list(CreditApplication.objects.filter(id=application.id).values_list(*EXTRACT_FIELDS))
+        ids, columns = extract_columns(rows)
+        facts = row_facts(columns, 0)
+        self.assertEqual(ids.tolist(), [application.id])
+        self.assertEqual(facts['profile_completion'], self.user.profile_completion_percentage())
+        self.assertEqual(facts['available_credit'], self.user.get_available_credit_limit())
+        self.assertEqual(facts['phone_price'], Decimal('1200.00'))
+
+    def test_reevaluation_updates_decisions_in_bulk(self):
+        passing = self.make_application()
+        failing = self.make_application(monthly_expenses=Decimal('2500.00'))
+        untouched = self.make_application(status=CreditApplication.Status.VERIFIED)
+
+        summary = reevaluate_applications(version=1)
+
+        self.assertEqual(summary['evaluated'], 2)
+        self.assertEqual(summary['approved'], 1)
+        self.assertEqual(summary['changed'], 1)
+        passing.refresh_from_db()
+        failing.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual(passing.status, CreditApplication.Status.APPROVED)
+        self.assertEqual(passing.policy_version, 1)
+        self.assertIn('Debt-to-income ratio too high (83.3%)', failing.decision_reason)
+        self.assertEqual(untouched.status, CreditApplication.Status.VERIFIED)
+        self.assertIsNone(untouched.policy_version)
+
+    def test_dry_run_saves_nothing(self):
+        application = self.make_application()
+        summary = reevaluate_applications(version=1, dry_run=True)
+        application.refresh_from_db()
+        self.assertEqual(summary['approved'], 1)
+        self.assertEqual(application.status, CreditApplication.Status.DECLINED)
+
+
+class PolicySimulatorTests(CreditApplicationFixtures, TestCase):
+    def test_sweep_reports_deltas_against_current_policy(self):
+        self.make_application(monthly_expenses=Decimal('1200.00'), status=CreditApplication.Status.APPROVED)
+        self.make_application(monthly_expenses=Decimal('1950.00'))  # 65% debt-to-income
+        self.make_application(monthly_expenses=Decimal('2250.00'))  # 75% debt-to-income
+
+        variants = expand_sweep({'max_debt_to_income': ['60', '80']})
+        result = simulate(variants, columns=extract_history(), workers=1)
+
+        self.assertEqual(result['historical']['approved'], 1)
+        self.assertEqual(result['baseline']['approved'], 2)
+        strict, lenient = result['variants']
+        self.assertEqual(strict['overrides'], {'max_debt_to_income': '60'})
+        self.assertEqual(strict['approved'], 1)
+        self.assertEqual(strict['exposure_delta'], -1200.0)
+        self.assertEqual(lenient['approved'], 3)
+        self.assertAlmostEqual(lenient['approval_rate_delta'], 100 / 3)
+
+    def test_parallel_workers_match_serial_run(self):
+        for expenses in ('500.00', '1000.00', '1500.00', '2000.00', '2500.00'):
+            self.make_application(monthly_expenses=Decimal(expenses))
+        columns = extract_history()
+        variants = expand_sweep({'max_debt_to_income': ['30', '50', '70'],
+                                 'income_to_payment_multiple': ['2', '40']})
+
+        serial = simulate(variants, columns=columns, workers=1)
+        parallel = simulate(variants, columns=columns, workers=2)
+
+        self.assertEqual(serial['variants'], parallel['variants'])
+
+    def test_only_thresholds_can_be_overridden(self):
+        for key in ('rules', 'no_such_setting'):
+            with self.assertRaises(ValueError):
+                compile_variant({key: ['guarantor']})
+        self.assertEqual(compile_variant({'max_debt_to_income': '60'}).policy['max_debt_to_income'], Decimal('60'))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        for index in range(25):
+            Phone.objects.create(name=f'Phone {index:02d}', brand='TECNO', price=Decimal('900.00'),
+                                 description='Test phone', stock=1)
+        # Ties on created_at must be broken by id, not skipped or repeated
+        Phone.objects.filter(name__in=['Phone 10', 'Phone 11', 'Phone 12']).update(created_at=timezone.now())
+        self.expected = list(Phone.objects.order_by('-created_at', '-id').values_list('name', flat=True))
+
+    def test_pages_walk_forward_and_back_without_gaps(self):
+        seen, pages, cursor = [], [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = paginate_keyset(Phone.objects.all(), cursor, per_page=10)
+            pages.append(page)
+            seen.extend(phone.name for phone in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertFalse(pages[0].has_previous)
+
+        back = paginate_keyset(Phone.objects.all(), pages[2].previous_cursor, per_page=10)
+        self.assertEqual([phone.name for phone in back], self.expected[10:20])
+        first = paginate_keyset(Phone.objects.all(), back.previous_cursor, per_page=10)
+        self.assertEqual([phone.name for phone in first], self.expected[:10])
+        self.assertFalse(first.has_previous)
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        page = paginate_keyset(Phone.objects.all(), 'not-a-cursor', per_page=10)
+        self.assertEqual([phone.name for phone in page], self.expected[:10])
+        self.assertFalse(page.has_previous)
+
+    def test_customer_management_listing_is_paginated(self):
+        staff = User.objects.create_user(username='admin', password='pass', national_id='GHA-ADMIN', is_staff=True)
+        phone = Phone.objects.first()
+        for index in range(30):
+            user = User.objects.create(username=f'customer{index}', national_id=f'GHA-{index}')
+            CreditAccount.objects.create(user=user, phone=phone, status='PENDING')
+        self.client.force_login(staff)
+
+        response = self.client.get(reverse('accounts:customer_management'))
+        first = response.context['all_accounts']
+        self.assertEqual((len(first), response.context['pending_count']), (25, 30))
+        response = self.client.get(reverse('accounts:customer_management'),
+                                   {'accounts_cursor': first.next_cursor})
+        self.assertEqual(len(response.context['all_accounts']), 5)
+        self.assertEqual(len(response.context['pending_accounts']), 25)
+
+
+@override_settings(DASHBOARD_SNAPSHOT_ASYNC=False)
+class CustomerManagementConsoleTests(TestCase):
+    STATUSES = ['PENDING', 'ACTIVE', 'COMPLETED', 'AVAILABLE_FOR_PICKUP', 'PICKED_UP']
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='admin', password='pass', national_id='GHA-ADMIN', is_staff=True)
+        self.phone = Phone.objects.create(name='Console Phone', brand='TECNO', price=Decimal('900.00'),
+                                          description='Test phone', stock=1)
+        self.client.force_login(self.staff)
+        self.created = 0
+
+    def add_accounts(self, count):
+        for index in range(self.created, self.created + count):
+            make_plan(f'console{index}', phone=self.phone, status=self.STATUSES[index % len(self.STATUSES)],
+                      account_type='SAVINGS' if index % 2 else 'CREDIT')
+        self.created += count
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('accounts:customer_management'))
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_accounts(self):
+        self.add_accounts(5)
+        # The first request computes the business snapshot the counts come from
+        self.count_queries()
+        few = self.count_queries()
+        self.add_accounts(120)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_counts_come_from_the_business_snapshot(self):
+        self.add_accounts(10)
+        User.objects.filter(username__in=['console0', 'console1']).update(is_verified=True)
+        stats = self.client.get(reverse('accounts:customer_management')).context['stats']
+        self.assertEqual(stats, {'total': 10, 'pending': 2, 'active': 2, 'completed': 2,
+                                 'available_for_pickup': 2, 'picked_up': 2, 'verified_users': 2})
+        # Cached: later requests don't count the plans again
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('accounts:customer_management'))
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] and 'FILTER' in q['sql']])
+
+    def test_all_accounts_are_filtered_and_sorted_server_side(self):
+        self.add_accounts(10)
+        url = reverse('accounts:customer_management')
+        response = self.client.get(url, {'status': 'ACTIVE', 'type': 'SAVINGS', 'sort': 'oldest'})
+        accounts = list(response.context['all_accounts'])
+        self.assertTrue(accounts)
+        self.assertTrue(all(a.status == 'ACTIVE' and a.account_type == 'SAVINGS' for a in accounts))
+        self.assertEqual([a.id for a in accounts], sorted(a.id for a in accounts))
+
+        today = timezone.localdate()
+        CreditAccount.objects.filter(user__username='console0').update(created_at=timezone.now() - timedelta(days=10))
+        response = self.client.get(url, {'created_to': (today - timedelta(days=5)).isoformat()})
+        self.assertEqual([a.user.username for a in response.context['all_accounts']], ['console0'])
+        # Unparseable dates and unknown sorts are ignored rather than failing
+        response = self.client.get(url, {'created_from': '2024-13-45', 'sort': 'bogus'})
+        self.assertEqual(len(response.context['all_accounts']), 10)
+        self.assertEqual(response.context['account_filters']['sort'], 'newest')
+
+    def test_tabs_page_on_last_update(self):
+        self.add_accounts(150)
+        completed = CreditAccount.objects.filter(status='COMPLETED')
+        # Touched last, so first on the tab
+        touched = completed.order_by('id').first()
+        completed.filter(pk=touched.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+        seen, cursor = [], None
+        while True:
+            page = self.client.get(reverse('accounts:customer_management'),
+                                   {'completed_cursor': cursor} if cursor else {}).context['completed_accounts']
+            seen.extend(account.id for account in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, list(completed.order_by('-updated_at', '-id').values_list('id', flat=True)))
+        self.assertEqual(seen[0], touched.pk)
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def upload(self, name, size=(1600, 1200), fmt='JPEG'):
+        buffer = io.BytesIO()
+        # Noise compresses like a photo, unlike a flat colour
+        Image.effect_noise(size, 64).convert('RGB').save(buffer, fmt, quality=95)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_new_phone_image_gets_hashed_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            phone = Phone.objects.create(name='Camon 40', brand='TECNO', price=Decimal('2500.00'),
+                                         description='Test phone', stock=3, image=self.upload('camon.jpg'))
+        saved_at = phone.updated_at
+        phone.refresh_from_db()
+        # Catalog API validators (Last-Modified/ETag) see the new images
+        self.assertGreater(phone.updated_at, saved_at)
+        variants = phone.image_variants
+        self.assertEqual(variants['source'], phone.image.name)
+        self.assertEqual([v['width'] for v in variants['variants']], [320, 640, 960])
+        self.assertTrue(variants['variants'][0]['webp'].startswith(f"derivatives/phones/{variants['hash']}-320w"))
+
+        storage = phone.image.storage
+        thumbnail = storage.size(variants['variants'][0]['webp'])
+        self.assertLess(thumbnail * 10, phone.image.size)
+
+        html = Template("{% load image_tags %}{% responsive_image phone 'image' sizes='25vw' alt=phone.name %}").render(
+            Context({'phone': phone}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f"{variants['hash']}-640w.webp 640w", html)
+
+        # Saving the variants must not queue another render
+        with self.captureOnCommitCallbacks() as callbacks:
+            phone.save()
+        self.assertEqual(callbacks, [])
+
+    def test_backfill_command_moves_updated_at(self):
+        phone = Phone.objects.create(name='Camon 30', brand='TECNO', price=Decimal('2000.00'),
+                                     description='Test phone', stock=3, image=self.upload('camon30.jpg'))
+        phone.refresh_from_db()
+        saved_at = phone.updated_at
+        call_command('generate_image_derivatives', '--force', stdout=io.StringIO())
+        phone.refresh_from_db()
+        self.assertEqual(phone.image_variants['source'], phone.image.name)
+        self.assertGreater(phone.updated_at, saved_at)
+
+    def test_profile_pictures_are_never_upscaled(self):
+        user = User.objects.create(username='ama', national_id='GHA-IMG')
+        user.profile_picture = self.upload('ama.png', size=(150, 150), fmt='PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        user.refresh_from_db()
+        self.assertEqual([v['width'] for v in user.profile_picture_variants['variants']], [96, 150])
+
+    def test_template_falls_back_to_original_until_rendered(self):
+        phone = Phone.objects.create(name='Spark 20', brand='TECNO', price=Decimal('900.00'),
+                                     description='Test phone', stock=3, image=self.upload('spark.jpg'))
+        html = Template("{% load image_tags %}{% responsive_image phone 'image' %}").render(Context({'phone': phone}))
+        self.assertIn(phone.image.url, html)
+        self.assertNotIn('srcset', html)
+
+
+@override_settings(DASHBOARD_SNAPSHOT_ASYNC=False)
+class BusinessDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phone = Phone.objects.create(name='Hot 40', brand='INFINIX', price=Decimal('1000.00'),
+                                          description='Test phone', stock=0)
+        self.staff = User.objects.create(username='staff', is_staff=True, national_id='GHA-STAFF')
+        self.client.force_login(self.staff)
+
+    def add_plans(self, count, status='REPAYING', balance='0.00'):
+        start = CreditAccount.objects.count()
+        for i in range(start, start + count):
+            make_plan(f'bi-{i}', phone=self.phone, status=status, loan_amount=Decimal('1100.00'), balance=Decimal(balance))
+
+    def test_metrics(self):
+        self.add_plans(2)
+        self.add_plans(1, status='OVERDUE', balance='300.00')
+        self.add_plans(1, status='PAID_OFF', balance='1100.00')
+        response = self.client.get(reverse('accounts:business_dashboard'))
+        self.assertEqual(response.context['active_bnpl_plans'], 3)
+        self.assertEqual(response.context['default_rate'], '33.33%')
+        self.assertEqual(response.context['total_paid_off'], 1)
+        # Plans with nothing paid yet still owe their full amount
+        self.assertEqual(response.context['outstanding_balance'], Decimal('3000.00'))
+        self.assertEqual(response.context['total_payments_received'], Decimal('1400.00'))
+        self.assertEqual(response.context['chart_data']['phone_brand_data'], [4])
+        self.assertEqual([(tier['credit_tier'], tier['plans'], tier['outstanding']) for tier in response.context['outstanding_by_tier']],
+                         [('STARTER', 3, Decimal('3000.00'))])
+
+    def test_query_count_is_constant(self):
+        self.add_plans(2)
+        with self.assertNumQueries(8):
+            business_metrics.compute_snapshot()
+        self.add_plans(20, status='OVERDUE', balance='50.00')
+        with self.assertNumQueries(8):
+            business_metrics.compute_snapshot()
+
+    def test_stale_snapshot_is_served_while_refreshing(self):
+        self.add_plans(1)
+        business_metrics.get_snapshot()
+        self.add_plans(1)
+        with self.assertNumQueries(0):
+            self.assertEqual(business_metrics.get_snapshot()['accounts']['repaying'], 1)
+
+        # A snapshot past its TTL is returned once more while a refresh replaces it
+        cache.clear()
+        with override_settings(DASHBOARD_SNAPSHOT_TTL=-1):
+            stale = business_metrics.get_snapshot()
+        self.add_plans(1)
+        self.assertEqual(business_metrics.get_snapshot(), stale)
+        self.assertEqual(business_metrics.get_snapshot()['accounts']['repaying'], 3)
+
+
+class DailyMetricsRollupTests(TestCase):
+    def setUp(self):
+        self.day1 = timezone.localdate() - timedelta(days=10)
+        self.phone = Phone.objects.create(name='Nova 12', brand='HUAWEI', price=Decimal('1000.00'),
+                                          description='Test phone', stock=0)
+        self.ama = self.make_user('ama', 0)
+        self.kofi = self.make_user('kofi', 2)
+        self.application = CreditApplication.objects.create(user=self.ama, phone=self.phone)
+        CreditApplication.objects.filter(pk=self.application.pk).update(created_at=self.at(0))
+        account = CreditAccount.objects.create(user=self.ama, phone=self.phone, status='REPAYING',
+                                               account_type='CREDIT', loan_amount=Decimal('1100.00'))
+        CreditAccount.objects.filter(pk=account.pk).update(created_at=self.at(1))
+        payment = Transaction.objects.create(account=account, amount=Decimal('100.00'), transaction_id='pi_1')
+        Transaction.objects.filter(pk=payment.pk).update(timestamp=self.at(2))
+
+    def at(self, offset):
+        return timezone.make_aware(timezone.datetime.combine(self.day1 + timedelta(days=offset),
+                                                             timezone.datetime.min.time())) + timedelta(hours=12)
+
+    def make_user(self, username, offset):
+        return User.objects.create(username=username, national_id=f'GHA-R-{username}', date_joined=self.at(offset))
+
+    def test_first_run_backfills_and_records_portfolio_for_yesterday(self):
+        today = self.day1 + timedelta(days=3)
+        with self.assertNumQueries(18):
+            self.assertEqual(rollup_daily_metrics(today=today), 3)
+        rows = {row.date: row for row in DailyMetrics.objects.all()}
+        day1, day2, day3 = (rows[self.day1 + timedelta(days=i)] for i in range(3))
+        self.assertEqual((day1.new_users, day1.new_applications, day1.approved_applications), (1, 1, 0))
+        self.assertEqual((day2.new_plans, day2.brand_plans), (1, {'HUAWEI': 1}))
+        self.assertEqual((day3.new_users, day3.payments_count, day3.payments_received), (1, 1, Decimal('100.00')))
+        # Today's portfolio can't describe past days
+        self.assertIsNone(day1.outstanding_balance)
+        self.assertEqual((day3.outstanding_balance, day3.repaying_plans), (Decimal('1100.00'), 1))
+        self.assertEqual(sum(day3.tier_distribution.values()), 2)
+
+    def test_incremental_runs_pick_up_late_approvals(self):
+        rollup_daily_metrics(today=self.day1 + timedelta(days=3))
+        CreditApplication.objects.filter(pk=self.application.pk).update(status='APPROVED')
+        self.assertEqual(rollup_daily_metrics(today=self.day1 + timedelta(days=4), lookback=4), 4)
+        self.assertEqual(DailyMetrics.objects.get(date=self.day1).approved_applications, 1)
+        self.assertEqual(DailyMetrics.objects.count(), 4)
+        # The portfolio recorded on an earlier run is kept
+        self.assertIsNotNone(DailyMetrics.objects.get(date=self.day1 + timedelta(days=2)).outstanding_balance)
+
+        trend = daily_trend(days=2, today=self.day1 + timedelta(days=4))
+        self.assertEqual([row.date for row in trend], [self.day1 + timedelta(days=i) for i in (2, 3)])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='admin', password='pass', national_id='GHA-ADMIN', is_staff=True)
+        phone = Phone.objects.create(name='Export Phone', brand='TECNO', price=Decimal('900.00'),
+                                     description='Test phone', stock=1)
+        user = User.objects.create(username='ama', national_id='GHA-E1')
+        self.account = CreditAccount.objects.create(user=user, phone=phone, status='REPAYING', loan_amount=Decimal('990.00'))
+        for index in range(5):
+            payment = Transaction.objects.create(account=self.account, amount=Decimal('12.50'), transaction_id=f'pi_{index}',
+                                                 description='Paid, "in full"' if index == 0 else '')
+            Transaction.objects.filter(pk=payment.pk).update(timestamp=timezone.now() - timedelta(days=index * 10))
+
+    def test_csv_export_streams_every_row(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('accounts:export', args=['transactions']))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="transactions-', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['transaction_id'] for row in rows], [f'pi_{index}' for index in range(5)])
+        self.assertEqual(rows[0]['description'], 'Paid, "in full"')
+        self.assertEqual(rows[0]['username'], 'ama')
+
+    def test_gzip_jsonl_export_with_date_range(self):
+        self.client.force_login(self.staff)
+        today = timezone.localdate()
+        response = self.client.get(reverse('accounts:export', args=['transactions']), {
+            'format': 'jsonl', 'gzip': '1',
+            'from': (today - timedelta(days=25)).isoformat(), 'to': (today - timedelta(days=5)).isoformat(),
+        })
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)['transaction_id'] for line in lines], ['pi_1', 'pi_2'])
+        self.assertEqual(json.loads(lines[0])['amount'], '12.50')
+
+    def test_rejects_bad_requests_and_non_staff(self):
+        url = reverse('accounts:export', args=['transactions'])
+        self.client.force_login(User.objects.get(username='ama'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('accounts:export', args=['users'])).status_code, 404)
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2025-02-30'}).status_code, 400)
+
+    def test_rows_are_read_in_chunks(self):
+        with self.assertNumQueries(0):
+            chunks = stream_export('transactions', chunk_size=2)
+        # The header is sent before any later rows are read
+        self.assertTrue(next(chunks).startswith(b'id,transaction_id,'))
+        self.assertEqual(len(b''.join(chunks).splitlines()), 5)
+
+    def test_command_writes_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'accounts.csv.gz')
+        call_command('export_data', 'accounts', '--gzip', '-o', path, stdout=io.StringIO())
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(open(path, 'rb').read()).decode())))
+        self.assertEqual([(row['username'], row['loan_amount']) for row in rows], [('ama', '990.00')])
+
+
+class VintageAnalysisTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate().replace(day=15)
+        phone = Phone.objects.create(name='Vintage Phone', brand='TECNO', price=Decimal('1000.00'),
+                                     description='Test phone', stock=0)
+        self.plans = []
+        # Two plans opened three months ago, one last month, plus ones that are not part of any vintage
+        for index, (months_ago, status) in enumerate([(3, 'REPAYING'), (3, 'OVERDUE'), (1, 'REPAYING'), (1, 'PENDING')]):
+            user = User.objects.create(username=f'vintage{index}', national_id=f'GHA-V{index}')
+            plan = CreditAccount.objects.create(user=user, phone=phone, status=status, account_type='CREDIT',
+                                                loan_amount=Decimal('1200.00'), installment_amount=Decimal('100.00'),
+                                                installment_count=12)
+            CreditAccount.objects.filter(pk=plan.pk).update(created_at=self.month_start(months_ago))
+            self.plans.append(plan)
+        savings = CreditAccount.objects.create(user=User.objects.create(username='saver', national_id='GHA-VS'),
+                                               phone=phone, status='ACTIVE', account_type='SAVINGS', loan_amount=Decimal('1000.00'))
+        self.pay(savings, 3, Decimal('500.00'))
+
+        # Plan 0 pays on schedule, plan 1 only pays once; plan 2 pays, is refunded, then pays again
+        for months_ago in (2, 1, 0):
+            self.pay(self.plans[0], months_ago, Decimal('100.00'))
+        self.pay(self.plans[1], 2, Decimal('100.00'))
+        self.pay(self.plans[2], 0, Decimal('100.00'))
+        self.pay(self.plans[2], 0, Decimal('100.00'), 'REFUND')
+        self.pay(self.plans[2], 0, Decimal('100.10'))
+
+    def month_start(self, months_ago):
+        year, month = divmod(self.today.year * 12 + self.today.month - 1 - months_ago, 12)
+        return timezone.make_aware(timezone.datetime(year, month + 1, 10, 12))
+
+    def pay(self, plan, months_ago, amount, kind='PAYMENT'):
+        payment = Transaction.objects.create(account=plan, amount=amount, transaction_type=kind,
+                                             transaction_id=f'pi_{Transaction.objects.count()}')
+        Transaction.objects.filter(pk=payment.pk).update(timestamp=self.month_start(months_ago))
+
+    def test_cohort_matrices(self):
+        # Plans and payments, from the live and the archive tables
+        with self.assertNumQueries(4):
+            portfolio = extract_portfolio()
+        result = compute_vintages(portfolio, self.today)
+        cohort = lambda months_ago: self.month_start(months_ago).strftime('%Y-%m')
+        self.assertEqual(result['cohorts'], [cohort(3), cohort(1)])
+        self.assertEqual(result['plans'], [2, 1])
+        self.assertEqual(result['principal'], [2400.0, 1200.0])
+        self.assertEqual(result['months_on_book'], [0, 1, 2, 3])
+        # Cohort 1: M1 both paid (200/2400), M2 only plan 0 (300), M3 plan 0 again (400)
+        self.assertEqual(result['repayment'][0], [0.0, 8.3, 12.5, 16.7])
+        self.assertEqual(result['delinquency'][0], [0.0, 0.0, 50.0, 50.0])
+        # Cohort 2 is only observed up to M1; the refund nets out
+        self.assertEqual(result['repayment'][1], [0.0, 8.3, None, None])
+        self.assertEqual(result['delinquency'][1], [0.0, 0.0, None, None])
+
+    @override_settings(TIME_ZONE='Pacific/Auckland')
+    def test_months_are_utc_months_on_every_backend(self):
+        # Late on the last day of a month in UTC is already the next month in Auckland
+        last_day = self.month_start(2).astimezone(dt_timezone.utc).replace(day=1, hour=0) - timedelta(hours=1)
+        CreditAccount.objects.filter(pk=self.plans[0].pk).update(created_at=last_day)
+        portfolio = extract_portfolio()
+        with mock.patch('accounts.vintages._stored_as_utc_text', return_value=False):
+            extracted = extract_portfolio()
+        for name, column in portfolio.items():
+            self.assertEqual(column.tolist(), extracted[name].tolist(), name)
+        origination = dict(zip(portfolio['plan_id'].tolist(), portfolio['origination'].tolist()))
+        self.assertEqual(origination[self.plans[0].pk], last_day.year * 12 + last_day.month - 1)
+
+    def test_empty_portfolio(self):
+        CreditAccount.objects.all().delete()
+        self.assertEqual(compute_vintages(extract_portfolio(), self.today)['cohorts'], [])
+
+    def test_page_is_cached_for_the_day(self):
+        staff = User.objects.create_user(username='admin', password='pass', national_id='GHA-ADMIN', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('accounts:vintage_analysis'))
+        self.assertEqual(len(response.context['cohorts']), 2)
+        with self.assertNumQueries(0):
+            get_vintages()
+
+
+class DashboardFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ama', password='pass', national_id='GHA-D1')
+        phone = Phone.objects.create(name='Dash Phone', brand='TECNO', price=Decimal('1000.00'),
+                                     description='Test phone', stock=3)
+        self.account = CreditAccount.objects.create(user=self.user, phone=phone, status='REPAYING', account_type='CREDIT',
+                                                    loan_amount=Decimal('1100.00'), installment_amount=Decimal('100.00'))
+        CreditApplication.objects.create(user=self.user, phone=phone, status='VERIFIED')
+        for index in range(8):
+            Transaction.objects.create(account=self.account, amount=Decimal('100.00'), transaction_id=f'pi_d{index}')
+        self.client.force_login(self.user)
+
+    def render(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('accounts:dashboard'))
+        return response, len(queries)
+
+    def test_returning_user_is_served_from_cache(self):
+        response, cold = self.render()
+        self.assertContains(response, 'Recent Payments')
+        self.assertContains(response, reverse('accounts:payment_history'))
+        self.assertEqual(len(response.context['transactions']), 5)
+        _, warm = self.render()
+        self.assertLess(warm, cold)
+        # Session, user and the plan lookup; panels, payments and applications come from the cache
+        self.assertEqual(warm, 3)
+
+    def test_payments_and_status_changes_refresh_the_panels(self):
+        response, _ = self.render()
+        self.assertNotContains(response, 'Overdue')
+        Transaction.objects.create(account=self.account, amount=Decimal('42.00'), transaction_id='pi_new')
+        response, _ = self.render()
+        self.assertContains(response, '₵42.00')
+
+        self.account.status = 'OVERDUE'
+        self.account.save()
+        response, _ = self.render()
+        self.assertContains(response, 'Overdue')
+
+    def test_logging_in_keeps_the_cache(self):
+        self.render()
+        self.client.logout()
+        self.client.login(username='ama', password='pass')
+        _, queries = self.render()
+        self.assertEqual(queries, 3)
+
+    def test_admin_verification_refreshes_the_panels(self):
+        self.render()
+        # As from the changelist filtered to unverified users
+        make_verified(None, None, User.objects.filter(is_verified=False))
+        _, queries = self.render()
+        self.assertGreater(queries, 3)
+
+
+class PaymentHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ama', password='pass', national_id='GHA-H1')
+        phone = Phone.objects.create(name='History Phone', brand='TECNO', price=Decimal('1000.00'),
+                                     description='Test phone', stock=0)
+        self.account = CreditAccount.objects.create(user=self.user, phone=phone, status='ACTIVE', account_type='SAVINGS',
+                                                    loan_amount=Decimal('1000.00'))
+        self.now = timezone.now()
+        for index in range(45):
+            payment = Transaction.objects.create(account=self.account, amount=Decimal('10.00'), transaction_id=f'pi_h{index:02d}')
+            Transaction.objects.filter(pk=payment.pk).update(timestamp=self.now - timedelta(days=index))
+        refund = Transaction.objects.create(account=self.account, amount=Decimal('5.00'), transaction_id='re_h',
+                                            transaction_type='REFUND', description='Partial refund (duplicate)')
+        Transaction.objects.filter(pk=refund.pk).update(timestamp=self.now - timedelta(days=10, hours=1))
+        self.client.force_login(self.user)
+
+    def test_history_is_keyset_paginated(self):
+        url = reverse('accounts:payment_history')
+        seen, cursor = [], None
+        while True:
+            page = self.client.get(url, {'cursor': cursor} if cursor else {}).context['transactions']
+            self.assertLessEqual(len(page), 20)
+            seen.extend(transaction.transaction_id for transaction in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(len(seen), 46)
+        self.assertEqual(seen[:2], ['pi_h00', 'pi_h01'])
+
+    def test_date_filter(self):
+        today = timezone.localdate()
+        response = self.client.get(reverse('accounts:payment_history'), {
+            'from': (today - timedelta(days=12)).isoformat(), 'to': (today - timedelta(days=10)).isoformat()})
+        self.assertEqual([t.transaction_id for t in response.context['transactions']], ['pi_h10', 're_h', 'pi_h11', 'pi_h12'])
+        self.assertIn('format=pdf', response.content.decode())
+
+    def test_history_page_uses_account_timestamp_index(self):
+        queryset = Transaction.objects.filter(account=self.account).order_by('-timestamp', '-id')[:21]
+        self.assertIn('transaction_account_ts_idx', queryset.explain())
+
+    def test_csv_statement_has_running_total(self):
+        today = timezone.localdate()
+        response = self.client.get(reverse('accounts:statement'), {
+            'format': 'csv', 'from': (today - timedelta(days=11)).isoformat(), 'to': (today - timedelta(days=10)).isoformat()})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        # 33 payments fall before the period
+        self.assertEqual([(row['type'], row['total_paid']) for row in rows],
+                         [('Payment', '340.00'), ('Refund', '335.00'), ('Payment', '345.00')])
+
+    def test_pdf_statement_is_well_formed(self):
+        response = self.client.get(reverse('accounts:statement'), {'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.endswith(b'%%EOF\n'))
+        self.assertIn(b'Refund', pdf)
+        self.assertIn(b'46 transactions', pdf)
+        # Every cross-reference entry points at its object
+        xref_at = int(pdf.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+        entries = pdf[xref_at:].split(b'\n')[2:]
+        for number, entry in enumerate(entries[1:], start=1):
+            if not entry.endswith(b' n '):
+                break
+            offset = int(entry.split()[0])
+            self.assertTrue(pdf[offset:].startswith(b'%d 0 obj' % number))
+        self.assertIn(b'/Count 1', pdf)
+
+    def test_statements_are_private(self):
+        other = User.objects.create_user(username='kofi', password='pass', national_id='GHA-H2')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('accounts:statement')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('accounts:account_statement', args=[self.account.id])).status_code, 302)
+        staff = User.objects.create_user(username='admin', password='pass', national_id='GHA-ADMIN', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('accounts:account_statement', args=[self.account.id]), {'format': 'csv'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 47)
+        response = self.client.get(reverse('accounts:account_detail', args=[self.account.id]))
+        self.assertEqual(len(response.context['transactions']), 20)
+
+
+class PlanProgressColumnTests(TestCase):
+    def setUp(self):
+        self.phone = Phone.objects.create(name='Column Phone', brand='TECNO', price=Decimal('800.00'),
+                                          description='Test phone', stock=0)
+
+    def test_columns_match_properties(self):
+        plans = [
+            make_plan('saver', phone=self.phone, status='ACTIVE', account_type='SAVINGS', balance=Decimal('700.00')),
+            make_plan('borrower', phone=self.phone, status='ACTIVE', loan_amount=Decimal('1200.00'), balance=Decimal('300.00')),
+            make_plan('unpriced', phone=self.phone, status='ACTIVE', balance=Decimal('0.00')),
+        ]
+        for plan in plans:
+            plan.refresh_from_db()
+            self.assertEqual((plan.remaining_amount, plan.progress), (plan.remaining_balance, plan.progress_percentage))
+        self.assertEqual(list(CreditAccount.objects.filter(status='ACTIVE', progress__gt=80).values_list('user__username', flat=True)),
+                         ['saver'])
+
+    def test_balance_updates_and_price_changes_are_reflected(self):
+        plan = make_plan('saver', phone=self.phone, status='ACTIVE', account_type='SAVINGS', balance=Decimal('100.00'))
+        CreditAccount.objects.filter(pk=plan.pk).update(balance=F('balance') + Decimal('300.00'))
+        plan.refresh_from_db()
+        self.assertEqual((plan.remaining_amount, plan.progress), (Decimal('400.00'), 50))
+
+        self.phone.price = Decimal('1000.00')
+        self.phone.save()
+        plan.refresh_from_db()
+        self.assertEqual((plan.plan_total, plan.remaining_amount, plan.progress), (Decimal('1000.00'), Decimal('600.00'), 40))
+
+        plan.account_type, plan.loan_amount = 'CREDIT', Decimal('2000.00')
+        plan.save(update_fields=['account_type', 'loan_amount'])
+        plan.refresh_from_db()
+        self.assertEqual((plan.plan_total, plan.progress), (Decimal('2000.00'), 20))
+
+    def test_progress_is_not_thrown_off_by_float_rounding(self):
+        # 0.57 * 100 / 1.00 is 56.99999... in floating point
+        plans = [
+            make_plan('cents', phone=self.phone, status='ACTIVE', loan_amount=Decimal('1.00'), balance=Decimal('0.57')),
+            make_plan('thirds', phone=self.phone, status='ACTIVE', loan_amount=Decimal('300.00'), balance=Decimal('200.00')),
+            make_plan('saver', phone=self.phone, status='ACTIVE', account_type='SAVINGS', balance=Decimal('456.00')),
+        ]
+        for plan in plans:
+            plan.refresh_from_db()
+            self.assertEqual(plan.progress, plan.progress_percentage)
+        self.assertEqual([plan.progress for plan in plans], [57, 66, 57])
+
+    def test_saves_that_cant_change_the_total_skip_it(self):
+        plan = CreditAccount.objects.get(pk=make_plan('saver', phone=self.phone, status='ACTIVE', account_type='SAVINGS').pk)
+        plan.status = 'COMPLETED'
+        with self.assertNumQueries(1):
+            plan.save(update_fields=['status'])
+
+
+class QueryPlanTests(TestCase):
+    def test_canonical_queries_use_indexes(self):
+        for name in query_plans.CANONICAL_QUERIES:
+            with self.subTest(name):
+                plan, problems = query_plans.check_plan(name)
+                self.assertTrue(plan)
+                self.assertEqual(problems, [])
+
+    def test_full_scans_are_flagged(self):
+        unindexed = {'by_pickup_location': lambda: CreditAccount.objects.filter(pickup_location='Tamale')}
+        with mock.patch.dict(query_plans.CANONICAL_QUERIES, unindexed):
+            self.assertEqual(query_plans.check_plan('by_pickup_location')[1], ['SCAN accounts_creditaccount'])
+            out = io.StringIO()
+            call_command('explain_queries', 'by_pickup_location', stdout=out)
+            self.assertIn('<-- no index', out.getvalue())
+            with self.assertRaises(CommandError):
+                call_command('explain_queries', 'by_pickup_location', '--fail-on-scan', stdout=io.StringIO())
+        # An index walk under a LIMIT reads one page, without one it reads the table
+        walk = ['SCAN accounts_creditaccount USING INDEX creditaccount_created_idx']
+        self.assertEqual(query_plans.plan_problems(walk, limited=True), [])
+        self.assertEqual(query_plans.plan_problems(walk), walk)
+
+
+class PlanHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='abena', password='pass', national_id='GHA-P1')
+        self.phones = [Phone.objects.create(name=f'Plan Phone {index}', brand='TECNO', price=Decimal('500.00'),
+                                            description='Test phone', stock=3) for index in range(2)]
+        self.client.force_login(self.user)
+
+    def select(self, phone):
+        self.client.get(reverse('accounts:select_phone', args=[phone.id]))
+        self.user.refresh_from_db()
+        return self.user.current_plan
+
+    def test_cancelled_plan_is_kept_with_its_payments(self):
+        plan = self.select(self.phones[0])
+        self.client.post(reverse('accounts:agreement', args=[plan.id]))
+        CreditAccount.objects.filter(pk=plan.pk).update(balance=Decimal('120.00'))
+        self.client.post(reverse('accounts:cancel_plan'))
+
+        plan.refresh_from_db()
+        self.assertEqual(plan.status, 'CANCELLED')
+        self.assertEqual(list(plan.transactions.values_list('transaction_type', 'amount')), [('REFUND', Decimal('120.00'))])
+        self.assertEqual(plan.balance, Decimal('0.00'))
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.current_plan)
+        self.assertFalse(hasattr(self.user, 'credit_account'))
+        with self.assertRaises(CreditAccount.DoesNotExist):
+            self.user.credit_account
+
+    def test_new_plan_keeps_the_previous_one(self):
+        first = self.select(self.phones[0])
+        # Still under way, so a second selection is refused
+        self.assertEqual(self.select(self.phones[1]), first)
+        CreditAccount.objects.filter(pk=first.pk).update(status='CLOSED', is_active_plan=False)
+
+        second = self.select(self.phones[1])
+        self.assertNotEqual(second, first)
+        self.assertEqual(list(self.user.credit_accounts.order_by('id')), [first, second])
+        self.assertEqual(CreditAccount.objects.get(pk=first.pk).phone, self.phones[0])
+
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.credit_account, second)
+
+    def test_one_open_plan_per_user_is_enforced_by_the_database(self):
+        CreditAccount.objects.create(user=self.user, phone=self.phones[0], account_type='SAVINGS', status='ACTIVE')
+        CreditAccount.objects.create(user=self.user, phone=self.phones[1], account_type='SAVINGS', status='CLOSED')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CreditAccount.objects.create(user=self.user, phone=self.phones[1], account_type='SAVINGS', status='REPAYING')
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.phone = Phone.objects.create(name='Archive Phone', brand='TECNO', price=Decimal('600.00'),
+                                          description='Test phone', stock=0)
+        self.long_ago = timezone.now() - timedelta(days=400)
+        self.closed = [self.make_aged_plan(f'closed{index}', 'CLOSED', self.long_ago) for index in range(3)]
+        self.recent = self.make_aged_plan('recent', 'PICKED_UP', timezone.now())
+        self.repaying = self.make_aged_plan('repaying', 'REPAYING', self.long_ago)
+
+    def make_aged_plan(self, username, status, updated_at):
+        """A plan with three payments, last changed at updated_at"""
+        plan = make_plan(username, phone=self.phone, status=status, loan_amount=Decimal('600.00'),
+                         installment_amount=Decimal('50.00'), balance=Decimal('150.00'), is_active_plan=False)
+        for index in range(3):
+            Transaction.objects.create(account=plan, amount=Decimal('50.00'), transaction_id=f'pi_{username}_{index}')
+        CreditAccount.objects.filter(pk=plan.pk).update(updated_at=updated_at)
+        return plan
+
+    def test_archives_in_resumable_batches(self):
+        call_command('archive_plans', '--batch-size', '2', '--max-batches', '1', stdout=io.StringIO())
+        self.assertEqual(ArchivedCreditAccount.objects.count(), 2)
+        out = io.StringIO()
+        call_command('archive_plans', '--batch-size', '2', stdout=out)
+        self.assertIn('Archived 1 plans and 3 transactions', out.getvalue())
+
+        closed_ids = [plan.pk for plan in self.closed]
+        self.assertEqual(sorted(ArchivedCreditAccount.objects.values_list('id', flat=True)), closed_ids)
+        self.assertEqual(ArchivedTransaction.objects.count(), 9)
+        self.assertFalse(CreditAccount.objects.filter(pk__in=closed_ids).exists())
+        self.assertFalse(Transaction.objects.filter(account_id__in=closed_ids).exists())
+        self.assertEqual(CreditAccount.objects.count(), 2)
+        # Archived plans are no one's current plan any more
+        self.assertIsNone(User.objects.get(username='closed0').current_plan)
+        self.assertEqual(User.objects.get(username='recent').current_plan, self.recent)
+
+    def test_history_reads_through_to_the_archive(self):
+        plan = self.closed[0]
+        self.assertEqual(archive_closed_plans(), (3, 9))
+        rebuilt = get_plan(plan.pk)
+        self.assertTrue(rebuilt.is_archived)
+        self.assertEqual((rebuilt.user.username, rebuilt.status, rebuilt.loan_amount, rebuilt.created_at),
+                         ('closed0', 'CLOSED', Decimal('600.00'), plan.created_at))
+
+        staff = User.objects.create_user(username='admin', password='pass', national_id='GHA-ADMIN', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('accounts:account_detail', args=[plan.pk]))
+        self.assertEqual(len(response.context['transactions']), 3)
+        self.assertContains(response, 'Archived')
+        response = self.client.get(reverse('accounts:account_statement', args=[plan.pk]), {'format': 'csv'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 4)
+        self.assertEqual(self.client.get(reverse('accounts:account_detail', args=[999999])).status_code, 404)
+
+        # Vintage curves still count archived plans and their payments
+        portfolio = extract_portfolio()
+        self.assertEqual(sorted(portfolio['plan_id']), sorted([*(p.pk for p in self.closed), self.recent.pk, self.repaying.pk]))
+        self.assertEqual(len(portfolio['payment_plan_id']), 15)
+
+    def test_lifetime_figures_and_exports_include_archived_plans(self):
+        self.make_aged_plan('paid', 'PAID_OFF', self.long_ago)
+
+        def figures():
+            snapshot = business_metrics.compute_snapshot()
+            extracts = [b''.join(stream_export(dataset, fmt)) for dataset in ('accounts', 'transactions')
+                        for fmt in ('csv', 'jsonl')]
+            return snapshot['accounts'], snapshot['popular_brands'], extracts
+
+        before = figures()
+        self.assertEqual(archive_closed_plans(), (4, 12))
+        self.assertEqual(figures(), before)
+        accounts, brands, extracts = before
+        self.assertEqual((accounts['paid_off'], accounts['total_loan_value'], accounts['total_amount_paid']),
+                         (1, Decimal('3600.00'), Decimal('900.00')))
+        self.assertEqual(brands, [{'phone__brand': 'TECNO', 'count': 6}])
+        self.assertEqual(len(extracts[0].splitlines()), 7)
+
+    def test_customers_still_see_their_archived_history(self):
+        plan = self.closed[0]
+        archive_closed_plans()
+        self.client.force_login(plan.user)
+        # With no current plan left, the page falls back to the latest past one
+        response = self.client.get(reverse('accounts:payment_history'))
+        self.assertEqual(response.context['credit_account'].pk, plan.pk)
+        self.assertEqual(len(response.context['transactions']), 3)
+        response = self.client.get(reverse('accounts:statement'), {'plan': plan.pk, 'format': 'csv'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 4)
+
+        # A new plan becomes the default; the archived one is still a click away
+        current = CreditAccount.objects.create(user=plan.user, phone=self.phone, account_type='CREDIT',
+                                               status='REPAYING', loan_amount=Decimal('600.00'))
+        response = self.client.get(reverse('accounts:payment_history'))
+        self.assertEqual(response.context['credit_account'], current)
+        self.assertEqual([p.pk for p in response.context['plans']], [current.pk, plan.pk])
+        self.assertContains(response, f'?plan={plan.pk}')
+        response = self.client.get(reverse('accounts:payment_history'), {'plan': plan.pk})
+        self.assertTrue(response.context['credit_account'].is_archived)
+
+        # Another customer's plan, live or archived, is not found
+        for other in (self.closed[1], self.recent):
+            self.assertEqual(self.client.get(reverse('accounts:payment_history'), {'plan': other.pk}).status_code, 404)
+            self.assertEqual(self.client.get(reverse('accounts:statement'), {'plan': other.pk}).status_code, 404)
+        # Neither is a malformed one, including digits int() does not accept
+        for bad in ('abc', '\u00b2', '9' * 30):
+            self.assertEqual(self.client.get(reverse('accounts:payment_history'), {'plan': bad}).status_code, 404)
+
+
+class BalanceServiceTests(TestCase):
+    def setUp(self):
+        self.account = make_plan('payer', loan_amount=Decimal('600.00'), installment_amount=Decimal('50.00'))
+
+    def test_payment_reported_twice_is_recorded_once(self):
+        payment_intent = mock.Mock(id='pi_twice', status='succeeded', amount=0,
+                                   metadata={'credit_account_id': str(self.account.id), 'original_amount_ghs': '50.00'})
+        event = {'type': 'checkout.session.completed', 'data': {'object': {
+            'id': 'cs_twice', 'payment_intent': 'pi_twice',
+            'metadata': {'credit_account_id': str(self.account.id), 'original_amount_ghs': '50.00'}}}}
+        with mock.patch('stripe.Webhook.construct_event', return_value=event):
+            for _ in range(2):
+                self.assertEqual(self.client.post(reverse('accounts:stripe_webhook'), data='{}',
+                                                  content_type='application/json').status_code, 200)
+        self.client.force_login(self.account.user)
+        with mock.patch('stripe.PaymentIntent.retrieve', return_value=payment_intent):
+            self.client.get(reverse('accounts:payment_success'), {'payment_intent': 'pi_twice'})
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+        self.assertEqual(list(self.account.transactions.values_list('transaction_id', flat=True)), ['pi_twice'])
+        self.account.user.refresh_from_db()
+        self.assertEqual(self.account.user.successful_payments, 1)
+
+    def test_stale_instance_does_not_overwrite_balance(self):
+        stale = CreditAccount.objects.get(pk=self.account.pk)
+        post_transaction(self.account, Decimal('50.00'), 'pi_first')
+        stale.record_payment_success(Decimal('25.00'), 'pi_second')
+        self.assertEqual(stale.balance, Decimal('75.00'))
+        stale.mark_as_completed()
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.balance, self.account.remaining_amount), (Decimal('75.00'), Decimal('525.00')))
+
+    def test_refund_zeroes_the_balance_once(self):
+        post_transaction(self.account, Decimal('120.00'), 'pi_paid')
+        self.assertEqual(refund_balance(self.account, 'refund_test').amount, Decimal('120.00'))
+        self.assertIsNone(refund_balance(self.account, 'refund_test'))
+        self.assertEqual(self.account.balance, Decimal('0.00'))
+        # Fees are charges, not payments
+        post_transaction(self.account, Decimal('10.00'), 'fee_test', Transaction.TransactionType.LATE_FEE)
+        self.assertEqual(self.account.balance, Decimal('0.00'))
+
+
+@mock.patch('stripe.Customer.retrieve', return_value={'invoice_settings': {'default_payment_method': 'pm_card'}})
+class DailyInstallmentJobTests(TestCase):
+    def setUp(self):
+        self.account = make_plan('installments', loan_amount=Decimal('600.00'), installment_amount=Decimal('50.00'))
+        CreditAccount.objects.filter(pk=self.account.pk).update(next_payment_due_date=timezone.localdate())
+        self.account.refresh_from_db()
+
+    def run_job(self):
+        with mock.patch('stripe.PaymentIntent.create', return_value=mock.Mock(id='pi_job')) as create:
+            process_daily_installments()
+        self.account.refresh_from_db()
+        return create
+
+    def test_retried_run_charges_and_credits_once(self, retrieve):
+        due = self.account.next_payment_due_date
+        with mock.patch('accounts.jobs.post_transaction', side_effect=RuntimeError('worker died')):
+            self.run_job()
+        # The failed run changed nothing, so the installment is still due
+        self.assertEqual((self.account.balance, self.account.next_payment_due_date), (Decimal('0.00'), due))
+
+        create = self.run_job()
+        key = f'installment-{self.account.pk}-{due}'
+        self.assertEqual(create.call_args.kwargs['idempotency_key'], key)
+        self.assertEqual(self.account.balance, Decimal('50.00'))
+        self.assertEqual(list(self.account.transactions.values_list('transaction_id', 'stripe_payment_intent')),
+                         [(key, 'pi_job')])
+        self.assertGreater(self.account.next_payment_due_date, due)
+
+    def test_paid_up_plan_is_settled_without_a_charge(self, retrieve):
+        CreditAccount.objects.filter(pk=self.account.pk).update(balance=Decimal('600.00'))
+        self.assertFalse(self.run_job().called)
+        self.assertEqual((self.account.status, self.account.next_payment_due_date), ('PAID_OFF', None))
+
+    def test_plan_without_amounts_is_skipped(self, retrieve):
+        CreditAccount.objects.filter(pk=self.account.pk).update(installment_amount=None)
+        self.assertFalse(self.run_job().called)
+        self.assertEqual(self.account.status, 'REPAYING')
+
+
+class BalanceRaceTests(TransactionTestCase):
+    PAYERS = 10
+    PAYMENTS = 5
+
+    def test_concurrent_credits_all_land_exactly_once(self):
+        account = make_plan('racer', loan_amount=Decimal('10000.00'), installment_amount=Decimal('50.00'))
+        start = threading.Barrier(self.PAYERS)
+        failures = []
+
+        def pay(payer):
+            start.wait()
+            try:
+                # Each payer's own payments, plus one that every payer reports
+                ids = [f'pi_{payer}_{index}' for index in range(self.PAYMENTS)] + ['pi_shared']
+                for transaction_id in ids:
+                    for _ in range(500):
+                        try:
+                            post_transaction(CreditAccount.objects.get(pk=account.pk), Decimal('1.25'), transaction_id)
+                            break
+                        except OperationalError:
+                            # Test database is in-memory SQLite: writers get "table is locked"
+                            # instead of waiting, so retry like a client would
+                            time.sleep(0.001)
+                    else:
+                        failures.append(transaction_id)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay, args=(payer,)) for payer in range(self.PAYERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+        account.refresh_from_db()
+        payments = self.PAYERS * self.PAYMENTS + 1
+        self.assertEqual(account.transactions.count(), payments)
+        self.assertEqual(account.balance, Decimal('1.25') * payments)
+
+
+class SqliteProfileTests(TestCase):
+    def open_file_database(self, directory):
+        settings_dict = {**connection.settings_dict, 'NAME': os.path.join(directory, 'profile.sqlite3')}
+        database = type(transaction.get_connection())(settings_dict, alias='profile_test')
+        database.ensure_connection()
+        self.addCleanup(database.close)
+        return database
+
+    def test_file_databases_get_the_production_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = self.open_file_database(directory)
+            self.assertEqual(current_pragmas(database), {
+                'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'mmap_size': 256 * 1024 * 1024})
+            self.assertEqual(database.transaction_mode, 'IMMEDIATE')
+            database.close()
+
+    def test_profile_can_be_switched_off(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(SQLITE_PRAGMAS={}):
+            database = self.open_file_database(directory)
+            self.assertEqual(current_pragmas(database)['journal_mode'], 'delete')
+            self.assertIsNone(database.transaction_mode)
+            database.close()
+
+
+class WriteFunnelTests(TransactionTestCase):
+    def test_funneled_writes_run_on_the_writer_thread(self):
+        account = make_plan('funneled', loan_amount=Decimal('600.00'), installment_amount=Decimal('50.00'))
+        callers = []
+        funnel = WriteFunnel()
+        result = funnel.run(lambda: callers.append(threading.current_thread()) or 'done')
+        self.assertEqual((result, callers), ('done', [funnel.thread]))
+        with self.assertRaises(ZeroDivisionError):
+            funnel.run(lambda: 1 / 0)
+
+        with override_settings(SQLITE_WRITE_FUNNEL=True):
+            self.assertIsNotNone(post_transaction(account, Decimal('50.00'), 'pi_funneled'))
+            self.assertIsNone(post_transaction(account, Decimal('50.00'), 'pi_funneled'))
+        self.assertEqual(account.balance, Decimal('50.00'))
+
+    def test_writer_recycles_its_connection_around_each_call(self):
+        funnel = WriteFunnel()
+        with mock.patch('accounts.write_funnel.close_old_connections') as close_old_connections:
+            funnel.run(len, '')
+            funnel.queue.join()
+        self.assertEqual(close_old_connections.call_count, 2)
+
+    def test_full_queue_fails_fast(self):
+        funnel = WriteFunnel(maxsize=1, timeout=0.01)
+        started, release = threading.Event(), threading.Event()
+
+        def blocked():
+            started.set()
+            release.wait()
+
+        waiting = [threading.Thread(target=funnel.run, args=(blocked,)), threading.Thread(target=funnel.run, args=(len, ''))]
+        waiting[0].start()
+        started.wait()
+        waiting[1].start()
+        while not funnel.queue.full():
+            time.sleep(0.001)
+        with self.assertRaises(WriteQueueFull):
+            funnel.run(len, '')
+        release.set()
+        for thread in waiting:
+            thread.join()
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pass', national_id='GHA-ADMIN')
+        self.phone = Phone.objects.create(name='Admin Phone', brand='TECNO', price=Decimal('1000.00'),
+                                          description='Test phone', stock=0)
+        self.client.force_login(self.admin)
+
+    def add_accounts(self, count):
+        for index in range(count):
+            number = User.objects.count()
+            account = make_plan(f'cust{number}', phone=self.phone, status='ACTIVE', account_type='SAVINGS',
+                                balance=Decimal(100 * (index % 10)))
+            Transaction.objects.create(account=account, amount=Decimal('10.00'), transaction_id=f'pi_adm{account.pk}')
+
+    def changelist_queries(self, model, params=None):
+        url = reverse(f'admin:accounts_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        self.add_accounts(2)
+        few = [self.changelist_queries(model)[0] for model in ('creditaccount', 'transaction')]
+        self.add_accounts(30)
+        many = [self.changelist_queries(model)[0] for model in ('creditaccount', 'transaction')]
+        self.assertEqual(few, many)
+
+    def test_remaining_and_progress_sort_in_the_database(self):
+        self.add_accounts(10)
+        changelist = self.changelist_queries('creditaccount', {'o': '5'})[1].context['cl']
+        accounts = list(changelist.result_list)
+        self.assertEqual([account.progress for account in accounts], sorted(account.progress_percentage for account in accounts))
+
+    def test_transaction_count_is_capped(self):
+        self.add_accounts(3)
+        self.assertEqual(self.changelist_queries('transaction')[1].context['cl'].result_count, 3)
+        with mock.patch.object(CappedCountPaginator, 'COUNT_CAP', 2):
+            self.assertEqual(self.changelist_queries('transaction')[1].context['cl'].result_count, 2)
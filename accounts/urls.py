@@ -1,7 +1,7 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from django.contrib.auth import views as auth_views
-from .views import bnpl_checkout_view, bnpl_success_view, business_dashboard_view, cancel_plan_view, create_customer_portal_session, signup_view, login_view, logout_view, dashboard_view, select_phone_view, agreement_view, stripe_config, create_checkout_session, stripe_webhook, credit_application_view, payment_history_view, test_webhook, webhook_test_page, embedded_payment_view, create_payment_intent, payment_success_view, support_view, documents_view, customer_management_view, approve_account_view, decline_account_view, verify_user_view, account_detail_view, update_account_settings_view, credit_eligibility_view, mark_available_for_pickup_view, bulk_mark_available_for_pickup_view, confirm_pickup_view, credit_applications_view, verify_credit_application_view, profile_view, profile_edit_view, profile_picture_view, change_password_view, credit_building_dashboard_view
+from .views import bnpl_checkout_view, bnpl_success_view, business_dashboard_view, vintage_analysis_view, export_view, cancel_plan_view, create_customer_portal_session, signup_view, login_view, logout_view, dashboard_view, select_phone_view, agreement_view, stripe_config, create_checkout_session, stripe_webhook, credit_application_view, payment_history_view, statement_view, account_statement_view, test_webhook, webhook_test_page, embedded_payment_view, create_payment_intent, payment_success_view, support_view, documents_view, customer_management_view, approve_account_view, decline_account_view, verify_user_view, account_detail_view, update_account_settings_view, credit_eligibility_view, mark_available_for_pickup_view, bulk_mark_available_for_pickup_view, confirm_pickup_view, credit_applications_view, verify_credit_application_view, profile_view, profile_edit_view, profile_picture_view, change_password_view, credit_building_dashboard_view
 
 urlpatterns = [
     path('signup/', signup_view, name='signup'),
@@ -32,9 +32,13 @@ urlpatterns = [
          bnpl_success_view, name='bnpl_success'),
     path('manage-payments/', create_customer_portal_session, name='manage_payments'),
     path('payment-history/', payment_history_view, name='payment_history'),
+    path('payment-history/statement/', statement_view, name='statement'),
     path('business-dashboard/', business_dashboard_view, name='business_dashboard'),
+    path('analytics/vintages/', vintage_analysis_view, name='vintage_analysis'),
+    path('exports/<slug:dataset>/', export_view, name='export'),
     path('customer-management/', customer_management_view, name='customer_management'),
     path('account-detail/<int:account_id>/', account_detail_view, name='account_detail'),
+    path('account-detail/<int:account_id>/statement/', account_statement_view, name='account_statement'),
     path('approve-account/<int:account_id>/', approve_account_view, name='approve_account'),
     path('decline-account/<int:account_id>/', decline_account_view, name='decline_account'),
     path('verify-user/<int:user_id>/', verify_user_view, name='verify_user'),
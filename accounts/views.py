@@ -5,22 +5,90 @@ from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.template.loader import render_to_string
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.contrib import messages
 from .forms import CustomUserCreationForm, CreditApplicationForm, UserProfileForm, UserAddressForm, UserPreferencesForm, ProfilePictureForm
 from .models import CreditAccount, Transaction, CreditApplication
 from phones.models import Phone
+from phones.catalog_cache import get_generation
+from phones.inventory import OutOfStock, commit_account_stock, release_account_stock, reserve_stock
 import stripe
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from dateutil.relativedelta import relativedelta
 from django.contrib.admin.views.decorators import staff_member_required
 from .models import User
 import random
-import uuid
+from datetime import datetime, timedelta
 from decimal import Decimal
 from .currency_utils import ghs_to_usd_cents, usd_cents_to_ghs, format_ghs_amount
+from .business_metrics import get_snapshot
+from .dashboard_cache import DASHBOARD_TRANSACTIONS, fragment_timeout, get_dashboard_version
+from .exports import DATASETS, FORMATS, date_range, export_filename, stream_export
+from .statements import STATEMENT_FORMATS, statement_filename, stream_statement
+from .rollups import daily_trend
+from .vintages import get_vintages
+from .credit_policy import compile_policy, application_facts
+from .pagination import paginate_keyset, querystring_without
+from .archive import get_plan, plan_transactions
+from .balances import refund_balance
+
+# Rows per page in the staff customer management listings
+STAFF_PAGE_SIZE = 25
+
+# Rows per page of payment history (customer and staff)
+HISTORY_PAGE_SIZE = 20
+
+# Sort options for the customer management "All Credit Accounts" listing
+ACCOUNT_SORTS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'recently_updated': ('-updated_at', '-id'),
+}
+
+
+def _date_param(request, name):
+    """A YYYY-MM-DD query parameter as a date, or None when missing or invalid"""
+    try:
+        return parse_date(request.GET.get(name, ''))
+    except ValueError:
+        return None
+
+
+def _transaction_history(request, account):
+    """One keyset page of the account's transactions, newest first, within the from/to query dates"""
+    start, end = _date_param(request, 'from'), _date_param(request, 'to')
+    transactions = paginate_keyset(
+        plan_transactions(account).filter(**date_range('timestamp', start, end)),
+        request.GET.get('cursor'), HISTORY_PAGE_SIZE, ordering=('-timestamp', '-id'))
+    return {
+        'transactions': transactions,
+        'history_filters': {'from': start.isoformat() if start else '', 'to': end.isoformat() if end else ''},
+        'history_query': querystring_without(request.GET, 'cursor'),
+        'statement_query': querystring_without(request.GET, 'cursor', 'format'),
+    }
+
+
+def _get_plan_or_404(account_id):
+    try:
+        return get_plan(account_id)
+    except CreditAccount.DoesNotExist:
+        raise Http404("No such account")
+
+
+def _statement_response(request, account):
+    """Stream the account's statement for the from/to query dates as CSV or PDF"""
+    fmt = request.GET.get('format', 'pdf')
+    if fmt not in STATEMENT_FORMATS:
+        return HttpResponseBadRequest("format must be one of: " + ", ".join(STATEMENT_FORMATS))
+    start, end = _date_param(request, 'from'), _date_param(request, 'to')
+    response = StreamingHttpResponse(stream_statement(account, fmt, start, end), content_type=STATEMENT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{statement_filename(account, fmt, start, end)}"'
+    response['Cache-Control'] = 'no-store'
+    return response
 
 
 def send_html_email(subject, template_name, context, recipient_list, fail_silently=True):
@@ -149,7 +217,8 @@ def dashboard_view(request):
 
     try:
         credit_account = request.user.credit_account
-        transactions = credit_account.transactions.all().order_by('-timestamp')
+        # Only the latest payments; the full list is on the payment history page
+        transactions = credit_account.transactions.order_by('-timestamp')[:DASHBOARD_TRANSACTIONS]
 
         # Check if the account is actually active (not completed/picked up)
         is_active_plan = credit_account.is_plan_active()
@@ -159,8 +228,9 @@ def dashboard_view(request):
         transactions = []
         is_active_plan = False
 
+    # The querysets below stay lazy: on a fragment cache hit they are never run
     # Show phones if user has no account OR if their plan is completed
-    phones = Phone.objects.filter(is_active=True, stock__gt=0) if not credit_account or not is_active_plan else []
+    phones = Phone.objects.filter(is_active=True, stock__gt=0).prefetch_related('quotes') if not credit_account or not is_active_plan else []
 
     # Get user's credit applications (only those with valid phone references)
     credit_applications = CreditApplication.objects.filter(
@@ -174,6 +244,10 @@ def dashboard_view(request):
         'phones': phones,
         'is_active_plan': is_active_plan,
         'credit_applications': credit_applications,
+        # Cached fragments vary on these (see accounts/dashboard_cache.py)
+        'dashboard_version': get_dashboard_version(request.user.pk),
+        'catalog_generation': get_generation(),
+        'dashboard_cache_timeout': fragment_timeout(),
     }
     return render(request, 'dashboard.html', context)
 
@@ -182,19 +256,12 @@ def dashboard_view(request):
 def select_phone_view(request, phone_id):
     phone = get_object_or_404(Phone, id=phone_id)
 
-    # Check if user has an existing account
-    if hasattr(request.user, 'credit_account'):
-        existing_account = request.user.credit_account
-
-        # If user has an active plan (not completed), redirect to dashboard
-        is_active_plan = existing_account.is_plan_active()
-
-        if is_active_plan:
-            messages.error(request, "You already have an active plan. Complete your current plan before selecting a new phone.")
-            return redirect('accounts:dashboard')
-
-        # If plan is completed, allow new plan selection
-        # We'll handle this by creating a new account or updating the existing one
+    # A user can start a new plan once the current one is finished
+    if request.user.has_open_plan():
+        messages.error(request, "You already have an active plan. Complete your current plan before selecting a new phone.")
+        return redirect('accounts:dashboard')
+    previous_plan = request.user.current_plan
+    if previous_plan:
         messages.info(request, f"Starting a new plan for {phone.name}. Your previous plan history is preserved.")
     
     # Determine the account type based on the referrer
@@ -209,30 +276,28 @@ def select_phone_view(request, phone_id):
         # For BNPL, redirect to credit application instead
         return redirect('accounts:credit_application', phone_id=phone_id)
 
-    # Handle account creation or update
-    if hasattr(request.user, 'credit_account'):
-        # Update existing account for new plan
-        account = request.user.credit_account
-        account.phone = phone
-        account.account_type = account_type
-        account.status = CreditAccount.Status.PENDING
-        account.balance = 0.00
-        account.accepted_terms = False
-        account.accepted_at = None
-        account.loan_amount = None
-        account.installment_amount = None
-        account.next_payment_due_date = None
-        account.last_payment_date = None
-        account.is_active_plan = True  # Mark as active plan
-        account.save()
-    else:
-        # Create new account for first-time users
-        account = CreditAccount.objects.create(
-            user=request.user,
-            phone=phone,
-            account_type=account_type,
-            is_active_plan=True
-        )
+    try:
+        with transaction.atomic():
+            if previous_plan:
+                # An unfinished selection for another phone gives its unit back
+                release_account_stock(previous_plan, include_committed=False)
+            # Every plan is a new row, so earlier plans and their payments are kept
+            account = CreditAccount.objects.create(
+                user=request.user,
+                phone=phone,
+                account_type=account_type,
+                is_active_plan=True
+            )
+
+            # Hold a unit while the customer reviews the agreement
+            reserve_stock(phone, request.user, account=account)
+    except OutOfStock:
+        messages.error(request, f"Sorry, the {phone.name} has just sold out.")
+        return redirect('phones:phone_list')
+    except IntegrityError:
+        # Another request started a plan first (creditaccount_one_open_plan)
+        messages.error(request, "You already have an active plan. Complete your current plan before selecting a new phone.")
+        return redirect('accounts:dashboard')
 
     # Redirect to the agreement page
     return redirect('accounts:agreement', account_id=account.id)
@@ -248,6 +313,13 @@ def agreement_view(request, account_id):
         return redirect('accounts:dashboard')
 
     if request.method == 'POST':
+        # The plan starts now, so the held unit becomes the customer's
+        try:
+            commit_account_stock(account)
+        except OutOfStock:
+            messages.error(request, "Sorry, this phone sold out while your reservation was open. Please choose another phone.")
+            return redirect('phones:phone_list')
+
         # User has checked the box and submitted the form
         account.accepted_terms = True
         account.accepted_at = timezone.now()
@@ -285,7 +357,7 @@ def credit_application_view(request, phone_id):
         return redirect('accounts:dashboard')
 
     # Check if user already has a credit account
-    if hasattr(request.user, 'credit_account'):
+    if request.user.has_open_plan():
         messages.error(request, "You already have an active credit account.")
         return redirect('accounts:dashboard')
 
@@ -320,61 +392,25 @@ def credit_application_view(request, phone_id):
             request.user.update_internal_credit_score()
             request.user.save()
 
-            # Check if user can afford this phone with their current credit limit
-            phone_price = float(phone.price)  # Ensure it's a float for calculations
-            available_credit = float(request.user.get_available_credit_limit())  # Ensure it's a float
-
             # Store application details
             application.credit_score_at_time_of_application = request.user.internal_credit_score
-            application.requested_loan_amount = phone.price  # Keep original Decimal for storage
+            application.requested_loan_amount = phone.price
             installment_count = int(form.cleaned_data.get('installment_count', 12))
             application.requested_installment_count = installment_count
 
-            # Progressive approval logic - much more accessible!
-            debt_to_income = (float(monthly_expenses) / float(monthly_income)) * 100 if monthly_income > 0 else 100
-
-            # Check multiple approval criteria (user-friendly)
-            approval_reasons = []
-            decline_reasons = []
-
-            # Guarantor validation check (new requirement)
-            if application.guarantor_validated:
-                approval_reasons.append("Valid guarantor provided and verified")
-            else:
-                decline_reasons.append(f"Guarantor validation failed: {application.guarantor_validation_notes}")
-
-            # Basic eligibility check (now includes guarantor check)
-            if request.user.is_verified and request.user.profile_completion_percentage() >= 70 and request.user.internal_credit_score >= 50:
-                approval_reasons.append("Account verified and profile complete")
-            else:
-                decline_reasons.append("Complete your profile and verify your account first")
-
-            # Credit limit check
-            if available_credit >= phone_price:
-                approval_reasons.append(f"Phone price (₵{phone_price}) within your credit limit (₵{available_credit} available)")
-            else:
-                decline_reasons.append(f"Phone price (₵{phone_price}) exceeds your available credit limit (₵{available_credit})")
-
-            # Income check (more lenient) - Fix the division by ensuring proper types
-            monthly_payment = float(phone_price) / installment_count
-            if monthly_income >= monthly_payment * 2:  # Payment should be max 50% of income
-                approval_reasons.append("Sufficient income for monthly payments")
-            else:
-                decline_reasons.append(f"Monthly payment (₵{monthly_payment:.2f}) too high for income (₵{monthly_income})")
-
-            # Debt-to-income check (more lenient)
-            if debt_to_income <= 70:  # Increased from 50% to 70%
-                approval_reasons.append("Acceptable debt-to-income ratio")
-            else:
-                decline_reasons.append(f"Debt-to-income ratio too high ({debt_to_income:.1f}%)")
-
-            # Make decision
-            if len(decline_reasons) == 0:
-                application.status = CreditApplication.Status.APPROVED
-                application.decision_reason = "Approved: " + "; ".join(approval_reasons)
-            else:
-                application.status = CreditApplication.Status.DECLINED
-                application.decision_reason = "Declined: " + "; ".join(decline_reasons)
+            # Progressive approval logic - decided by the current credit policy version
+            policy = compile_policy()
+            facts = application_facts(
+                request.user,
+                phone_price=phone.price,
+                installment_count=installment_count,
+                monthly_income=monthly_income,
+                monthly_expenses=monthly_expenses,
+                guarantor_validated=application.guarantor_validated,
+                guarantor_notes=application.guarantor_validation_notes,
+            )
+            application.status, application.decision_reason = policy.evaluate(facts)
+            application.policy_version = policy.version
 
             application.save()
 
@@ -393,8 +429,7 @@ def credit_application_view(request, phone_id):
     context = {
         'form': form,
         'phone': phone,
-        'monthly_payment_12': phone.monthly_payment_12_months,
-        'monthly_payment_6': phone.monthly_payment_6_months,
+        'quotes': phone.get_quotes(),
     }
     return render(request, 'credit_application.html', context)
 
@@ -540,22 +575,17 @@ def process_payment_success(request, payment_intent):
 
         print(f"Amount paid: ₵{amount_paid}")
 
-        # Record payment success and update credit metrics
+        # Record the payment (once, even if the webhook got here first) and update credit metrics
         old_balance = account.balance
-        upgrade_result = account.record_payment_success(amount_paid)
-        print(f"Updated balance from ₵{old_balance} to ₵{account.balance}")
-
-        # Create transaction record
         phone_name = account.phone.name if account.phone else "Unknown Phone"
-        transaction = Transaction.objects.create(
-            account=account,
-            amount=amount_paid,
-            transaction_type=Transaction.TransactionType.PAYMENT,
-            transaction_id=payment_intent.id,
-            stripe_payment_intent=payment_intent.id,
-            description=f"Payment for {phone_name}"
-        )
-        print(f"Created transaction: {transaction.id}")
+        upgrade_result = account.record_payment_success(
+            amount_paid, payment_intent.id, description=f"Payment for {phone_name}",
+            stripe_payment_intent=payment_intent.id)
+        if upgrade_result.get('duplicate'):
+            print(f"Payment {payment_intent.id} was already recorded")
+            messages.info(request, "This payment has already been recorded.")
+            return redirect('accounts:dashboard')
+        print(f"Updated balance from ₵{old_balance} to ₵{account.balance}")
 
         # Notify user of credit tier upgrade if it happened
         if upgrade_result.get('upgraded'):
@@ -606,9 +636,6 @@ def process_payment_success(request, payment_intent):
                 except Exception as e:
                     print(f"Error sending plan completion SMS: {str(e)}")
 
-        account.save()
-        print(f"Account saved successfully")
-        
         # Enhanced success message with more details
         if account.status == CreditAccount.Status.COMPLETED:
             phone_name = account.phone.name if account.phone else "Unknown Phone"
@@ -728,21 +755,19 @@ def stripe_webhook(request):
             print(
                 f"Processing payment of ₵{amount_paid} for account {account.id}")
 
-            # 1. Update the account balance
-            account.balance += amount_paid
-
-            # 2. Create a Transaction record with proper transaction_type
-            Transaction.objects.create(
-                account=account,
-                amount=amount_paid,
-                transaction_type=Transaction.TransactionType.PAYMENT,
-                transaction_id=session.get(
-                    'payment_intent', f"stripe_{session.get('id')}"),
+            # 1. Record the payment and update the balance - once, even if the
+            #    success redirect (or an earlier delivery of this event) got here first
+            result = account.record_payment_success(
+                amount_paid,
+                session.get('payment_intent') or f"stripe_{session.get('id')}",
+                description=f"Payment for {account.phone.name if account.phone else 'Unknown Phone'}",
                 stripe_payment_intent=session.get('payment_intent'),
-                description=f"Payment for {account.phone.name if account.phone else 'Unknown Phone'}"
             )
+            if result.get('duplicate'):
+                print(f"Payment for session {session.get('id')} was already recorded")
+                return HttpResponse(status=200)
 
-            # 3. Check if account is eligible for completion
+            # 2. Check if account is eligible for completion
             if account.is_eligible_for_completion():
                 # Mark as completed (admin will later mark as available for pickup)
                 if account.mark_as_completed():
@@ -763,7 +788,6 @@ def stripe_webhook(request):
                     fail_silently=True,  # Don't fail if email fails
                 )
 
-            account.save()
             print(f"Successfully processed payment for account {account.id}")
 
         except CreditAccount.DoesNotExist:
@@ -785,7 +809,7 @@ def bnpl_checkout_view(request, phone_id):
             request, "Your account must be verified to use this feature.")
         return redirect('accounts:dashboard')
 
-    if hasattr(request.user, 'credit_account'):
+    if request.user.has_open_plan():
         messages.error(request, "You already have an active credit account.")
         return redirect('accounts:dashboard')
 
@@ -819,19 +843,31 @@ def bnpl_checkout_view(request, phone_id):
         request.user.stripe_customer_id = customer.id
         request.user.save()
 
+    # Price the plan from the same quote the customer was shown
+    quote = phone.get_quote(credit_app.requested_installment_count)
+
     # Create the account record in our DB first, but as a CREDIT account
     # We will finalize it after they've added their card details
-    account = CreditAccount.objects.create(
-        user=request.user,
-        phone=phone,
-        account_type=CreditAccount.AccountType.CREDIT,
-        status=CreditAccount.Status.ACTIVE,  # Still 'Active' until card is saved
-        loan_amount=phone.price,
-        installment_count=credit_app.requested_installment_count,
-        installment_amount=round(
-            phone.price / credit_app.requested_installment_count, 2),
-        interest_rate=phone.interest_rate,
-    )
+    try:
+        with transaction.atomic():
+            account = CreditAccount.objects.create(
+                user=request.user,
+                phone=phone,
+                account_type=CreditAccount.AccountType.CREDIT,
+                status=CreditAccount.Status.ACTIVE,  # Still 'Active' until card is saved
+                loan_amount=quote.total_amount,
+                installment_count=quote.term_months,
+                installment_amount=quote.monthly_payment,
+                interest_rate=quote.interest_rate,
+            )
+            # Hold a unit while the customer is on Stripe; it lapses if they abandon checkout
+            reserve_stock(phone, request.user, account=account)
+    except OutOfStock:
+        messages.error(request, f"Sorry, the {phone.name} has just sold out.")
+        return redirect('accounts:dashboard')
+    except IntegrityError:
+        messages.error(request, "You already have an active credit account.")
+        return redirect('accounts:dashboard')
 
     # Create a Stripe Checkout session in 'setup' mode
     checkout_session = stripe.checkout.Session.create(
@@ -852,6 +888,12 @@ def bnpl_success_view(request, account_id):
     account = get_object_or_404(
         CreditAccount, id=account_id, user=request.user)
 
+    try:
+        commit_account_stock(account)
+    except OutOfStock:
+        messages.error(request, "Sorry, this phone sold out while your checkout was open. Please contact support.")
+        return redirect('accounts:dashboard')
+
     # The plan is now officially starting
     account.status = CreditAccount.Status.REPAYING
     account.accepted_terms = True  # Implicitly accepted by completing checkout
@@ -889,123 +931,126 @@ def create_customer_portal_session(request):
 
 @staff_member_required
 def business_dashboard_view(request):
-    from django.db.models import Sum, Avg, Count, Q
-    from django.utils import timezone
-    from datetime import timedelta
-
-    # Calculate raw counts for charts
-    active_savings_count = CreditAccount.objects.filter(
-        account_type='SAVINGS', status='ACTIVE').count()
-    repaying_count = CreditAccount.objects.filter(status='REPAYING').count()
-    overdue_count = CreditAccount.objects.filter(status='OVERDUE').count()
-    paid_off_count = CreditAccount.objects.filter(status='PAID_OFF').count()
-    completed_count = CreditAccount.objects.filter(status='COMPLETED').count()
-
-    active_bnpl_count = repaying_count + overdue_count
-
-    # Calculate default rate
-    default_rate = (overdue_count / active_bnpl_count *
-                    100) if active_bnpl_count > 0 else 0
-
-    # Financial Analytics
-    total_loan_value = CreditAccount.objects.filter(
-        account_type='CREDIT',
-        loan_amount__isnull=False
-    ).aggregate(total=Sum('loan_amount'))['total'] or 0
-
-    total_payments_received = Transaction.objects.filter(
-        transaction_type='PAYMENT'
-    ).aggregate(total=Sum('amount'))['total'] or 0
-
-    # Calculate outstanding balance correctly
-    credit_accounts = CreditAccount.objects.filter(
-        status__in=['REPAYING', 'OVERDUE'],
-        loan_amount__isnull=False
-    )
-    outstanding_balance = 0
-    for account in credit_accounts:
-        if account.loan_amount and account.balance:
-            remaining = account.loan_amount - account.balance
-            outstanding_balance += max(0, remaining)
-
-    # Calculate total amount paid (balance represents amount paid, not remaining)
-    total_amount_paid = CreditAccount.objects.filter(
-        account_type='CREDIT',
-        balance__isnull=False
-    ).aggregate(total=Sum('balance'))['total'] or 0
-
-    # Credit Building Analytics
-    credit_tier_distribution = User.objects.values('credit_tier').annotate(
-        count=Count('id')
-    ).order_by('credit_tier')
-
-    avg_credit_score = User.objects.filter(
-        internal_credit_score__gt=0
-    ).aggregate(avg=Avg('internal_credit_score'))['avg'] or 0
-
-    # Time-based Analytics (last 30 days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    new_users_30d = User.objects.filter(date_joined__gte=thirty_days_ago).count()
-    new_applications_30d = CreditApplication.objects.filter(
-        created_at__gte=thirty_days_ago
-    ).count()
-
-    # Phone Analytics
-    popular_phones = CreditAccount.objects.filter(
-        phone__isnull=False
-    ).values('phone__brand').annotate(
-        count=Count('id')
-    ).order_by('-count')[:5]
+    snapshot = get_snapshot()
+    accounts = snapshot['accounts']
+    users = snapshot['users']
+    tiers = snapshot['credit_tiers']
+    popular_phones = snapshot['popular_brands']
+
+    active_bnpl_count = accounts['repaying'] + accounts['overdue']
+    default_rate = (accounts['overdue'] / active_bnpl_count * 100) if active_bnpl_count > 0 else 0
+    total_loan_value = accounts['total_loan_value']
+    total_amount_paid = accounts['total_amount_paid']
+    trend = daily_trend(days=90)
 
     context = {
         # Basic Metrics
-        'total_users': User.objects.count(),
-        'verified_users': User.objects.filter(is_verified=True).count(),
-        'active_savings_plans': active_savings_count,
+        'total_users': users['total'],
+        'verified_users': users['verified'],
+        'active_savings_plans': accounts['active_savings'],
         'active_bnpl_plans': active_bnpl_count,
-        'overdue_plans': overdue_count,
+        'overdue_plans': accounts['overdue'],
         'default_rate': f"{default_rate:.2f}%",
-        'total_paid_off': paid_off_count + completed_count,
+        'total_paid_off': accounts['paid_off'],
 
         # Financial Metrics
         'total_loan_value': total_loan_value,
         'total_payments_received': total_amount_paid,  # Use actual payments made
-        'outstanding_balance': outstanding_balance,
+        'outstanding_balance': accounts['outstanding_balance'],
         'collection_rate': f"{(float(total_amount_paid) / float(total_loan_value) * 100) if total_loan_value > 0 else 0:.1f}%",
 
         # Credit Building Metrics
-        'avg_credit_score': f"{avg_credit_score:.0f}",
-        'credit_tier_distribution': credit_tier_distribution,
+        'avg_credit_score': f"{users['avg_credit_score'] or 0:.0f}",
+        'credit_tier_distribution': tiers,
+        'outstanding_by_tier': [
+            {'credit_tier': row['user__credit_tier'], 'plans': row['plans'], 'outstanding': row['outstanding']}
+            for row in snapshot['outstanding_by_tier']
+        ],
 
         # Growth Metrics
-        'new_users_30d': new_users_30d,
-        'new_applications_30d': new_applications_30d,
+        'new_users_30d': users['new_30d'],
+        'new_applications_30d': snapshot['new_applications_30d'],
         'popular_phones': popular_phones,
+        'snapshot_computed_at': snapshot['computed_at'],
 
         # --- Data specifically for Chart.js ---
         'chart_data': {
             'plan_status_labels': ['Active Savings', 'Active BNPL', 'Paid Off/Completed'],
-            'plan_status_data': [active_savings_count, active_bnpl_count, paid_off_count + completed_count],
+            'plan_status_data': [accounts['active_savings'], active_bnpl_count, accounts['paid_off']],
 
             'bnpl_health_labels': ['Currently Repaying', 'Overdue'],
-            'bnpl_health_data': [repaying_count, overdue_count],
+            'bnpl_health_data': [accounts['repaying'], accounts['overdue']],
 
             # Credit Tier Distribution
-            'credit_tier_labels': [tier['credit_tier'] for tier in credit_tier_distribution],
-            'credit_tier_data': [tier['count'] for tier in credit_tier_distribution],
+            'credit_tier_labels': [tier['credit_tier'] for tier in tiers],
+            'credit_tier_data': [tier['count'] for tier in tiers],
 
             # Popular Phone Brands
             'phone_brand_labels': [phone['phone__brand'] for phone in popular_phones],
             'phone_brand_data': [phone['count'] for phone in popular_phones],
+
+            # Last 90 days from the nightly rollup (accounts.rollups)
+            'trend_labels': [day.date.isoformat() for day in trend],
+            'trend_new_users': [day.new_users for day in trend],
+            'trend_applications': [day.new_applications for day in trend],
+            'trend_payments': [float(day.payments_received) for day in trend],
         }
     }
-    
+
     # Show welcome message for analytics dashboard
     messages.success(request, "Welcome to the Business Analytics Dashboard!")
     
     return render(request, 'business_dashboard.html', context)
 
 
+@staff_member_required
+def vintage_analysis_view(request):
+    """Repayment and delinquency curves by origination month (see accounts/vintages.py)"""
+    vintages = get_vintages()
+    cohorts = [
+        {'month': month, 'plans': plans, 'principal': principal, 'repayment': repayment, 'delinquency': delinquency}
+        for month, plans, principal, repayment, delinquency in zip(
+            vintages['cohorts'], vintages['plans'], vintages['principal'],
+            vintages['repayment'], vintages['delinquency'])
+    ]
+    context = {
+        'cohorts': cohorts,
+        'months_on_book': vintages['months_on_book'],
+        'computed_at': vintages['computed_at'],
+        # The chart shows the most recent year of cohorts; the tables show all of them
+        'chart_data': {
+            'months_on_book': vintages['months_on_book'],
+            'cohorts': [{'label': cohort['month'], 'repayment': cohort['repayment']} for cohort in cohorts[-12:]],
+        },
+    }
+    return render(request, 'vintage_analysis.html', context)
+
+
+@staff_member_required
+def export_view(request, dataset):
+    """Stream a CSV/JSONL extract of accounts, transactions or applications"""
+    if dataset not in DATASETS:
+        raise Http404("Unknown export")
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest("format must be one of: " + ", ".join(FORMATS))
+    bounds = {}
+    for param in ('from', 'to'):
+        bounds[param] = _date_param(request, param)
+        if request.GET.get(param) and bounds[param] is None:
+            return HttpResponseBadRequest(f"{param} must be a date like 2025-01-31")
+    compress = request.GET.get('gzip') in ('1', 'true')
+
+    response = StreamingHttpResponse(
+        stream_export(dataset, fmt, bounds['from'], bounds['to'], compress), content_type=FORMATS[fmt])
+    if compress:
+        # A download of a .gz file, not a transfer encoding the browser would undo
+        response['Content-Type'] = 'application/gzip'
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, fmt, compress)}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
 @staff_member_required
 def mark_available_for_pickup_view(request, account_id):
     """Admin view to mark a single account as available for pickup"""
@@ -1127,24 +1172,60 @@ def confirm_pickup_view(request, account_id):
 @staff_member_required
 def customer_management_view(request):
     """View for managing customers, credit accounts, and account types"""
-    # Get pending credit accounts
-    pending_accounts = CreditAccount.objects.filter(status='PENDING')
-
-    # Get completed accounts awaiting admin action
-    completed_accounts = CreditAccount.objects.filter(status='COMPLETED').order_by('-completed_at')
-
-    # Get accounts available for pickup
-    available_for_pickup = CreditAccount.objects.filter(status='AVAILABLE_FOR_PICKUP').order_by('-admin_marked_ready_at')
+    accounts = CreditAccount.objects.select_related('user', 'phone')
+
+    # Every tab is keyset-paginated with its own cursor, so the page costs the
+    # same handful of queries however many accounts there are
+    pending_accounts = paginate_keyset(
+        accounts.filter(status='PENDING'), request.GET.get('pending_cursor'), STAFF_PAGE_SIZE)
+
+    # The action timestamps (completed_at, ...) can be null, so these tabs sort on
+    # updated_at, which the status change set; (status, updated_at, id) is indexed
+    completed_accounts = paginate_keyset(
+        accounts.filter(status='COMPLETED'),
+        request.GET.get('completed_cursor'), STAFF_PAGE_SIZE, ordering=('-updated_at', '-id'))
+    available_for_pickup = paginate_keyset(
+        accounts.filter(status='AVAILABLE_FOR_PICKUP'),
+        request.GET.get('pickup_cursor'), STAFF_PAGE_SIZE, ordering=('-updated_at', '-id'))
+    picked_up_accounts = paginate_keyset(
+        accounts.filter(status='PICKED_UP'),
+        request.GET.get('picked_up_cursor'), STAFF_PAGE_SIZE, ordering=('-updated_at', '-id'))
+
+    # All accounts, filtered and sorted server-side
+    filters = {
+        'status': request.GET.get('status', ''),
+        'type': request.GET.get('type', ''),
+        'created_from': request.GET.get('created_from', ''),
+        'created_to': request.GET.get('created_to', ''),
+        'sort': request.GET.get('sort', '') if request.GET.get('sort') in ACCOUNT_SORTS else 'newest',
+    }
+    filtered = accounts
+    if filters['status'] in CreditAccount.Status.values:
+        filtered = filtered.filter(status=filters['status'])
+    if filters['type'] in CreditAccount.AccountType.values:
+        filtered = filtered.filter(account_type=filters['type'])
+    # Plain datetime bounds (not created_at__date) so the created_at indexes still apply
+    for param, lookup, offset in (('created_from', 'created_at__gte', 0), ('created_to', 'created_at__lt', 1)):
+        try:
+            day = parse_date(filters[param])
+        except ValueError:
+            day = None
+        if day:
+            start_of_day = datetime.combine(day + timedelta(days=offset), datetime.min.time())
+            filtered = filtered.filter(**{lookup: timezone.make_aware(start_of_day)})
+        else:
+            filters[param] = ''
+    all_accounts = paginate_keyset(
+        filtered, request.GET.get('accounts_cursor'), STAFF_PAGE_SIZE, ordering=ACCOUNT_SORTS[filters['sort']])
 
-    # Get picked up accounts
-    picked_up_accounts = CreditAccount.objects.filter(status='PICKED_UP').order_by('-user_confirmed_pickup_at')
+    # Get unverified users
+    unverified_users = paginate_keyset(
+        User.objects.filter(is_verified=False), request.GET.get('users_cursor'), STAFF_PAGE_SIZE, ordering=('-id',))
 
-    # Get all credit accounts
-    all_accounts = CreditAccount.objects.all().order_by('-created_at')
+    # Tab and card counts come from the business dashboard snapshot, so they may
+    # trail the tabs themselves by up to DASHBOARD_SNAPSHOT_TTL seconds
+    stats = get_snapshot()['console']
 
-    # Get unverified users
-    unverified_users = User.objects.filter(is_verified=False)
-    
     # Get account type settings (placeholder for now)
     credit_settings = {
         'interest_rate': 15.00,
@@ -1159,11 +1240,22 @@ def customer_management_view(request):
     }
     
     context = {
+        'stats': stats,
         'pending_accounts': pending_accounts,
+        'pending_count': stats['pending'],
+        'pending_query': querystring_without(request.GET, 'pending_cursor'),
+        'completed_query': querystring_without(request.GET, 'completed_cursor'),
+        'pickup_query': querystring_without(request.GET, 'pickup_cursor'),
+        'picked_up_query': querystring_without(request.GET, 'picked_up_cursor'),
+        'accounts_query': querystring_without(request.GET, 'accounts_cursor'),
+        'users_query': querystring_without(request.GET, 'users_cursor'),
         'completed_accounts': completed_accounts,
         'available_for_pickup': available_for_pickup,
         'picked_up_accounts': picked_up_accounts,
         'all_accounts': all_accounts,
+        'account_filters': filters,
+        'status_choices': CreditAccount.Status.choices,
+        'type_choices': CreditAccount.AccountType.choices,
         'unverified_users': unverified_users,
         'credit_settings': credit_settings,
         'savings_settings': savings_settings
@@ -1196,6 +1288,7 @@ def decline_account_view(request, account_id):
         # Update account status
         account.status = CreditAccount.Status.DECLINED
         account.save()
+        release_account_stock(account)
         
         messages.success(request, f"Credit account for {account.user.username} has been declined.")
     
@@ -1219,18 +1312,24 @@ def verify_user_view(request, user_id):
 
 @staff_member_required
 def account_detail_view(request, account_id):
-    """View details of a specific credit account"""
-    account = get_object_or_404(CreditAccount, id=account_id)
-    transactions = account.transactions.all().order_by('-timestamp')
-    
+    """View details of a specific credit account (read through to the archive for long-closed plans)"""
+    account = _get_plan_or_404(account_id)
+
     context = {
         'account': account,
-        'transactions': transactions
+        **_transaction_history(request, account),
     }
-    
+
     return render(request, 'account_detail.html', context)
 
 
+@staff_member_required
+def account_statement_view(request, account_id):
+    """Download any account's statement (staff)"""
+    account = _get_plan_or_404(account_id)
+    return _statement_response(request, account)
+
+
 @staff_member_required
 def update_account_settings_view(request):
     """Update account type settings"""
@@ -1260,24 +1359,59 @@ def update_account_settings_view(request):
     return redirect('accounts:customer_management')
 
 
-@login_required
-def payment_history_view(request):
-    """Display payment history for the logged-in user"""
+def _customer_plan(request):
+    """
+    The plan whose history the logged-in user is looking at: the ?plan= one if it
+    is theirs (live or archived), else their current plan, else their latest
+    past plan. None if they never had a plan.
+    """
+    plan_id = request.GET.get('plan', '')
+    if plan_id:
+        try:
+            plan_id = int(plan_id)
+        except ValueError:
+            raise Http404("No such account")
+        plan = _get_plan_or_404(plan_id)
+        if plan.user_id != request.user.pk:
+            raise Http404("No such account")
+        return plan
     try:
-        credit_account = request.user.credit_account
-        transactions = Transaction.objects.filter(
-            account=credit_account).order_by('-timestamp')
+        return request.user.credit_account
     except CreditAccount.DoesNotExist:
-        credit_account = None
-        transactions = []
+        pass
+    # Archiving clears current_plan, so a returning customer may only have archived plans
+    latest = [*request.user.credit_accounts.order_by('-id').values_list('id', flat=True)[:1],
+              *request.user.archived_plans.order_by('-id').values_list('id', flat=True)[:1]]
+    return get_plan(max(latest)) if latest else None
+
+
+@login_required
+def payment_history_view(request):
+    """Display payment history for one of the logged-in user's plans, current or past"""
+    credit_account = _customer_plan(request)
+    # Every plan the customer has had, archived ones included, newest first
+    plans = sorted([*request.user.credit_accounts.select_related('phone'),
+                    *request.user.archived_plans.select_related('phone').defer('data')],
+                   key=lambda plan: plan.pk, reverse=True)
 
     context = {
         'credit_account': credit_account,
-        'transactions': transactions,
+        'plans': plans,
+        'history_plan': request.GET.get('plan', ''),
+        **(_transaction_history(request, credit_account) if credit_account else {'transactions': []}),
     }
     return render(request, 'payment_history.html', context)
 
 
+@login_required
+def statement_view(request):
+    """Download the statement of one of the logged-in user's plans for a date range"""
+    credit_account = _customer_plan(request)
+    if credit_account is None:
+        raise Http404("No account")
+    return _statement_response(request, credit_account)
+
+
 @csrf_exempt
 def test_webhook(request):
     """Test endpoint for webhook debugging"""
@@ -1315,19 +1449,13 @@ def cancel_plan_view(request):
         phone = credit_account.phone
         phone_name = phone.name if phone else "Unknown Phone"
 
-        # Create a record of transactions for accounting purposes
-        if credit_account.balance > 0:
-            # If there's a balance, create a refund transaction
-            Transaction.objects.create(
-                account=credit_account,
-                amount=credit_account.balance,
-                transaction_type=Transaction.TransactionType.REFUND,
-                transaction_id=f"refund_{uuid.uuid4()}",
-                description=f"Refund for cancelled plan: {phone_name}"
-            )
+        # Refund whatever has been paid in. One refund per plan, so a repeated POST can't refund twice.
+        refund_balance(credit_account, f"refund_plan_{credit_account.id}",
+                       description=f"Refund for cancelled plan: {phone_name}")
 
-        # Delete the credit account
-        credit_account.delete()
+        # Put the reserved unit back on sale; the plan and its payments are kept as history
+        release_account_stock(credit_account)
+        credit_account.cancel()
 
         messages.success(request, f"Your plan for the {phone_name} has been cancelled successfully. You can now choose a different plan.")
         return redirect('accounts:dashboard')
@@ -0,0 +1,100 @@
+"""
+An optional single-writer funnel for SQLite
+
+SQLite has one write lock per database. With many request threads writing at
+once they queue inside SQLite's busy handler, which sleeps and polls and
+gives up with "database is locked" after busy_timeout. With
+SQLITE_WRITE_FUNNEL on, functions decorated with @funneled instead run on
+one writer thread per process:
+
+    @funneled
+    def post_transaction(account, amount, transaction_id, ...):
+        ...
+
+The caller blocks until its write has committed and gets the return value,
+or the exception, back as if it had run the function itself. Each call runs
+in its own transaction on the writer thread, whose connection is closed
+between calls if it is broken or older than CONN_MAX_AGE, as a request's
+would be. The queue is bounded: if it stays full for
+SQLITE_WRITE_QUEUE_TIMEOUT seconds the call raises WriteQueueFull, so
+overload shows up as errors rather than unbounded memory.
+
+A call made inside an atomic block (the caller's transaction may already
+hold the write lock) or from the writer thread itself runs inline, to avoid
+deadlocking on the funnel. The funnel serializes writes within a process;
+other processes still meet it at SQLite's lock, under busy_timeout.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+
+
+class WriteQueueFull(Exception):
+    pass
+
+
+class WriteFunnel:
+    def __init__(self, using=DEFAULT_DB_ALIAS, maxsize=256, timeout=10):
+        self.using = using
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize)
+        self.thread = threading.Thread(target=self._work, name=f'write-funnel-{using}', daemon=True)
+        self.thread.start()
+
+    def _work(self):
+        while True:
+            future, func, args, kwargs = self.queue.get()
+            # The thread lives as long as the process, so its connection is
+            # recycled between jobs the way Django does between requests
+            close_old_connections()
+            try:
+                with transaction.atomic(using=self.using):
+                    result = func(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                close_old_connections()
+                self.queue.task_done()
+
+    def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a transaction on the writer thread and return its result"""
+        if threading.current_thread() is self.thread or connections[self.using].in_atomic_block:
+            with transaction.atomic(using=self.using):
+                return func(*args, **kwargs)
+        future = Future()
+        try:
+            self.queue.put((future, func, args, kwargs), timeout=self.timeout)
+        except queue.Full:
+            raise WriteQueueFull(f"{self.queue.maxsize} writes already queued for {self.using!r}") from None
+        return future.result()
+
+
+_funnels = {}
+_funnels_lock = threading.Lock()
+
+
+def get_funnel(using=DEFAULT_DB_ALIAS):
+    with _funnels_lock:
+        if using not in _funnels:
+            _funnels[using] = WriteFunnel(
+                using,
+                maxsize=getattr(settings, 'SQLITE_WRITE_QUEUE_SIZE', 256),
+                timeout=getattr(settings, 'SQLITE_WRITE_QUEUE_TIMEOUT', 10),
+            )
+        return _funnels[using]
+
+
+def funneled(func):
+    """Send calls through the default database's funnel when SQLITE_WRITE_FUNNEL is on"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not getattr(settings, 'SQLITE_WRITE_FUNNEL', False):
+            return func(*args, **kwargs)
+        return get_funnel().run(func, *args, **kwargs)
+    return wrapper
@@ -102,6 +102,9 @@ STRIPE_CURRENCY_SYMBOL = '$'
 # Exchange rate: 1 USD = X GHS (you should update this regularly or use an API)
 USD_TO_GHS_RATE = config('USD_TO_GHS_RATE', default=12.0, cast=float)  # Example rate
 
+# Credit policy version used to decide new credit applications (see accounts/credit_policy.py)
+CREDIT_POLICY_VERSION = config('CREDIT_POLICY_VERSION', default=1, cast=int)
+
 # Email Configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@flexifone.com')
@@ -130,6 +133,57 @@ DATABASES = {
     }
 }
 
+# SQLite production profile: PRAGMAs run on every new connection to a file
+# database, whose transactions also become IMMEDIATE (accounts.sqlite_profile).
+# WAL lets readers work alongside the writer; busy_timeout (ms) makes writers
+# queue for the lock instead of failing. journal_mode = WAL is persistent: the
+# first connection rewrites an existing database file to WAL, including one
+# opened only by a management command.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+} if config('SQLITE_PRODUCTION_PROFILE', default=True, cast=bool) else {}
+
+# Run balance and stock writes one at a time on a single writer thread per
+# process (accounts.write_funnel). Requests wait up to SQLITE_WRITE_QUEUE_TIMEOUT
+# seconds for one of SQLITE_WRITE_QUEUE_SIZE slots.
+SQLITE_WRITE_FUNNEL = config('SQLITE_WRITE_FUNNEL', default=False, cast=bool)
+SQLITE_WRITE_QUEUE_SIZE = config('SQLITE_WRITE_QUEUE_SIZE', default=256, cast=int)
+SQLITE_WRITE_QUEUE_TIMEOUT = config('SQLITE_WRITE_QUEUE_TIMEOUT', default=10, cast=float)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Use a shared backend (Redis/Memcached) in production so catalog invalidation
+# reaches every worker process.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='flexifone-default'),
+    }
+}
+
+# Seconds a cached catalog page/phone detail may live (entries are also invalidated on every change)
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=900, cast=int)
+
+# Business dashboard snapshot: seconds it stays fresh, then seconds it may be
+# served stale while a background refresh runs (see accounts/business_metrics.py)
+DASHBOARD_SNAPSHOT_TTL = config('DASHBOARD_SNAPSHOT_TTL', default=60, cast=int)
+DASHBOARD_SNAPSHOT_STALE = config('DASHBOARD_SNAPSHOT_STALE', default=300, cast=int)
+DASHBOARD_SNAPSHOT_ASYNC = config('DASHBOARD_SNAPSHOT_ASYNC', default=True, cast=bool)
+
+# Seconds the customer dashboard panels stay cached; each user's panels are
+# also dropped whenever their plan, payments or applications change
+# (see accounts/dashboard_cache.py)
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=600, cast=int)
+
+# Finished plans unchanged for this many days are moved to the archive tables
+# by `manage.py archive_plans` (see accounts/archive.py)
+ARCHIVE_RETENTION_DAYS = config('ARCHIVE_RETENTION_DAYS', default=365, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -176,6 +230,13 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Minutes a phone stays reserved for a customer who hasn't finished checkout
+STOCK_RESERVATION_MINUTES = config('STOCK_RESERVATION_MINUTES', default=30, cast=int)
+
+# Resized JPEG/WebP image derivatives (see accounts/image_derivatives.py)
+IMAGE_DERIVATIVES_ASYNC = config('IMAGE_DERIVATIVES_ASYNC', default=True, cast=bool)
+IMAGE_DERIVATIVE_WORKERS = config('IMAGE_DERIVATIVE_WORKERS', default=2, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
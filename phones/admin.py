@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Phone
+from .models import InventoryMovement, Phone, StockReservation
 
 @admin.register(Phone)
 class PhoneAdmin(admin.ModelAdmin):
@@ -24,3 +24,30 @@ class PhoneAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('phone', 'user', 'account', 'quantity', 'status', 'expires_at', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('phone', 'user', 'account')
+    raw_id_fields = ('phone', 'user', 'account')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    """The ledger is append-only: movements are written by phones.inventory and Phone.save"""
+    list_display = ('phone', 'quantity_change', 'reason', 'reservation', 'created_at')
+    list_filter = ('reason',)
+    list_select_related = ('phone',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,220 @@
+"""
+Read-only JSON catalog API for the mobile client
+
+    GET /phones/api/phones/?brand=SAMSUNG&ram=8&min_price=500&fields=id,name,price&limit=20
+    GET /phones/api/phones/<slug>/?fields=name,quotes
+
+Lists are keyset-paginated (see accounts.pagination): follow `next` and
+`previous` instead of building page numbers. `fields` picks the keys to
+return; see API_FIELDS for what is available.
+
+Every response carries a strong ETag and Last-Modified derived from the
+newest Phone.updated_at (stock reservations bump it too). A conditional GET
+whose catalog hasn't changed gets a 304 after a single aggregate query,
+before any rows are fetched or serialized.
+"""
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
+
+from accounts.image_derivatives import current_variants
+from accounts.pagination import paginate_keyset, querystring_without
+from .catalog_cache import CATALOG_ORDERING, catalog_queryset
+from .facets import parse_facet_filters
+from .models import Phone
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def _image(phone, request):
+    return request.build_absolute_uri(phone.image.url) if phone.image else None
+
+
+def _thumbnails(phone, request):
+    """{'320': {'jpeg': url, 'webp': url}, ...} once derivatives exist, else {}"""
+    variants = current_variants(phone, 'image')
+    if variants is None:
+        return {}
+    storage = phone.image.storage
+    return {
+        str(variant['width']): {fmt: request.build_absolute_uri(storage.url(variant[fmt])) for fmt in ('jpeg', 'webp')}
+        for variant in variants['variants']
+    }
+
+
+def _quotes(phone, request):
+    return [
+        {'term_months': quote.term_months, 'monthly_payment': str(quote.monthly_payment),
+         'final_payment': str(quote.final_payment), 'total_amount': str(quote.total_amount)}
+        for quote in phone.get_quotes()
+    ]
+
+
+def _decimal(value):
+    return str(value) if value is not None else None
+
+
+# Field name -> serializer(phone, request)
+API_FIELDS = {
+    'id': lambda phone, request: phone.id,
+    'name': lambda phone, request: phone.name,
+    'slug': lambda phone, request: phone.slug,
+    'brand': lambda phone, request: phone.brand,
+    'brand_display': lambda phone, request: phone.get_brand_display(),
+    'price': lambda phone, request: str(phone.price),
+    'interest_rate': lambda phone, request: str(phone.interest_rate),
+    'description': lambda phone, request: phone.description,
+    'specifications': lambda phone, request: phone.specifications,
+    'ram_gb': lambda phone, request: phone.ram_gb,
+    'storage_gb': lambda phone, request: phone.storage_gb,
+    'screen_inches': lambda phone, request: _decimal(phone.screen_inches),
+    'stock': lambda phone, request: phone.stock,
+    'credit_available': lambda phone, request: phone.credit_available,
+    'image': _image,
+    'thumbnails': _thumbnails,
+    'quotes': _quotes,
+    'url': lambda phone, request: request.build_absolute_uri(reverse('phones:phone_detail', args=[phone.slug])),
+    'updated_at': lambda phone, request: phone.updated_at.isoformat(),
+}
+
+DEFAULT_LIST_FIELDS = ['id', 'name', 'slug', 'brand', 'price', 'image', 'thumbnails', 'url']
+DEFAULT_DETAIL_FIELDS = list(API_FIELDS)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _selected_fields(request, default):
+    raw = request.GET.get('fields')
+    if not raw:
+        return default
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in API_FIELDS]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _serialize(phone, fields, request):
+    return {name: API_FIELDS[name](phone, request) for name in fields}
+
+
+def _json(data, status=200):
+    response = JsonResponse(data, status=status, json_dumps_params={'separators': (',', ':')})
+    # Cacheable by clients and proxies, but always revalidated (cheaply, via the ETag)
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+def _catalog_state(request):
+    """(newest updated_at, phone count) for the whole catalog, computed once per request"""
+    if not hasattr(request, '_catalog_state'):
+        state = Phone.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        request._catalog_state = (state['last_modified'], state['count'])
+    return request._catalog_state
+
+
+def _etag(*parts):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def _list_etag(request):
+    last_modified, count = _catalog_state(request)
+    # The count catches deletions, which don't move max(updated_at)
+    return _etag('list', last_modified and last_modified.isoformat(), count, sorted(request.GET.lists()))
+
+
+def _list_last_modified(request):
+    return _catalog_state(request)[0]
+
+
+def _detail_phone(request, slug):
+    if not hasattr(request, '_api_phone'):
+        request._api_phone = catalog_queryset().filter(slug=slug).first()
+    return request._api_phone
+
+
+def _detail_etag(request, slug):
+    phone = _detail_phone(request, slug)
+    if phone is None:
+        return None
+    return _etag('detail', phone.pk, phone.updated_at.isoformat(), sorted(request.GET.lists()))
+
+
+def _detail_last_modified(request, slug):
+    phone = _detail_phone(request, slug)
+    return phone.updated_at if phone else None
+
+
+def _filtered_catalog(request):
+    phones = catalog_queryset(request.GET.get('brand') or None, parse_facet_filters(request.GET))
+    for param, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+        raw = request.GET.get(param)
+        if raw:
+            try:
+                value = Decimal(raw)
+            except InvalidOperation:
+                raise BadRequest(f"{param} must be a number")
+            # Decimal() also reads NaN and Infinity, which no price can be compared with
+            if not value.is_finite():
+                raise BadRequest(f"{param} must be a number")
+            phones = phones.filter(**{lookup: value})
+    if request.GET.get('credit_available') in ('1', 'true'):
+        phones = phones.filter(credit_available=True)
+    return phones
+
+
+@require_GET
+@condition(etag_func=_list_etag, last_modified_func=_list_last_modified)
+def phone_list_api(request):
+    """Catalog listing with filters, field selection and cursor pagination"""
+    try:
+        fields = _selected_fields(request, DEFAULT_LIST_FIELDS)
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        phones = _filtered_catalog(request)
+    except ValueError as e:
+        return _error(str(e) if isinstance(e, BadRequest) else 'limit must be a whole number')
+
+    if 'quotes' in fields:
+        phones = phones.prefetch_related('quotes')
+    page = paginate_keyset(phones, request.GET.get('cursor'), limit, CATALOG_ORDERING)
+
+    base = request.build_absolute_uri(request.path)
+    query = querystring_without(request.GET, 'cursor')
+
+    def link(cursor):
+        if cursor is None:
+            return None
+        return f"{base}?{query + '&' if query else ''}cursor={cursor}"
+
+    return _json({
+        'results': [_serialize(phone, fields, request) for phone in page],
+        'next': link(page.next_cursor),
+        'previous': link(page.previous_cursor),
+    })
+
+
+@require_GET
+@condition(etag_func=_detail_etag, last_modified_func=_detail_last_modified)
+def phone_detail_api(request, slug):
+    """One catalog phone"""
+    phone = _detail_phone(request, slug)
+    if phone is None:
+        return _error('Phone not found', status=404)
+    try:
+        fields = _selected_fields(request, DEFAULT_DETAIL_FIELDS)
+    except BadRequest as e:
+        return _error(str(e))
+    return _json(_serialize(phone, fields, request))
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PhonesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'phones'
+
+    def ready(self):
+        # Connect catalog signal handlers (cache invalidation)
+        from . import signals  # noqa: F401
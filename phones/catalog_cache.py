@@ -0,0 +1,137 @@
+"""
+Cache layer for the public phone catalog
+
+Catalog pages (per brand filter and page) and phone detail lookups are stored
+in the default cache under a catalog "generation" number. Any change to the
+catalog bumps the generation, which orphans every cached entry at once, so
+invalidation is O(1) no matter how many brand/page combinations were cached.
+
+The generation is bumped from the Phone post_save/post_delete signals (which
+also covers PhoneAdmin edits, including list_editable changes) and must be
+bumped explicitly by code that changes phones with QuerySet.update().
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from accounts.pagination import InvalidCursor, KeysetPage, decode_cursor, paginate_keyset
+
+from .facets import apply_facet_filters, facet_counts
+from .models import Phone
+
+
+PHONES_PER_PAGE = 12
+
+# Matches Phone.Meta.ordering, with id as the tie-breaker
+CATALOG_ORDERING = ('-created_at', '-id')
+
+GENERATION_KEY = 'catalog:generation'
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 15)
+
+
+def get_generation():
+    """Return the current catalog generation, starting a new one if it was evicted"""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Time-based start so an evicted counter never reuses an old generation
+        generation = int(time.time() * 1000)
+        if not cache.add(GENERATION_KEY, generation, timeout=None):
+            generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def invalidate_catalog():
+    """Drop every cached catalog page and phone detail"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Counter missing (never set or evicted) - a fresh generation is enough
+        get_generation()
+
+
+def _key(*parts):
+    return ':'.join(['catalog', str(get_generation())] + [str(part) for part in parts])
+
+
+def catalog_queryset(brand=None, facets=None):
+    """Phones shown in the public catalog: active and in stock"""
+    phones = Phone.objects.filter(is_active=True, stock__gt=0)
+    if brand:
+        phones = phones.filter(brand=brand)
+    if facets:
+        phones = apply_facet_filters(phones, facets)
+    return phones
+
+
+def _facets_key(facets):
+    return ','.join(f"{name}={value}" for name, value in sorted((facets or {}).items())) or 'any'
+
+
+def _position_key(phones, cursor):
+    """
+    Cache key part for where a page starts.
+
+    Keyed on the decoded (signed) position, not the raw token: tampered or
+    junk cursors all fall back to the first page and share its entry, so a
+    client can't fill the cache with copies of it.
+    """
+    if not cursor:
+        return 'first'
+    try:
+        values, direction = decode_cursor(cursor, phones, CATALOG_ORDERING)
+    except InvalidCursor:
+        return 'first'
+    position = f"{direction}:" + ':'.join(value.isoformat() if hasattr(value, 'isoformat') else str(value)
+                                          for value in values)
+    return hashlib.md5(position.encode()).hexdigest()
+
+
+def get_catalog_page(brand=None, cursor=None, facets=None):
+    """
+    Return a KeysetPage of catalog phones for a brand and facet filter.
+
+    Pages are keyset-paginated (see accounts.pagination), so deep pages cost
+    the same as the first one. On a cache hit the page is rebuilt from the
+    cached phones and cursors, so serving it runs no queries.
+    """
+    phones = catalog_queryset(brand, facets)
+    key = _key('list', brand or 'all', _facets_key(facets), _position_key(phones, cursor))
+
+    cached = cache.get(key)
+    if cached is None:
+        page = paginate_keyset(phones, cursor, PHONES_PER_PAGE, CATALOG_ORDERING)
+        cached = {
+            'phones': page.object_list,
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        }
+        cache.set(key, cached, _timeout())
+
+    return KeysetPage(cached['phones'], cached['next_cursor'], cached['previous_cursor'])
+
+
+def get_catalog_facets(brand=None, facets=None):
+    """Return facet value counts for a brand and facet filter (see phones.facets.facet_counts)"""
+    key = _key('facets', brand or 'all', _facets_key(facets))
+    counts = cache.get(key)
+    if counts is None:
+        counts = facet_counts(catalog_queryset(brand), facets or {})
+        cache.set(key, counts, _timeout())
+    return counts
+
+
+def get_catalog_phone(slug):
+    """Return the catalog phone for a slug, or None if it is not for sale"""
+    key = _key('detail', slug)
+    phone = cache.get(key)
+    if phone is None:
+        phone = catalog_queryset().filter(slug=slug).first()
+        if phone is None:
+            return None
+        cache.set(key, phone, _timeout())
+    return phone
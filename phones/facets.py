@@ -0,0 +1,170 @@
+"""
+Faceted filtering for the phone catalog
+
+A configured set of Phone.specifications keys is copied into typed, indexed
+columns on Phone every time a phone is saved (see Phone.save), so catalog
+filters like "8GB RAM, 128GB storage" are plain indexed lookups instead of
+JSON parsing per row. Facet counts are computed with one grouped query per
+facet.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count
+
+
+_NUMBER_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(tb|gb|mb)?', re.IGNORECASE)
+_INCHES_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:-|\s)?(?:inch|in\b|")', re.IGNORECASE)
+
+
+def parse_gigabytes(value):
+    """'128GB' -> 128, '1TB' -> 1024, '8 GB + 4GB virtual' -> 8, '512MB' -> None (under 1GB)"""
+    match = _NUMBER_RE.search(str(value))
+    if not match:
+        return None
+    amount = float(match.group(1))
+    unit = (match.group(2) or 'gb').lower()
+    if unit == 'tb':
+        amount *= 1024
+    elif unit == 'mb':
+        amount /= 1024
+    amount = int(round(amount))
+    return amount or None
+
+
+def parse_inches(value):
+    """'6.7-inch Super Retina XDR' -> Decimal('6.7'), '6.1"' -> Decimal('6.1')"""
+    text = str(value)
+    match = _INCHES_RE.search(text) or _NUMBER_RE.search(text)
+    if not match:
+        return None
+    try:
+        inches = Decimal(match.group(1)).quantize(Decimal('0.1'))
+    except InvalidOperation:
+        return None
+    # Anything outside phone/tablet sizes is a resolution or a typo, not a screen size
+    return inches if Decimal('3') <= inches <= Decimal('15') else None
+
+
+def cast_inches(value):
+    """A screen size filter value: '6.7' -> Decimal('6.7'); NaN and Infinity are rejected"""
+    inches = Decimal(value)
+    if not inches.is_finite():
+        raise ValueError(f"Not a screen size: {value}")
+    return inches.quantize(Decimal('0.1'))
+
+
+# Facet name (query parameter) -> configuration
+FACETS = {
+    'ram': {
+        'field': 'ram_gb',
+        'label': 'RAM',
+        'spec_keys': ['ram', 'memory'],
+        'parse': parse_gigabytes,
+        'cast': int,
+        'display': lambda value: f"{value}GB",
+    },
+    'storage': {
+        'field': 'storage_gb',
+        'label': 'Storage',
+        'spec_keys': ['storage', 'internal_storage', 'rom'],
+        'parse': parse_gigabytes,
+        'cast': int,
+        'display': lambda value: f"{value // 1024}TB" if value >= 1024 and value % 1024 == 0 else f"{value}GB",
+    },
+    'screen': {
+        'field': 'screen_inches',
+        'label': 'Screen size',
+        'spec_keys': ['screen_size', 'display', 'screen'],
+        'parse': parse_inches,
+        'cast': cast_inches,
+        'display': lambda value: f'{value}"',
+    },
+}
+
+
+def _spec_value(specifications, keys):
+    if not isinstance(specifications, dict):
+        return None
+    lowered = {str(key).lower().replace(' ', '_'): value for key, value in specifications.items()}
+    for key in keys:
+        if lowered.get(key) not in (None, ''):
+            return lowered[key]
+    return None
+
+
+def extract_facets(specifications):
+    """Facet column values for a specifications dict, e.g. {'ram_gb': 8, 'storage_gb': 128, ...}"""
+    values = {}
+    for config in FACETS.values():
+        raw = _spec_value(specifications, config['spec_keys'])
+        values[config['field']] = config['parse'](raw) if raw is not None else None
+    return values
+
+
+def parse_facet_filters(params):
+    """Read valid facet filters from request GET params: {'ram': 8, 'screen': Decimal('6.7')}"""
+    selected = {}
+    for name, config in FACETS.items():
+        raw = params.get(name)
+        if raw in (None, ''):
+            continue
+        try:
+            selected[name] = config['cast'](raw)
+        except (ValueError, TypeError, InvalidOperation):
+            continue
+    return selected
+
+
+def apply_facet_filters(queryset, selected, exclude=None):
+    for name, value in selected.items():
+        if name != exclude:
+            queryset = queryset.filter(**{FACETS[name]['field']: value})
+    return queryset
+
+
+def facet_counts(queryset, selected):
+    """
+    Counts for every facet value, one grouped query per facet.
+
+    Each facet is counted with the *other* selected facets applied, so a
+    customer who picked 8GB RAM still sees how many phones each other RAM
+    size would give them.
+    """
+    counts = {}
+    for name, config in FACETS.items():
+        field = config['field']
+        rows = (apply_facet_filters(queryset, selected, exclude=name)
+                .exclude(**{f'{field}__isnull': True})
+                .order_by()
+                .values(field)
+                .annotate(count=Count('id'))
+                .order_by(field))
+        counts[name] = [(row[field], row['count']) for row in rows]
+    return counts
+
+
+def facet_options(counts, selected, params):
+    """Template-ready facet groups with toggle links that keep the other query params"""
+    groups = []
+    for name, config in FACETS.items():
+        options = []
+        for value, count in counts.get(name, []):
+            is_selected = selected.get(name) == value
+            query = params.copy()
+            query.pop('page', None)
+            query.pop('cursor', None)
+            if is_selected:
+                query.pop(name, None)
+            else:
+                query[name] = str(value)
+            options.append({
+                'value': value,
+                'label': config['display'](value),
+                'count': count,
+                'selected': is_selected,
+                'querystring': query.urlencode(),
+            })
+        if options:
+            groups.append({'name': name, 'label': config['label'], 'options': options})
+    return groups
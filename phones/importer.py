@@ -0,0 +1,241 @@
+"""
+Bulk catalog import from CSV or JSON Lines
+
+Rows are streamed from the file and handled in batches, so memory stays flat
+however many SKUs the file holds. Each batch is validated with the model's
+field validation, then upserted with one bulk_create(update_conflicts=True)
+keyed on slug (slug defaults to slugify("<brand>-<name>") as in Phone.save).
+
+CSV columns / JSON keys are the IMPORT_FIELDS below. `specifications` is a
+JSON object (a JSON string in CSV), and `image` is the path of a local image
+file, relative to the image directory. Images are stored under a
+content-hashed name, so re-importing the same picture leaves the phone
+untouched.
+
+bulk_create() skips Phone.save() and the post_save signal, so everything they
+normally do is done here per batch: facet columns, the search index,
+installment quotes, the inventory ledger, image derivatives and the catalog
+cache. Stock is applied the way Phone.save() applies it: the file gives the
+new level, which is written as a delta so reservations made meanwhile are
+kept.
+"""
+import csv
+import hashlib
+import json
+import os
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils.text import slugify
+
+from accounts.image_derivatives import schedule_derivatives
+from accounts.signals import sync_plan_totals
+from .catalog_cache import invalidate_catalog
+from .inventory import adjust_stock
+from .models import InventoryMovement, Phone
+from .quotes import refresh_quotes
+from .search import fts_available, index_phones
+
+
+IMPORT_FIELDS = [
+    'name', 'slug', 'brand', 'price', 'description', 'specifications', 'image', 'stock',
+    'is_active', 'credit_available', 'min_credit_score', 'max_installments', 'interest_rate',
+]
+
+BOOLEAN_FIELDS = {'is_active', 'credit_available'}
+
+# Columns rewritten when an imported slug already exists. Stock is applied
+# separately as a delta; image and its variants only when the row has an image.
+UPSERT_FIELDS = [
+    'name', 'brand', 'price', 'description', 'specifications', 'image', 'image_variants',
+    'is_active', 'credit_available', 'min_credit_score', 'max_installments', 'interest_rate',
+    'ram_gb', 'storage_gb', 'screen_inches', 'updated_at',
+]
+
+DEFAULT_BATCH_SIZE = 1000
+
+_BRANDS = {code.lower(): code for code, label in Phone.BRAND_CHOICES} | \
+    {label.lower(): code for code, label in Phone.BRAND_CHOICES}
+
+
+class ImportResult:
+    def __init__(self):
+        self.valid = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []  # (line number, message)
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+
+def read_rows(path, fmt=None):
+    """Yield (line number, row dict) from a .csv or .jsonl file, one row at a time"""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            unknown = set(reader.fieldnames or []) - set(IMPORT_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+            for row in reader:
+                # Empty cells fall back to the model defaults
+                yield reader.line_num, {key: value for key, value in row.items() if value not in ('', None)}
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield line_number, e
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def store_image(path):
+    """Copy a local image into storage under a content-hashed name; returns the stored name"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    name = f"phones/import-{digest.hexdigest()[:20]}{os.path.splitext(path)[1].lower()}"
+    if not default_storage.exists(name):
+        with open(path, 'rb') as f:
+            name = default_storage.save(name, File(f))
+    return name
+
+
+def build_phone(row, image_dir, store_images=True):
+    """Validate one row into an unsaved Phone; raises ValidationError or ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError(str(row) if isinstance(row, Exception) else 'Each line must be a JSON object')
+    unknown = set(row) - set(IMPORT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    values = dict(row)
+    image = values.pop('image', None)
+    if 'brand' in values:
+        values['brand'] = _BRANDS.get(str(values['brand']).strip().lower(), values['brand'])
+    if isinstance(values.get('specifications'), str):
+        try:
+            values['specifications'] = json.loads(values['specifications'])
+        except json.JSONDecodeError:
+            raise ValueError("specifications must be a JSON object")
+    if not isinstance(values.get('specifications', {}), dict):
+        raise ValueError("specifications must be a JSON object")
+    for field in BOOLEAN_FIELDS & set(values):
+        if isinstance(values[field], str):
+            values[field] = values[field].strip().lower() in ('1', 'true', 'yes', 'y')
+
+    phone = Phone(**values)
+    if not phone.slug:
+        phone.slug = slugify(f"{phone.brand}-{phone.name}")
+    # clean_fields() also converts CSV strings to Python values
+    phone.full_clean(exclude=['image'], validate_unique=False)
+    phone.apply_facets()
+
+    if image:
+        path = image if os.path.isabs(image) else os.path.join(image_dir, image)
+        if not os.path.isfile(path):
+            raise ValueError(f"Image not found: {path}")
+        if store_images:
+            phone.image = store_image(path)
+    return phone
+
+
+def _save_batch(phones):
+    """Upsert one batch of validated phones; returns (created, updated, slugs whose stock couldn't be lowered)"""
+    slugs = [phone.slug for phone in phones]
+    existing = {
+        row[0]: row[1:]
+        for row in Phone.objects.filter(slug__in=slugs).values_list(
+            'slug', 'stock', 'price', 'interest_rate', 'image', 'image_variants')
+    }
+    stock_levels = {}
+    repriced = set()
+    for phone in phones:
+        stock_levels[phone.slug] = phone.stock
+        if phone.slug not in existing:
+            repriced.add(phone.slug)
+            continue
+        stock, price, interest_rate, image, variants = existing[phone.slug]
+        if (price, interest_rate) != (phone.price, phone.interest_rate):
+            repriced.add(phone.slug)
+        if not phone.image or phone.image.name == image:
+            phone.image, phone.image_variants = image, variants
+
+    # Sets each phone's pk, whether its row was inserted or updated
+    saved = Phone.objects.bulk_create(phones, update_conflicts=True, unique_fields=['slug'],
+                                      update_fields=UPSERT_FIELDS)
+    movements = []
+    short = []
+    for phone in saved:
+        if phone.slug in existing:
+            change = stock_levels[phone.slug] - existing[phone.slug][0]
+            # Fails only if reservations took the units since we read the stock
+            if change and not adjust_stock(phone.pk, change, InventoryMovement.Reason.ADJUSTMENT):
+                short.append(phone.slug)
+        elif phone.stock:
+            movements.append(InventoryMovement(
+                phone=phone, quantity_change=phone.stock, reason=InventoryMovement.Reason.RESTOCK))
+    InventoryMovement.objects.bulk_create(movements)
+
+    if fts_available():
+        with connection.cursor() as cursor:
+            index_phones(saved, cursor)
+    # Unchanged prices keep their quotes, so re-importing a catalog stays cheap
+    repriced_phones = [phone for phone in saved if phone.slug in repriced]
+    refresh_quotes(repriced_phones)
+    # The upsert skips post_save, which keeps Save-to-Own plans' plan_total in step
+    sync_plan_totals([phone.pk for phone in repriced_phones])
+    for phone in saved:
+        schedule_derivatives(phone)
+
+    return len(phones) - len(existing), len(existing), short
+
+
+def import_phones(rows, image_dir='', batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Import (line number, row) pairs as from read_rows(); returns an ImportResult.
+
+    Invalid rows are reported and skipped; every batch commits on its own,
+    so an interrupted import can simply be re-run.
+    """
+    result = ImportResult()
+    for batch in _batches(rows, batch_size):
+        phones = {}
+        for line_number, row in batch:
+            try:
+                phone = build_phone(row, image_dir, store_images=not dry_run)
+            except ValidationError as e:
+                result.errors.append((line_number, '; '.join(
+                    f"{field}: {' '.join(messages)}" for field, messages in e.message_dict.items())))
+                continue
+            except (ValueError, TypeError) as e:
+                result.errors.append((line_number, str(e)))
+                continue
+            result.valid += 1
+            # A slug repeated within the file: the last row wins
+            phones[phone.slug] = (line_number, phone)
+
+        if not phones or dry_run:
+            continue
+        with transaction.atomic():
+            created, updated, short = _save_batch([phone for line_number, phone in phones.values()])
+        result.created += created
+        result.updated += updated
+        for slug in short:
+            result.errors.append((phones[slug][0], f"{slug}: not enough unreserved stock to lower it; stock left unchanged"))
+
+    if result.imported and not dry_run:
+        invalidate_catalog()
+    return result
@@ -0,0 +1,159 @@
+"""
+Stock reservations and the inventory ledger
+
+Phone.stock is the number of units still available for sale. Units leave it
+only through reserve_stock(), which decrements stock with a single
+conditional UPDATE (... SET stock = stock - n WHERE stock >= n). Two buyers
+racing for the last unit can't both succeed, because the database applies
+the condition and the decrement as one statement.
+
+A reservation starts HELD while the customer finishes checkout and is
+COMMITTED once their plan starts. Held reservations that are never committed
+are returned to stock by expire_reservations() (run it from cron or the
+scheduler with `manage.py expire_stock_reservations`). Every stock change is
+written to the InventoryMovement ledger, and every write here goes through
+the SQLite write funnel when it is on (accounts.write_funnel).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.write_funnel import funneled
+
+from .catalog_cache import invalidate_catalog
+from .models import InventoryMovement, Phone, StockReservation
+
+
+# Reservations that hold stock
+OPEN_STATUSES = [StockReservation.Status.HELD, StockReservation.Status.COMMITTED]
+
+
+class OutOfStock(Exception):
+    pass
+
+
+def _hold_minutes():
+    return getattr(settings, 'STOCK_RESERVATION_MINUTES', 30)
+
+
+@funneled
+def adjust_stock(phone_id, quantity_change, reason, reservation=None):
+    """
+    Apply a stock change with a conditional UPDATE and record it in the ledger.
+
+    Returns False, changing nothing, if it would take stock below zero. Use
+    this (or Phone.save(), which calls it) for any change to Phone.stock.
+    """
+    phones = Phone.objects.filter(pk=phone_id)
+    if quantity_change < 0:
+        phones = phones.filter(stock__gte=-quantity_change)
+    with transaction.atomic():
+        if not phones.update(stock=F('stock') + quantity_change, updated_at=timezone.now()):
+            return False
+        InventoryMovement.objects.create(phone_id=phone_id, quantity_change=quantity_change,
+                                         reason=reason, reservation=reservation)
+    # QuerySet.update() skips the post_save signal, so drop cached catalog pages here
+    transaction.on_commit(invalidate_catalog)
+    return True
+
+
+@funneled
+def save_stock_edit(phone, stock_change, save, *args, **kwargs):
+    """Phone.save() for an edit that changes stock: save() the other fields, then apply the stock delta"""
+    with transaction.atomic():
+        save(*args, **kwargs)
+        if not adjust_stock(phone.pk, stock_change, InventoryMovement.Reason.ADJUSTMENT):
+            raise ValidationError({'stock': phone._stock_error(stock_change)})
+
+
+@funneled
+def reserve_stock(phone, user, quantity=1, account=None, commit=False):
+    """
+    Take `quantity` units of a phone out of stock for a customer.
+
+    Returns a HELD reservation that lapses after STOCK_RESERVATION_MINUTES
+    (or a COMMITTED one if commit=True). Raises OutOfStock if the phone
+    doesn't have enough units left.
+    """
+    with transaction.atomic():
+        reservation = StockReservation.objects.create(
+            phone=phone, user=user, account=account, quantity=quantity,
+            status=StockReservation.Status.COMMITTED if commit else StockReservation.Status.HELD,
+            expires_at=None if commit else timezone.now() + timedelta(minutes=_hold_minutes()),
+        )
+        if not adjust_stock(phone.pk, -quantity, InventoryMovement.Reason.RESERVE, reservation):
+            # Rolls back the reservation row created above
+            raise OutOfStock(f"{phone.name} is out of stock")
+    return reservation
+
+
+def _transition(reservation, from_statuses, to_status, **changes):
+    """Move a reservation between statuses; False if another request got there first"""
+    updated = StockReservation.objects.filter(pk=reservation.pk, status__in=from_statuses).update(
+        status=to_status, updated_at=timezone.now(), **changes)
+    if updated:
+        reservation.status = to_status
+        for name, value in changes.items():
+            setattr(reservation, name, value)
+    return bool(updated)
+
+
+@funneled
+def release_reservation(reservation, expired=False):
+    """Return a held or committed reservation's units to stock"""
+    with transaction.atomic():
+        status = StockReservation.Status.EXPIRED if expired else StockReservation.Status.RELEASED
+        from_statuses = [StockReservation.Status.HELD] if expired else OPEN_STATUSES
+        if not _transition(reservation, from_statuses, status):
+            return False
+        reason = InventoryMovement.Reason.EXPIRE if expired else InventoryMovement.Reason.RELEASE
+        adjust_stock(reservation.phone_id, reservation.quantity, reason, reservation)
+    return True
+
+
+@funneled
+def commit_account_stock(account):
+    """
+    Allocate a unit to a plan that is starting.
+
+    Commits the account's held reservation, or reserves a fresh unit if the
+    hold expired in the meantime. Raises OutOfStock if none is left.
+    """
+    reservations = StockReservation.objects.filter(account=account)
+    if reservations.filter(status=StockReservation.Status.COMMITTED).exists():
+        return
+    for reservation in reservations.filter(status=StockReservation.Status.HELD):
+        if _transition(reservation, [StockReservation.Status.HELD], StockReservation.Status.COMMITTED,
+                       expires_at=None):
+            return
+    reserve_stock(account.phone, account.user, account=account, commit=True)
+
+
+def release_account_stock(account, include_committed=True):
+    """Return every unit still reserved for an account (plan cancelled, declined or replaced)"""
+    statuses = OPEN_STATUSES if include_committed else [StockReservation.Status.HELD]
+    released = 0
+    for reservation in StockReservation.objects.filter(account=account, status__in=statuses):
+        released += release_reservation(reservation)
+    return released
+
+
+@funneled
+def fulfill_account_stock(account):
+    """Mark an account's committed unit as handed over"""
+    return StockReservation.objects.filter(account=account, status=StockReservation.Status.COMMITTED).update(
+        status=StockReservation.Status.FULFILLED, updated_at=timezone.now())
+
+
+def expire_reservations(now=None):
+    """Return the units of lapsed HELD reservations to stock; returns how many reservations expired"""
+    now = now or timezone.now()
+    expired = 0
+    lapsed = StockReservation.objects.filter(status=StockReservation.Status.HELD, expires_at__lte=now)
+    for reservation in lapsed.iterator():
+        expired += release_reservation(reservation, expired=True)
+    return expired
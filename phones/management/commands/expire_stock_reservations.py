@@ -0,0 +1,13 @@
+"""
+Management command to return the stock of abandoned checkouts (run every few minutes)
+"""
+from django.core.management.base import BaseCommand
+from phones.inventory import expire_reservations
+
+
+class Command(BaseCommand):
+    help = 'Expire held stock reservations past their expiry time and put the units back on sale'
+
+    def handle(self, *args, **options):
+        count = expire_reservations()
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} stock reservations'))
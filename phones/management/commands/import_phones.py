@@ -0,0 +1,66 @@
+"""
+Management command to bulk import the phone catalog from CSV or JSON Lines
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from phones.importer import DEFAULT_BATCH_SIZE, import_phones, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Create or update phones (matched on slug) from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='File format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--image-dir',
+            help='Directory that relative image paths are resolved against (default: the file\'s directory)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows validated and written per batch (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate every row without writing anything'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+        image_dir = options['image_dir'] or os.path.dirname(os.path.abspath(path))
+
+        started = time.perf_counter()
+        try:
+            result = import_phones(
+                read_rows(path, options['format']),
+                image_dir=image_dir,
+                batch_size=max(options['batch_size'], 1),
+                dry_run=options['dry_run'],
+            )
+        except (ValueError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        for line_number, message in result.errors:
+            self.stderr.write(f"Line {line_number}: {message}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run: {result.valid} valid rows, {len(result.errors)} errors in {elapsed:.1f}s"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {result.imported} phones ({result.created} created, {result.updated} updated), "
+                f"{len(result.errors)} errors in {elapsed:.1f}s"
+            ))
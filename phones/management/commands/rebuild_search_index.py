@@ -0,0 +1,17 @@
+"""
+Management command to rebuild the phone catalog full-text search index
+"""
+from django.core.management.base import BaseCommand
+from phones.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 search index for every phone in the catalog'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(self.style.WARNING('Full-text search needs SQLite FTS5; nothing to rebuild'))
+            return
+
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} phones'))
@@ -0,0 +1,38 @@
+# Full-text search index for the phone catalog (SQLite FTS5 only)
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from phones.search import CREATE_FTS_SQL, FTS_TABLE, flatten_specifications
+
+    Phone = apps.get_model('phones', 'Phone')
+    brand_names = dict(Phone._meta.get_field('brand').choices)
+    schema_editor.execute(CREATE_FTS_SQL)
+    for phone in Phone.objects.all().iterator():
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, brand, description, specifications) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [phone.pk, phone.name, f"{phone.brand} {brand_names.get(phone.brand, phone.brand)}",
+             phone.description, flatten_specifications(phone.specifications)],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from phones.search import DROP_FTS_SQL
+    schema_editor.execute(DROP_FTS_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0004_phone_credit_available_phone_interest_rate_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
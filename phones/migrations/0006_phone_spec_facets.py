@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:06
+
+from django.db import migrations, models
+
+
+def populate_facets(apps, schema_editor):
+    from phones.facets import extract_facets
+
+    Phone = apps.get_model('phones', 'Phone')
+    phones = []
+    for phone in Phone.objects.all().iterator():
+        for field, value in extract_facets(phone.specifications).items():
+            setattr(phone, field, value)
+        phones.append(phone)
+    Phone.objects.bulk_update(phones, ['ram_gb', 'storage_gb', 'screen_inches'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0005_phone_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phone',
+            name='ram_gb',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='phone',
+            name='screen_inches',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=1, editable=False, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='phone',
+            name='storage_gb',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
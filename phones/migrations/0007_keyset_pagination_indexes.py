@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0006_phone_spec_facets'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='phone',
+            index=models.Index(fields=['created_at', 'id'], name='phone_created_idx'),
+        ),
+    ]
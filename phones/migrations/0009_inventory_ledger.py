@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_stock(apps, schema_editor):
+    Phone = apps.get_model('phones', 'Phone')
+    InventoryMovement = apps.get_model('phones', 'InventoryMovement')
+    InventoryMovement.objects.bulk_create(
+        [InventoryMovement(phone_id=phone_id, quantity_change=stock, reason='RESTOCK')
+         for phone_id, stock in Phone.objects.filter(stock__gt=0).values_list('id', 'stock')],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_image_variants'),
+        ('phones', '0008_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(choices=[('HELD', 'Held'), ('COMMITTED', 'Committed'), ('FULFILLED', 'Fulfilled'), ('RELEASED', 'Released'), ('EXPIRED', 'Expired')], default='HELD', max_length=20)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='When a held reservation lapses', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_reservations', to='accounts.creditaccount')),
+                ('phone', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='phones.phone')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_change', models.IntegerField(help_text='Units added to (+) or taken from (-) available stock')),
+                ('reason', models.CharField(choices=[('RESTOCK', 'Restock'), ('ADJUSTMENT', 'Manual adjustment'), ('RESERVE', 'Reserved'), ('RELEASE', 'Reservation released'), ('EXPIRE', 'Reservation expired')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('phone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='phones.phone')),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='phones.stockreservation')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['phone', 'created_at'], name='inventory_phone_idx'),
+        ),
+        migrations.RunPython(record_opening_stock, migrations.RunPython.noop),
+    ]
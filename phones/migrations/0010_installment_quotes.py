@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 23:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_quotes(apps, schema_editor):
+    from phones.quotes import QUOTE_FIELDS, QUOTE_TERMS, calculate_quote
+
+    Phone = apps.get_model('phones', 'Phone')
+    InstallmentQuote = apps.get_model('phones', 'InstallmentQuote')
+    quotes = []
+    for phone_id, price, interest_rate in Phone.objects.values_list('id', 'price', 'interest_rate').iterator():
+        for term in QUOTE_TERMS:
+            quote = calculate_quote(price, interest_rate, term)
+            quotes.append(InstallmentQuote(
+                phone_id=phone_id, term_months=term,
+                **{field: getattr(quote, field) for field in QUOTE_FIELDS}))
+    InstallmentQuote.objects.bulk_create(quotes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0009_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstallmentQuote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term_months', models.PositiveSmallIntegerField()),
+                ('principal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('total_interest', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('monthly_payment', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('final_payment', models.DecimalField(decimal_places=2, help_text='Last installment, absorbing rounding so the plan sums to total_amount', max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('phone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quotes', to='phones.phone')),
+            ],
+            options={
+                'ordering': ['phone', 'term_months'],
+                'constraints': [models.UniqueConstraint(fields=('phone', 'term_months'), name='unique_phone_quote_term')],
+            },
+        ),
+        migrations.RunPython(populate_quotes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0010_installment_quotes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='phone',
+            name='brand',
+            field=models.CharField(choices=[('APPLE', 'Apple'), ('SAMSUNG', 'Samsung'), ('HUAWEI', 'Huawei'), ('TECNO', 'Tecno'), ('INFINIX', 'Infinix'), ('ITEL', 'Itel'), ('NOKIA', 'Nokia'), ('OTHER', 'Other')], max_length=20),
+        ),
+    ]
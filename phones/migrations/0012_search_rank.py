@@ -0,0 +1,28 @@
+# Store the bm25 column weights as the search index's default rank (SQLite FTS5 only)
+
+from django.db import migrations
+
+
+def configure_rank(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from phones.search import RANK_SQL
+    schema_editor.execute(RANK_SQL)
+
+
+def reset_rank(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from phones.search import FTS_TABLE
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('rank', 'bm25()')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phones', '0011_brand_choices'),
+    ]
+
+    operations = [
+        migrations.RunPython(configure_rank, reset_rank),
+    ]
@@ -1,8 +1,14 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.text import slugify
-from django.db.models import Q
+
+from .facets import extract_facets
 
 class Phone(models.Model):
+    # Derivative widths rendered for each image field (see accounts.image_derivatives)
+    IMAGE_DERIVATIVE_WIDTHS = {'image': (320, 640, 960)}
+
     BRAND_CHOICES = [
         ('APPLE', 'Apple'),
         ('SAMSUNG', 'Samsung'),
@@ -21,9 +27,16 @@ class Phone(models.Model):
     description = models.TextField()
     specifications = models.JSONField(default=dict, blank=True)
     image = models.ImageField(upload_to='phones/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
 
+    # Facet columns, extracted from specifications on save (see phones.facets)
+    ram_gb = models.PositiveSmallIntegerField(null=True, blank=True, db_index=True, editable=False)
+    storage_gb = models.PositiveIntegerField(null=True, blank=True, db_index=True, editable=False)
+    screen_inches = models.DecimalField(
+        max_digits=3, decimal_places=1, null=True, blank=True, db_index=True, editable=False)
+
     # Credit-specific fields (moved from Product model)
     credit_available = models.BooleanField(
         default=True, help_text="Whether this phone is available for credit purchase")
@@ -39,32 +52,170 @@ class Phone(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the catalog, in Meta.ordering order (see accounts.pagination)
+            models.Index(fields=['created_at', 'id'], name='phone_created_idx'),
+        ]
         verbose_name = 'Phone'
         verbose_name_plural = 'Phones'
     
     def __str__(self):
         return f"{self.brand} {self.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stock we read so save() can apply edits as a delta (see save)
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(f"{self.brand}-{self.name}")
-        super().save(*args, **kwargs)
+        self.apply_facets()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'specifications' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | set(extract_facets({}))
+
+        # Stock is changed concurrently by reservations (phones.inventory), so a
+        # save from a stale instance must never write back the stock it read.
+        # Stock is left out of the UPDATE; an edit is applied afterwards as a
+        # conditional delta, the same way a reservation takes stock.
+        adding = self._state.adding
+        stock_change = 0
+        loaded_stock = getattr(self, '_loaded_stock', None)
+        if not adding and loaded_stock is not None and (update_fields is None or 'stock' in update_fields):
+            stock_change = self.stock - loaded_stock
+            kwargs['update_fields'] = [field.attname for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.attname != 'stock'
+                                       and (update_fields is None or field.name in kwargs['update_fields']
+                                            or field.attname in kwargs['update_fields'])]
+
+        if stock_change:
+            from .inventory import save_stock_edit
+            save_stock_edit(self, stock_change, super().save, *args, **kwargs)
+            self.refresh_from_db(fields=['stock'])
+        else:
+            super().save(*args, **kwargs)
+            if adding and self.stock:
+                InventoryMovement.objects.create(phone=self, quantity_change=self.stock,
+                                                 reason=InventoryMovement.Reason.RESTOCK)
+        self._loaded_stock = self.stock
+
+    def clean(self):
+        super().clean()
+        # Catch a stock cut that would go below zero while the form can still show it
+        loaded_stock = getattr(self, '_loaded_stock', None)
+        if self.pk and loaded_stock is not None and self.stock < loaded_stock:
+            current = Phone.objects.filter(pk=self.pk).values_list('stock', flat=True).first() or 0
+            if current + self.stock - loaded_stock < 0:
+                raise ValidationError({'stock': self._stock_error(self.stock - loaded_stock)})
+
+    def _stock_error(self, stock_change):
+        return (f"Can't take {-stock_change} units out of stock: reservations have left fewer "
+                f"than that. Reload the phone and try again.")
+
+    def apply_facets(self):
+        """Copy the faceted specification values into their indexed columns"""
+        for field, value in extract_facets(self.specifications).items():
+            setattr(self, field, value)
+
+    def get_quote(self, term_months):
+        """The installment quote for a term, from the precomputed table (see phones.quotes)"""
+        from .quotes import quote_for_phone
+        return quote_for_phone(self, term_months)
+
+    def get_quotes(self):
+        """Quotes for every offered term, shortest first"""
+        from .quotes import QUOTE_TERMS
+        return [self.get_quote(term) for term in QUOTE_TERMS]
 
     @property
     def monthly_payment_12_months(self):
-        """Calculate monthly payment for 12-month term"""
-        if self.interest_rate > 0:
-            # Simple interest calculation
-            total_interest = (self.price * self.interest_rate / 100)
-            total_amount = self.price + total_interest
-            return total_amount / 12
-        return self.price / 12
+        """Monthly payment for a 12-month term"""
+        return self.get_quote(12).monthly_payment
 
     @property
     def monthly_payment_6_months(self):
-        """Calculate monthly payment for 6-month term"""
-        if self.interest_rate > 0:
-            total_interest = (self.price * self.interest_rate / 100)
-            total_amount = self.price + total_interest
-            return total_amount / 6
-        return self.price / 6
+        """Monthly payment for a 6-month term"""
+        return self.get_quote(6).monthly_payment
+
+
+class StockReservation(models.Model):
+    """Units of a phone set aside for a customer's plan (see phones.inventory)"""
+
+    class Status(models.TextChoices):
+        HELD = 'HELD', 'Held'              # Checkout in progress, expires at expires_at
+        COMMITTED = 'COMMITTED', 'Committed'  # Plan started, unit allocated to the customer
+        FULFILLED = 'FULFILLED', 'Fulfilled'  # Device handed over
+        RELEASED = 'RELEASED', 'Released'  # Plan cancelled or declined, unit back in stock
+        EXPIRED = 'EXPIRED', 'Expired'     # Checkout abandoned, unit back in stock
+
+    phone = models.ForeignKey(Phone, on_delete=models.PROTECT, related_name='reservations')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='stock_reservations')
+    account = models.ForeignKey('accounts.CreditAccount', on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='stock_reservations')
+    quantity = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.HELD)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="When a held reservation lapses")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.phone} for {self.user} ({self.status})"
+
+
+class InventoryMovement(models.Model):
+    """Append-only ledger of every stock change; the sum of quantity_change per phone equals its stock"""
+
+    class Reason(models.TextChoices):
+        RESTOCK = 'RESTOCK', 'Restock'
+        ADJUSTMENT = 'ADJUSTMENT', 'Manual adjustment'
+        RESERVE = 'RESERVE', 'Reserved'
+        RELEASE = 'RELEASE', 'Reservation released'
+        EXPIRE = 'EXPIRE', 'Reservation expired'
+
+    phone = models.ForeignKey(Phone, on_delete=models.CASCADE, related_name='inventory_movements')
+    quantity_change = models.IntegerField(help_text="Units added to (+) or taken from (-) available stock")
+    reason = models.CharField(max_length=20, choices=Reason.choices)
+    reservation = models.ForeignKey(StockReservation, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='movements')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['phone', 'created_at'], name='inventory_phone_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.phone}: {self.quantity_change:+d} ({self.get_reason_display()})"
+
+
+class InstallmentQuote(models.Model):
+    """Precomputed installment plan for a phone and term, refreshed when price or rate changes"""
+    phone = models.ForeignKey(Phone, on_delete=models.CASCADE, related_name='quotes')
+    term_months = models.PositiveSmallIntegerField()
+    principal = models.DecimalField(max_digits=10, decimal_places=2)
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    total_interest = models.DecimalField(max_digits=10, decimal_places=2)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    monthly_payment = models.DecimalField(max_digits=10, decimal_places=2)
+    final_payment = models.DecimalField(
+        max_digits=10, decimal_places=2, help_text="Last installment, absorbing rounding so the plan sums to total_amount")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['phone', 'term_months']
+        constraints = [
+            models.UniqueConstraint(fields=['phone', 'term_months'], name='unique_phone_quote_term'),
+        ]
+
+    def __str__(self):
+        return f"{self.phone}: {self.term_months} x ₵{self.monthly_payment}"
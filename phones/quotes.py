@@ -0,0 +1,103 @@
+"""
+Installment quotes
+
+One engine prices every installment plan: catalog cards, the credit
+application summary and the amounts charged on BNPL accounts all come from
+calculate_quote(). Pricing is the shop's flat rate: Phone.interest_rate percent
+of the price is added once, and the total is split into equal monthly
+payments rounded to the pesewa. The last payment absorbs the rounding, so a
+plan always sums exactly to its total.
+
+Quotes for every offered term are precomputed into the InstallmentQuote
+table. The Phone post_save signal refreshes them, and code that changes
+prices with QuerySet.update() or bulk_create() must call refresh_quotes().
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import InstallmentQuote
+
+
+# Terms offered to customers (CreditApplicationForm.installment_count)
+QUOTE_TERMS = (6, 12, 18, 24)
+
+CENT = Decimal('0.01')
+
+QUOTE_FIELDS = ['principal', 'interest_rate', 'total_interest', 'total_amount', 'monthly_payment', 'final_payment']
+
+
+def _quote_values(price, interest_rate, term_months):
+    """The QUOTE_FIELDS values of a plan, in order"""
+    principal = Decimal(price).quantize(CENT, ROUND_HALF_UP)
+    rate = Decimal(interest_rate or 0)
+    total_interest = (principal * rate / 100).quantize(CENT, ROUND_HALF_UP)
+    total_amount = principal + total_interest
+    monthly_payment = (total_amount / term_months).quantize(CENT, ROUND_HALF_UP)
+    return (principal, rate, total_interest, total_amount, monthly_payment,
+            total_amount - monthly_payment * (term_months - 1))
+
+
+def calculate_quote(price, interest_rate, term_months):
+    """Price a plan; returns an unsaved InstallmentQuote"""
+    return InstallmentQuote(term_months=term_months,
+                            **dict(zip(QUOTE_FIELDS, _quote_values(price, interest_rate, term_months))))
+
+
+def _is_current(quote, phone):
+    return quote.principal == Decimal(phone.price).quantize(CENT, ROUND_HALF_UP) and \
+        quote.interest_rate == Decimal(phone.interest_rate or 0)
+
+
+def quote_table(phone):
+    """The stored quotes for a phone by term (uses prefetch_related('quotes') when present)"""
+    table = getattr(phone, '_quote_table', None)
+    if table is None:
+        table = {quote.term_months: quote for quote in phone.quotes.all()} if phone.pk else {}
+        phone._quote_table = table
+    return table
+
+
+def quote_for_phone(phone, term_months):
+    """
+    The quote for a phone and term.
+
+    Served from the precomputed table; a missing or stale row (e.g. an
+    unsaved price edit, or an unusual term) is priced on the fly instead.
+    """
+    quote = quote_table(phone).get(term_months)
+    if quote is None or not _is_current(quote, phone):
+        quote = calculate_quote(phone.price, phone.interest_rate, term_months)
+        quote.phone = phone
+    return quote
+
+
+def _upsert_sql():
+    table = connection.ops.quote_name(InstallmentQuote._meta.db_table)
+    columns = ['phone_id', 'term_months', *QUOTE_FIELDS, 'updated_at']
+    updates = ', '.join(f"{column} = excluded.{column}" for column in columns[2:])
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT (phone_id, term_months) DO UPDATE SET {updates}"
+    )
+
+
+def refresh_quotes(phones):
+    """
+    Recompute and upsert the quote table for the given phones; returns the number of rows written.
+
+    The rows go in with one executemany() upsert rather than bulk_create(),
+    which spent most of a catalog import building and preparing 4 quote
+    objects per phone.
+    """
+    updated_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = []
+    for phone in phones:
+        for term in QUOTE_TERMS:
+            rows.append([phone.pk, term, *_quote_values(phone.price, phone.interest_rate, term), updated_at])
+        phone._quote_table = None
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(_upsert_sql(), rows)
+    return len(rows)
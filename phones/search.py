@@ -0,0 +1,190 @@
+"""
+Full-text search over the phone catalog (SQLite FTS5)
+
+The phones_phone_fts virtual table holds one row per phone (rowid = Phone.id)
+with the name, brand, description and flattened specifications JSON. It is
+created by migration 0005 and kept in sync from the Phone save/delete signals.
+Every search term of two or more characters is prefix-matched, so
+"128 sams cam" finds the 128GB Samsung phones that mention their camera.
+
+Every match is ranked with bm25, using the column weights set once as the
+table's default rank (migration 0012), joined to phones_phone so that only
+catalog phones (active, in stock) are ranked, and the best `limit` come back
+in one query. Narrower filters (brand, facets) are passed in as a queryset and go
+into the same query as an id subquery, ahead of the LIMIT.
+
+On other database backends search falls back to icontains filtering.
+"""
+import re
+
+from django.db import connection
+
+from .models import Phone
+
+
+FTS_TABLE = 'phones_phone_fts'
+
+CREATE_FTS_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, brand, description, specifications, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+DROP_FTS_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+# Column weights for bm25(): a hit in the name matters most, then the brand
+RANK_WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+
+# Makes the weighted bm25() what "ORDER BY rank" sorts on; stored with the index
+RANK_SQL = (
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) "
+    f"VALUES ('rank', 'bm25({', '.join(str(w) for w in RANK_WEIGHTS)})')"
+)
+
+SEARCH_SQL = (
+    f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} "
+    f"JOIN {Phone._meta.db_table} phone ON phone.id = {FTS_TABLE}.rowid "
+    f"WHERE {FTS_TABLE} MATCH %s AND phone.is_active AND phone.stock > 0{{within}} "
+    f"ORDER BY {FTS_TABLE}.rank LIMIT %s"
+)
+
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def flatten_specifications(specifications):
+    """
+    {'storage': '128GB', 'camera': {'main': '50MP'}, 'nfc': True} -> '128GB 50MP nfc'
+
+    Spec keys are shared by nearly every phone, so indexing them would make
+    every phone match "camera" or "storage". Only values are indexed, plus the
+    keys of true feature flags.
+    """
+    parts = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if item is True:
+                    parts.append(str(key).replace('_', ' '))
+                elif item is not False:
+                    walk(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                walk(item)
+        elif value is not None:
+            parts.append(str(value))
+
+    walk(specifications or {})
+    return ' '.join(parts)
+
+
+def document_for(phone):
+    """Column values indexed for a phone, in FTS column order"""
+    return (
+        phone.name,
+        f"{phone.brand} {phone.get_brand_display()}",
+        phone.description,
+        flatten_specifications(phone.specifications),
+    )
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word becomes a quoted term, so user input can never inject FTS
+    syntax, and all terms must match (implicit AND). Words of two or more
+    characters are prefix terms ("samsung"*); single characters would expand
+    to half the vocabulary, so they must match a whole word.
+    Returns None when the text has no searchable words.
+    """
+    terms = _TERM_RE.findall((text or '').lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' if len(term) > 1 else f'"{term}"' for term in terms)
+
+
+def index_phone(phone, cursor=None):
+    """Insert or replace a phone's search document"""
+    if cursor is None:
+        if not fts_available():
+            return
+        with connection.cursor() as cursor:
+            return index_phone(phone, cursor)
+    index_phones([phone], cursor)
+
+
+def index_phones(phones, cursor):
+    """Insert or replace the search documents of many phones, one executemany() per statement"""
+    cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[phone.pk] for phone in phones])
+    cursor.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, brand, description, specifications) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        [[phone.pk, *document_for(phone)] for phone in phones],
+    )
+
+
+def unindex_phone(phone_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [phone_id])
+
+
+def rebuild_index(phones=None):
+    """Re-index the given phones (default: the whole catalog)"""
+    if not fts_available():
+        return 0
+    if phones is None:
+        phones = Phone.objects.all()
+    count = 0
+    with connection.cursor() as cursor:
+        for phone in phones.iterator(chunk_size=2000):
+            index_phone(phone, cursor)
+            count += 1
+    return count
+
+
+def ranked_ids(cursor, match, limit, within=None):
+    """Ids of catalog phones matching an FTS expression, best match first"""
+    if within is None:
+        sql, params = SEARCH_SQL.format(within=''), []
+    else:
+        subquery, params = within.values('pk').query.sql_with_params()
+        sql = SEARCH_SQL.format(within=f' AND phone.id IN ({subquery})')
+    cursor.execute(sql, [match, *params, limit])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def search_phones(text, limit=20, within=None):
+    """
+    Return catalog phones (active, in stock) matching free text, best match first.
+
+    `within` is an optional Phone queryset the results must also belong to.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return []
+
+    catalog = Phone.objects.filter(is_active=True, stock__gt=0)
+    if within is not None:
+        catalog = catalog.filter(pk__in=within.values('pk'))
+
+    if not fts_available():
+        from django.db.models import Q
+        query = Q()
+        for term in _TERM_RE.findall(text.lower())[:MAX_TERMS]:
+            query &= Q(name__icontains=term) | Q(description__icontains=term) | Q(brand__icontains=term)
+        return list(catalog.filter(query)[:limit])
+
+    with connection.cursor() as cursor:
+        ids = ranked_ids(cursor, match, limit, within)
+    # A phone sold out between the two queries is simply dropped
+    phones = catalog.in_bulk(ids)
+    return [phones[phone_id] for phone_id in ids if phone_id in phones]
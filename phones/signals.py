@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.image_derivatives import schedule_derivatives
+
+from .catalog_cache import invalidate_catalog
+from .models import Phone
+from .quotes import refresh_quotes
+from .search import index_phone, unindex_phone
+
+
+@receiver(post_save, sender=Phone)
+def phone_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Any saved phone (views, admin, list_editable) refreshes the catalog cache, search index and quotes"""
+    invalidate_catalog()
+    if not raw:
+        index_phone(instance)
+        schedule_derivatives(instance)
+        if update_fields is None or {'price', 'interest_rate'} & set(update_fields):
+            refresh_quotes([instance])
+
+
+@receiver(post_delete, sender=Phone)
+def phone_deleted(sender, instance, **kwargs):
+    invalidate_catalog()
+    unindex_phone(instance.pk)
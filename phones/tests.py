@@ -1,3 +1,518 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from accounts.dashboard_cache import get_dashboard_version
+from accounts.models import CreditAccount, User
+from .inventory import OutOfStock, expire_reservations, reserve_stock
+from .quotes import QUOTE_TERMS
+from .search import search_phones
+from .models import Phone, StockReservation
+
+
+def make_phone(name='Galaxy A15', brand='SAMSUNG', price='1200.00', stock=5, **extra):
+    extra.setdefault('description', f'{name} test phone')
+    return Phone.objects.create(name=name, brand=brand, price=Decimal(price), stock=stock, **extra)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phone = make_phone()
+        make_phone(name='iPhone 14', brand='APPLE', price='9000.00')
+
+    def test_anonymous_catalog_is_served_from_cache(self):
+        url = reverse('phones:phone_list') + '?brand=SAMSUNG'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Galaxy A15')
+        self.assertNotContains(response, 'iPhone 14')
+
+    def test_phone_detail_is_served_from_cache(self):
+        url = reverse('phones:phone_detail', args=[self.phone.slug])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Galaxy A15')
+
+    def test_save_invalidates_cached_pages(self):
+        url = reverse('phones:phone_list')
+        self.client.get(url)
+        self.phone.name = 'Galaxy A16'
+        self.phone.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'Galaxy A16')
+
+    def test_stock_sellout_and_delete_remove_phone(self):
+        detail_url = reverse('phones:phone_detail', args=[self.phone.slug])
+        self.client.get(detail_url)
+        self.phone.stock = 0
+        self.phone.save()
+        self.assertEqual(self.client.get(detail_url).status_code, 404)
+
+        list_url = reverse('phones:phone_list')
+        self.client.get(list_url)
+        Phone.objects.get(brand='APPLE').delete()
+        self.assertNotContains(self.client.get(list_url), 'iPhone 14')
+
+
+class CatalogSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.galaxy = make_phone(
+            name='Galaxy S23', brand='SAMSUNG', price='8000.00',
+            specifications={'storage': '128GB', 'ram': '8GB', 'camera': '200MP'})
+        self.camon = make_phone(
+            name='Camon 40 Pro', brand='TECNO', price='3000.00',
+            description='Great camera for night shots',
+            specifications={'storage': '256GB', 'nfc': True})
+
+    def search(self, text):
+        response = self.client.get(reverse('phones:phone_search'), {'q': text})
+        return [result['name'] for result in response.json()['results']]
+
+    def test_terms_are_prefix_matched_across_fields(self):
+        self.assertEqual(self.search('128GB Samsung'), ['Galaxy S23'])
+        self.assertEqual(self.search('sams gal 12'), ['Galaxy S23'])
+        self.assertEqual(self.search('night cam'), ['Camon 40 Pro'])
+        self.assertEqual(self.search('nfc'), ['Camon 40 Pro'])
+
+    def test_name_matches_rank_above_description_matches(self):
+        make_phone(name='Camera Phone X', brand='OTHER', description='Basic phone')
+        self.assertEqual(self.search('camera')[0], 'Camera Phone X')
+
+    def test_index_follows_saves_and_deletes(self):
+        self.galaxy.name = 'Galaxy S24 Ultra'
+        self.galaxy.save()
+        self.assertEqual(self.search('ultra'), ['Galaxy S24 Ultra'])
+
+        self.camon.delete()
+        self.assertEqual(self.search('camon'), [])
+
+    def test_sold_out_phones_and_fts_syntax_are_ignored(self):
+        self.camon.stock = 0
+        self.camon.save()
+        self.assertEqual(self.search('camon'), [])
+        self.assertEqual(self.search('"galaxy" OR NEAR(*'), [])
+        self.assertEqual(self.search('galaxy*'), ['Galaxy S23'])
+
+    def test_best_match_wins_over_newer_matches(self):
+        make_phone(name='Camera Phone X', brand='OTHER', description='Basic phone')
+        for index in range(30):
+            make_phone(name=f'Budget {index}', brand='OTHER', description='Has a camera')
+        self.assertEqual(search_phones('camera', limit=3)[0].name, 'Camera Phone X')
+
+    def test_unavailable_matches_do_not_shrink_the_page(self):
+        for index in range(10):
+            make_phone(name=f'Galaxy Gone {index}', brand='SAMSUNG', stock=0)
+            make_phone(name=f'Galaxy Hidden {index}', brand='SAMSUNG', is_active=False)
+        make_phone(name='Galaxy A16', brand='SAMSUNG')
+        self.assertEqual({phone.name for phone in search_phones('galaxy', limit=2)}, {'Galaxy S23', 'Galaxy A16'})
+
+    def test_catalog_page_shows_search_results(self):
+        response = self.client.get(reverse('phones:phone_list'), {'q': 'tecno'})
+        self.assertContains(response, 'Camon 40 Pro')
+        self.assertNotContains(response, 'Galaxy S23')
+
+    def test_brand_filter_applies_before_the_limit(self):
+        # Better-ranked matches from another brand must not crowd out the TECNO one
+        for index in range(3):
+            make_phone(name=f'Camera Phone {index}', brand='OTHER', description='Basic phone')
+        within = Phone.objects.filter(brand='TECNO')
+        self.assertEqual(search_phones('camera', limit=1, within=within), [self.camon])
+        response = self.client.get(reverse('phones:phone_list'), {'q': 'camera', 'brand': 'TECNO'})
+        self.assertEqual(list(response.context['page_obj']), [self.camon])
+
+
+class CatalogFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.galaxy = make_phone(name='Galaxy S23', specifications={
+            'RAM': '8GB', 'storage': '256 GB', 'display': '6.1-inch Dynamic AMOLED'})
+        make_phone(name='Galaxy A15', specifications={'ram': '8GB', 'storage': '128GB', 'screen_size': '6.5"'})
+        make_phone(name='Spark 20', brand='TECNO', specifications={'ram': '4GB', 'storage': '128GB'})
+        make_phone(name='Plain Phone', brand='ITEL')
+
+    def test_specifications_are_extracted_on_save(self):
+        self.assertEqual((self.galaxy.ram_gb, self.galaxy.storage_gb), (8, 256))
+        self.assertEqual(self.galaxy.screen_inches, Decimal('6.1'))
+
+        self.galaxy.specifications = {'ram': '12GB', 'storage': '1TB'}
+        self.galaxy.save(update_fields=['specifications'])
+        self.galaxy.refresh_from_db()
+        self.assertEqual((self.galaxy.ram_gb, self.galaxy.storage_gb, self.galaxy.screen_inches), (12, 1024, None))
+
+    def test_facet_filters_and_counts(self):
+        response = self.client.get(reverse('phones:phone_list'), {'ram': '8'})
+        self.assertContains(response, 'Galaxy S23')
+        self.assertContains(response, 'Galaxy A15')
+        self.assertNotContains(response, 'Spark 20')
+
+        groups = {group['name']: group['options'] for group in response.context['facet_groups']}
+        # RAM counts ignore the selected RAM filter; storage counts respect it
+        self.assertEqual([(o['value'], o['count'], o['selected']) for o in groups['ram']],
+                         [(4, 1, False), (8, 2, True)])
+        self.assertEqual([(o['value'], o['count']) for o in groups['storage']], [(128, 1), (256, 1)])
+
+    def test_cached_facet_pages_run_no_queries(self):
+        url = reverse('phones:phone_list') + '?storage=128&ram=bogus&screen=NaN'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Spark 20')
+        self.assertNotContains(response, 'Galaxy S23')
+
+    def test_catalog_pages_follow_cursors(self):
+        for index in range(14):
+            make_phone(name=f'Camon {index}', brand='TECNO', specifications={'ram': '8GB'})
+        response = self.client.get(reverse('phones:phone_list'), {'ram': '8'})
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 12)
+        self.assertContains(response, 'cursor=')
+
+        response = self.client.get(reverse('phones:phone_list'), {'ram': '8', 'cursor': page.next_cursor})
+        names = [phone.name for phone in response.context['page_obj']]
+        self.assertEqual(names, ['Camon 1', 'Camon 0', 'Galaxy A15', 'Galaxy S23'])
+        self.assertTrue(response.context['page_obj'].has_previous)
+
+    def test_junk_cursors_share_the_first_page_entry(self):
+        url = reverse('phones:phone_list')
+        self.client.get(url, {'ram': '8'})
+        for junk in ('junk', 'junk2', 'eyJrIjpbXX0:bad:signature'):
+            with self.assertNumQueries(0):
+                response = self.client.get(url, {'ram': '8', 'cursor': junk})
+            self.assertContains(response, 'Galaxy S23')
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phone = make_phone(stock=2)
+        self.buyer = User.objects.create(username='esi', national_id='GHA-INV', is_verified=True)
+
+    def assertLedgerBalances(self):
+        self.phone.refresh_from_db()
+        total = self.phone.inventory_movements.aggregate(total=Sum('quantity_change'))['total']
+        self.assertEqual(total, self.phone.stock)
+
+    def test_reservations_decrement_stock_until_sold_out(self):
+        reserve_stock(self.phone, self.buyer)
+        reserve_stock(self.phone, self.buyer)
+        with self.assertRaises(OutOfStock):
+            reserve_stock(self.phone, self.buyer)
+        self.assertEqual(StockReservation.objects.count(), 2)
+        self.assertLedgerBalances()
+        self.assertEqual(self.phone.stock, 0)
+
+    def test_abandoned_reservations_expire_back_into_stock(self):
+        held = reserve_stock(self.phone, self.buyer)
+        kept = reserve_stock(self.phone, self.buyer, commit=True)
+        self.assertEqual(expire_reservations(), 0)
+
+        self.assertEqual(expire_reservations(now=timezone.now() + timedelta(hours=1)), 1)
+        held.refresh_from_db()
+        kept.refresh_from_db()
+        self.assertEqual((held.status, kept.status), ('EXPIRED', 'COMMITTED'))
+        self.assertLedgerBalances()
+        self.assertEqual(self.phone.stock, 1)
+
+    def test_stale_saves_never_overwrite_reserved_stock(self):
+        stale = Phone.objects.get(pk=self.phone.pk)
+        reserve_stock(self.phone, self.buyer)
+
+        stale.name = 'Galaxy A15 (2024)'
+        stale.save()
+        stale.refresh_from_db()
+        self.assertEqual(stale.stock, 1)
+
+        # A restock from the stale form is applied as a delta: +10 on top of 1
+        stale = Phone.objects.get(pk=self.phone.pk)
+        reserve_stock(self.phone, self.buyer)
+        stale.stock += 10
+        stale.save()
+        self.assertEqual(stale.stock, 10)
+        self.assertLedgerBalances()
+
+    def test_stock_cuts_below_zero_are_refused(self):
+        stale = Phone.objects.get(pk=self.phone.pk)
+        reserve_stock(self.phone, self.buyer)
+        stale.stock = 0
+        stale.name = 'Renamed'
+        # The admin form shows this on the stock field
+        with self.assertRaisesMessage(ValidationError, "Can't take 2 units out of stock"):
+            stale.full_clean()
+        # A save that races past the form check is refused too, and changes nothing
+        with self.assertRaises(ValidationError):
+            stale.save()
+        self.phone.refresh_from_db()
+        self.assertEqual((self.phone.name, self.phone.stock), ('Galaxy A15', 1))
+        self.assertLedgerBalances()
+
+        seen = []
+        post_save.connect(lambda instance, **kwargs: seen.append(instance.stock), sender=Phone, weak=False,
+                          dispatch_uid='stock-seen')
+        self.addCleanup(post_save.disconnect, sender=Phone, dispatch_uid='stock-seen')
+        stale = Phone.objects.get(pk=self.phone.pk)
+        stale.stock -= 1
+        stale.save()
+        self.assertEqual((stale.stock, seen), (0, [0]))
+
+    def test_plan_selection_reserves_and_cancel_releases(self):
+        self.client.force_login(self.buyer)
+        response = self.client.get(reverse('accounts:select_phone', args=[self.phone.id]))
+        self.buyer.refresh_from_db()
+        account = self.buyer.credit_account
+        self.assertRedirects(response, reverse('accounts:agreement', args=[account.id]), fetch_redirect_response=False)
+        self.assertEqual(account.stock_reservations.get().status, 'HELD')
+
+        self.client.post(reverse('accounts:agreement', args=[account.id]))
+        self.assertEqual(account.stock_reservations.get().status, 'COMMITTED')
+
+        self.client.post(reverse('accounts:cancel_plan'))
+        self.assertEqual(StockReservation.objects.get().status, 'RELEASED')
+        self.assertLedgerBalances()
+        self.assertEqual(self.phone.stock, 2)
+
+
+class StockRaceTests(TransactionTestCase):
+    BUYERS = 100
+    UNITS = 5
+
+    def test_racing_buyers_never_oversell(self):
+        phone = make_phone(stock=self.UNITS)
+        buyers = [User.objects.create(username=f'buyer{index}', national_id=f'GHA-RACE-{index}')
+                  for index in range(self.BUYERS)]
+        start = threading.Barrier(self.BUYERS)
+        outcomes = []
+
+        def buy(user):
+            start.wait()
+            try:
+                for _ in range(200):
+                    try:
+                        reserve_stock(phone, user)
+                        outcomes.append('reserved')
+                        return
+                    except OutOfStock:
+                        outcomes.append('sold out')
+                        return
+                    except OperationalError:
+                        # Test database is in-memory SQLite: writers get "table is locked"
+                        # instead of waiting, so retry like a client would
+                        time.sleep(0.001)
+                outcomes.append('gave up')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        phone.refresh_from_db()
+        self.assertEqual(outcomes.count('reserved'), self.UNITS)
+        self.assertEqual(outcomes.count('sold out'), self.BUYERS - self.UNITS)
+        self.assertEqual(phone.stock, 0)
+        self.assertEqual(StockReservation.objects.count(), self.UNITS)
+        self.assertEqual(phone.inventory_movements.aggregate(total=Sum('quantity_change'))['total'], 0)
+
+    def test_stock_edits_and_expiry_go_through_the_write_funnel(self):
+        phone = make_phone(stock=self.UNITS)
+        user = User.objects.create(username='funneled', national_id='GHA-FUNNEL')
+        with override_settings(SQLITE_WRITE_FUNNEL=True):
+            reservation = reserve_stock(phone, user)
+            phone.stock = self.UNITS - 1
+            phone.save()
+            phone.stock = -1
+            with self.assertRaises(ValidationError):
+                phone.save()
+            StockReservation.objects.filter(pk=reservation.pk).update(expires_at=timezone.now())
+            self.assertEqual(expire_reservations(), 1)
+
+        # The edit took one unit as a delta; the reserved one came back when the hold lapsed
+        phone.refresh_from_db()
+        self.assertEqual(phone.stock, self.UNITS - 1)
+        self.assertEqual(phone.inventory_movements.aggregate(total=Sum('quantity_change'))['total'], self.UNITS - 1)
+
+
+class InstallmentQuoteTests(TestCase):
+    def setUp(self):
+        self.phone = make_phone(price='1000.00', interest_rate=Decimal('10.00'))
+
+    def test_quote_table_is_built_for_every_term(self):
+        quotes = {quote.term_months: quote for quote in self.phone.quotes.all()}
+        self.assertEqual(sorted(quotes), list(QUOTE_TERMS))
+        for term, quote in quotes.items():
+            self.assertEqual(quote.total_amount, Decimal('1100.00'))
+            # Rounding is absorbed by the last payment, never lost or overcharged
+            self.assertEqual(quote.monthly_payment * (term - 1) + quote.final_payment, quote.total_amount)
+        self.assertEqual(quotes[18].monthly_payment, Decimal('61.11'))
+        self.assertEqual(quotes[18].final_payment, Decimal('61.13'))
+
+    def test_price_and_rate_changes_refresh_quotes(self):
+        self.phone.price = Decimal('1200.00')
+        self.phone.interest_rate = Decimal('0')
+        self.phone.save()
+        phone = Phone.objects.get(pk=self.phone.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(phone.monthly_payment_12_months, Decimal('100.00'))
+            self.assertEqual(phone.monthly_payment_6_months, Decimal('200.00'))
+
+    def test_prefetched_quotes_and_unsaved_edits(self):
+        phone = Phone.objects.prefetch_related('quotes').get(pk=self.phone.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual([quote.monthly_payment for quote in phone.get_quotes()],
+                             [Decimal('183.33'), Decimal('91.67'), Decimal('61.11'), Decimal('45.83')])
+            # A stale row is never used for a price it wasn't computed from
+            phone.price = Decimal('600.00')
+            self.assertEqual(phone.get_quote(6).monthly_payment, Decimal('110.00'))
+
+
+class CatalogApiTests(TestCase):
+    def setUp(self):
+        self.phones = [make_phone(name=f'Api Phone {i}', specifications={'RAM': '8GB' if i % 2 else '4GB'})
+                       for i in range(5)]
+        self.list_url = reverse('phones:api_phone_list')
+
+    def test_list_filters_fields_and_cursors(self):
+        response = self.client.get(self.list_url, {'ram': '8', 'fields': 'name,price', 'limit': 1})
+        data = response.json()
+        self.assertEqual(data['results'], [{'name': 'Api Phone 3', 'price': '1200.00'}])
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual(data['results'], [{'name': 'Api Phone 1', 'price': '1200.00'}])
+        self.assertIsNone(data['next'])
+
+        response = self.client.get(self.list_url, {'fields': 'name,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+        for price in ('cheap', 'NaN', 'sNaN', 'Infinity'):
+            response = self.client.get(self.list_url, {'min_price': price})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], 'min_price must be a number')
+
+    def test_unchanged_catalog_revalidates_with_304(self):
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Last-Modified'])
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # Other query strings are different representations
+        response = self.client.get(self.list_url, {'brand': 'SAMSUNG'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Stock reservations change the catalog, so the old ETag stops matching
+        reserve_stock(self.phones[0], User.objects.create(username='buyer'))
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail(self):
+        phone = self.phones[0]
+        url = reverse('phones:api_phone_detail', args=[phone.slug])
+        response = self.client.get(url, {'fields': 'slug,quotes'})
+        self.assertEqual(response.json()['slug'], phone.slug)
+        self.assertEqual([quote['term_months'] for quote in response.json()['quotes']], list(QUOTE_TERMS))
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, {'fields': 'slug,quotes'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        phone.price = Decimal('999.00')
+        phone.save()
+        self.assertEqual(self.client.get(url, {'fields': 'slug,quotes'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        phone.is_active = False
+        phone.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class ImportPhonesTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(self.directory, 'media')))
+        Image.new('RGB', (800, 800), 'navy').save(os.path.join(self.directory, 'a55.jpg'))
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path):
+        out, err = io.StringIO(), io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_phones', path, '--batch-size', '2', stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_creates_phones_with_everything_save_would_do(self):
+        path = self.write('catalog.csv', (
+            'name,brand,price,description,specifications,image,stock,interest_rate\n'
+            'Galaxy A55,Samsung,3000,Mid-range,"{""ram"": ""8GB"", ""storage"": ""256GB""}",a55.jpg,4,10\n'
+            'Nokia G42,NOKIA,1500,Budget,,,0,0\n'
+            'Broken,APPLE,not-a-price,Oops,,,1,0\n'
+            'Ghost,APPLE,100,Missing image,,missing.jpg,1,0\n'
+        ))
+        out, err = self.run_import(path)
+        self.assertIn('Imported 2 phones (2 created, 0 updated), 2 errors', out)
+        self.assertIn('Line 4: price', err)
+        self.assertIn('Line 5: Image not found', err)
+
+        phone = Phone.objects.get(slug='samsung-galaxy-a55')
+        self.assertEqual((phone.ram_gb, phone.storage_gb), (8, 256))
+        self.assertEqual(phone.inventory_movements.get().quantity_change, 4)
+        self.assertEqual(phone.get_quote(12).total_amount, Decimal('3300.00'))
+        self.assertTrue(phone.image.name.startswith('phones/import-'))
+        self.assertEqual(phone.image_variants['source'], phone.image.name)
+        self.assertEqual(search_phones('a55'), [phone])
+
+    def test_jsonl_reimport_updates_in_place(self):
+        make_phone(name='Galaxy A55', price='2800.00', stock=5)
+        reserve_stock(Phone.objects.get(), User.objects.create(username='buyer'))
+        saver = User.objects.create(username='saver', national_id='GHA-SAVER')
+        plan = CreditAccount.objects.create(user=saver, phone=Phone.objects.get(), account_type='SAVINGS',
+                                            status='ACTIVE', balance=Decimal('600.00'))
+        version = get_dashboard_version(saver.pk)
+        rows = [
+            {'name': 'Galaxy A55', 'brand': 'SAMSUNG', 'price': '2500.00', 'description': 'Price drop', 'stock': 10},
+            {'name': 'Galaxy A55', 'brand': 'SAMSUNG', 'price': '2400.00', 'description': 'Later row wins', 'stock': 10},
+        ]
+        path = self.write('catalog.jsonl', '\n'.join(json.dumps(row) for row in rows) + '\n{not json\n')
+        out, err = self.run_import(path)
+        self.assertIn('(0 created, 1 updated), 1 errors', out)
+
+        phone = Phone.objects.get()
+        self.assertEqual((phone.price, phone.description), (Decimal('2400.00'), 'Later row wins'))
+        self.assertEqual(phone.get_quote(6).principal, Decimal('2400.00'))
+        # The Save-to-Own plan now pays off the new price
+        plan.refresh_from_db()
+        self.assertEqual((plan.plan_total, plan.progress), (Decimal('2400.00'), 25))
+        self.assertNotEqual(get_dashboard_version(saver.pk), version)
+        # The file's level is applied as a delta over what we read, and the ledger still balances
+        self.assertEqual(phone.stock, 10)
+        self.assertEqual(phone.inventory_movements.aggregate(total=Sum('quantity_change'))['total'], 10)
@@ -1,11 +1,14 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'phones'
 
 urlpatterns = [
     path('', views.phone_list, name='phone_list'),
     path('add/', views.phone_create, name='phone_create'),
+    path('search/', views.phone_search, name='phone_search'),
+    path('api/phones/', api.phone_list_api, name='api_phone_list'),
+    path('api/phones/<slug:slug>/', api.phone_detail_api, name='api_phone_detail'),
     path('<slug:slug>/', views.phone_detail, name='phone_detail'),
     path('<slug:slug>/update/', views.phone_update, name='phone_update'),
     path('<slug:slug>/delete/', views.phone_delete, name='phone_delete'),
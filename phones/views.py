@@ -1,46 +1,101 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from .models import Phone
+from .catalog_cache import (CATALOG_ORDERING, PHONES_PER_PAGE, catalog_queryset, get_catalog_facets,
+                            get_catalog_page, get_catalog_phone)
+from .facets import apply_facet_filters, facet_counts, facet_options, parse_facet_filters
+from .search import search_phones
 from .forms import PhoneForm
 from accounts.models import CreditAccount
+from accounts.pagination import KeysetPage, paginate_keyset, querystring_without
+
+# Most search matches shown on the catalog page
+SEARCH_RESULT_LIMIT = 60
 
 def phone_list(request):
-    # Only show phones that are active AND have stock available
-    phones = Phone.objects.filter(is_active=True, stock__gt=0)
     brand = request.GET.get('brand')
-    if brand:
-        phones = phones.filter(brand=brand)
+    # Search results are numbered pages (at most SEARCH_RESULT_LIMIT); browsing uses cursors
+    page_number = request.GET.get('page')
+    cursor = request.GET.get('cursor')
 
     # Add credit eligibility filter for authenticated users
     credit_filter = request.GET.get('credit_filter')
     user_credit_limit = 0
     if request.user.is_authenticated:
         user_credit_limit = request.user.get_available_credit_limit()
+
+    brands = Phone.BRAND_CHOICES
+    query = request.GET.get('q', '').strip()
+    facets = parse_facet_filters(request.GET)
+    counts = {}
+
+    if query:
+        # Full-text search results, best match first
+        within = catalog_queryset(brand, facets) if brand or facets else None
+        results = search_phones(query, limit=SEARCH_RESULT_LIMIT, within=within)
+        page_obj = Paginator(results, PHONES_PER_PAGE).get_page(page_number)
+    elif request.user.is_authenticated and credit_filter in ('affordable', 'aspirational'):
+        # Per-user filtering can't be shared, so it always goes to the database
+        phones = catalog_queryset(brand)
         if credit_filter == 'affordable':
             phones = phones.filter(price__lte=user_credit_limit)
-        elif credit_filter == 'aspirational':
+        else:
             phones = phones.filter(price__gt=user_credit_limit)
-
-    paginator = Paginator(phones, 12)  # Show 12 phones per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    brands = Phone.BRAND_CHOICES
+        counts = facet_counts(phones, facets)
+        page_obj = paginate_keyset(apply_facet_filters(phones, facets), cursor, PHONES_PER_PAGE, CATALOG_ORDERING)
+    elif brand and brand not in dict(brands):
+        # Unknown brand: nothing to show, and not worth a cache entry
+        page_obj = KeysetPage([])
+    else:
+        # Only show phones that are active AND have stock available (cached)
+        page_obj = get_catalog_page(brand, cursor, facets)
+        counts = get_catalog_facets(brand, facets)
 
     context = {
         'page_obj': page_obj,
         'brands': brands,
         'selected_brand': brand,
+        'query': query,
+        'facet_groups': facet_options(counts, facets, request.GET),
+        'facet_query': urlencode(facets),
+        'filter_query': querystring_without(request.GET, 'page', 'cursor'),
         'credit_filter': credit_filter,
         'user_credit_limit': user_credit_limit,
     }
     return render(request, 'phones/phone_list.html', context)
 
+def phone_search(request):
+    """JSON search endpoint over the catalog: ?q=128GB samsung camera&limit=10"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+
+    results = [
+        {
+            'id': phone.id,
+            'name': phone.name,
+            'slug': phone.slug,
+            'brand': phone.get_brand_display(),
+            'price': str(phone.price),
+            'image': phone.image.url if phone.image else None,
+            'url': reverse('phones:phone_detail', args=[phone.slug]),
+        }
+        for phone in search_phones(query, limit=limit)
+    ]
+    return JsonResponse({'query': query, 'results': results})
+
 def phone_detail(request, slug):
-    # Only allow access to phones that are active AND have stock available
-    phone = get_object_or_404(Phone, slug=slug, is_active=True, stock__gt=0)
+    # Only allow access to phones that are active AND have stock available (cached)
+    phone = get_catalog_phone(slug)
+    if phone is None:
+        raise Http404("No Phone matches the given query.")
 
     # Check if user is authenticated and has an active plan
     has_active_plan = False
@@ -48,8 +103,7 @@ def phone_detail(request, slug):
     credit_info = {}
 
     if request.user.is_authenticated:
-        if hasattr(request.user, 'credit_account'):
-            has_active_plan = request.user.credit_account.is_plan_active()
+        has_active_plan = request.user.has_open_plan()
 
         # Check credit eligibility
         can_afford = request.user.can_afford_phone(phone.price)
@@ -130,7 +184,7 @@ def buy_on_credit(request, slug):
     phone = get_object_or_404(Phone, slug=slug, is_active=True, stock__gt=0)
     
     # Check if user already has an active credit account
-    if hasattr(request.user, 'credit_account') and request.user.credit_account.is_plan_active():
+    if request.user.has_open_plan():
         messages.error(request, "You already have an active credit plan. You can only have one plan at a time.")
         return redirect('phones:phone_detail', slug=slug)
     
@@ -153,7 +207,7 @@ def save_to_own(request, slug):
     phone = get_object_or_404(Phone, slug=slug, is_active=True, stock__gt=0)
     
     # Check if user already has an active credit account
-    if hasattr(request.user, 'credit_account') and request.user.credit_account.is_plan_active():
+    if request.user.has_open_plan():
         messages.error(request, "You already have an active plan. You can only have one plan at a time.")
         return redirect('phones:phone_detail', slug=slug)
     